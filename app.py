@@ -1,9 +1,16 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 import os
+import logging
+from config import get_config
 from routes import api
 from utils.errors import ApiError
 from utils.cors_helper import get_cors_origins
+from utils.response_encoding import init_response_encoding
+from utils.worker_memory import init_memory_watchdog
+from utils.structured_logging import configure_logging
+
+logger = logging.getLogger(__name__)
 
 def create_app():
     """
@@ -12,31 +19,44 @@ def create_app():
     Returns:
         Flask: The configured Flask application
     """
+    config = get_config()
+    
+    # Queue log records to a background writer so request threads never block on stdout
+    configure_logging(config.LOG_LEVEL, config.LOG_FORMAT, config.LOG_SAMPLING, config.LOG_QUEUE_SIZE)
+    
     # Initialize Flask app
     app = Flask(__name__)
     
     # Enable CORS with appropriate configuration
     cors_origins = get_cors_origins()
     
-    # Print the allowed origins for debugging
-    print(f"CORS enabled for origins: {cors_origins}")
+    # Log the allowed origins for debugging
+    logger.info("CORS enabled for origins: %s", cors_origins)
     
     # CORS configuration with proper preflight request handling
     CORS(app, 
          origins=cors_origins,
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+         allow_headers=["Content-Type", "Authorization", "X-Requested-With", "If-None-Match", "X-Request-Timeout", "X-Admin-Token", "X-Profile", "X-API-Key"],
+         expose_headers=["ETag", "X-Profile-Id"],
          supports_credentials=True,
          max_age=86400)  # Cache preflight requests for 24 hours
     
     # Register blueprints
     app.register_blueprint(api)
     
+    # Compress responses and answer conditional GETs for every route
+    init_response_encoding(app)
+    
+    # Track worker RSS after every response and recycle bloated workers
+    init_memory_watchdog(app, config.MAX_WORKER_RSS_MB)
+    
     # Register error handlers
     @app.errorhandler(ApiError)
     def handle_api_error(error):
         response = jsonify(error.to_dict())
         response.status_code = error.status_code
+        response.headers.extend(error.headers)
         return response
     
     @app.errorhandler(404)
@@ -4,6 +4,30 @@ from dotenv import load_dotenv
 # Load environment variables from .env file if present
 load_dotenv()
 
+def parse_tier_map(value):
+    """Parse 'fast=model-a,strong=model-b' into an ordered dict of tier -> model"""
+    tiers = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        tier, _, model_name = item.partition('=')
+        tiers[tier.strip()] = model_name.strip()
+    return tiers
+
+def parse_rate_map(value):
+    """Parse 'name=0.1,other=0.5' into a dict of name -> rate"""
+    return {name: float(rate) for name, rate in parse_tier_map(value).items()}
+
+def parse_tier_routes(value):
+    """Parse 'endpoint=tier:max_chars|tier;...' into endpoint -> [(tier, max_chars)]"""
+    routes = {}
+    for item in filter(None, (part.strip() for part in value.split(';'))):
+        endpoint, _, rules = item.partition('=')
+        parsed = []
+        for rule in filter(None, (part.strip() for part in rules.split('|'))):
+            tier, _, max_chars = rule.partition(':')
+            parsed.append((tier.strip(), int(max_chars) if max_chars else None))
+        routes[endpoint.strip()] = parsed
+    return routes
+
 class Config:
     """Base configuration class"""
     DEBUG = False
@@ -12,12 +36,175 @@ class Config:
     
     # Gemini API settings
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+    # Pool of keys (comma separated, one per project) for more aggregate quota
+    GOOGLE_API_KEYS = [key.strip() for key in os.getenv('GOOGLE_API_KEYS', GOOGLE_API_KEY or '').split(',') if key.strip()]
+    API_KEY_REQUESTS_PER_MINUTE = int(os.getenv('API_KEY_REQUESTS_PER_MINUTE', 0))  # 0 = no local cap
+    API_KEY_COOLDOWN_SECONDS = int(os.getenv('API_KEY_COOLDOWN_SECONDS', 60))
     GEMINI_MODEL = 'gemini-2.5-flash'
     
+    # Model tiers, cheapest first; requests escalate to stronger tiers when output is rejected
+    MODEL_TIERS = parse_tier_map(os.getenv('MODEL_TIERS', f'fast=gemini-2.5-flash-lite,strong={GEMINI_MODEL}'))
+    # Per endpoint: the first tier whose max input size (characters) fits is used
+    MODEL_TIER_ROUTES = parse_tier_routes(os.getenv(
+        'MODEL_TIER_ROUTES',
+        'improve_section=fast:1500|strong;improve_section_batch=fast:6000|strong;analyze=strong;analyze_overall=strong'
+    ))
+    
+    # Model backend: 'gemini' or 'local' (canned responses with injected latency, no API key needed)
+    MODEL_PROVIDER = os.getenv('MODEL_PROVIDER', 'gemini')
+    LOCAL_MODEL_LATENCY_SECONDS = float(os.getenv('LOCAL_MODEL_LATENCY_SECONDS', 0.5))
+    LOCAL_MODEL_JITTER_SECONDS = float(os.getenv('LOCAL_MODEL_JITTER_SECONDS', 0.5))
+    
+    # Hedged requests: after the endpoint's learned latency percentile, send a
+    # second request to the hedge backend and take whichever answers first. Off by
+    # default: a losing Gemini call cannot be cancelled, so hedges are paid for in full
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', '0') == '1'
+    # Hedge model per tier (same format as MODEL_TIERS); unset tiers hedge to the same model
+    HEDGE_MODELS = parse_tier_map(os.getenv('HEDGE_MODELS', ''))
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+    HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+    # Maximum hedges per endpoint as a fraction of its requests
+    HEDGE_BUDGETS = {'analyze': 0.05, 'analyze_overall': 0.05, 'improve_section': 0.1, 'improve_section_batch': 0.1}
+    # Threads running upstream calls (primaries and hedges) and calls that may wait for one.
+    # An abandoned call keeps its thread until the SDK returns, so the wait is bounded
+    UPSTREAM_THREADS = int(os.getenv('UPSTREAM_THREADS', 32))
+    UPSTREAM_QUEUE = int(os.getenv('UPSTREAM_QUEUE', 8))
+    
+    # Prompt prefix caching: 'none', 'local' (simulated stand-in) or 'gemini'. 'gemini' needs a
+    # google-generativeai release with the caching module, which the pinned 0.3.2 lacks
+    CONTEXT_CACHE_BACKEND = os.getenv('CONTEXT_CACHE_BACKEND', 'none')
+    CONTEXT_CACHE_TTL_SECONDS = int(os.getenv('CONTEXT_CACHE_TTL_SECONDS', 3600))
+    CONTEXT_CACHE_DISCOUNT = float(os.getenv('CONTEXT_CACHE_DISCOUNT', 0.75))
+    CONTEXT_CACHE_INCLUDE_JOB_DESCRIPTION = os.getenv('CONTEXT_CACHE_INCLUDE_JOB_DESCRIPTION', '1') == '1'
+    
+    # Requests one worker serves at once (see gunicorn.conf.py)
+    WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 8)) if os.getenv('GUNICORN_WORKER_CLASS', 'gthread') == 'gthread' else 1
+    
+    # Adaptive concurrency limit in front of Gemini calls (per worker process)
+    LIMITER_INITIAL_CONCURRENCY = int(os.getenv('LIMITER_INITIAL_CONCURRENCY', 8))
+    LIMITER_MIN_CONCURRENCY = int(os.getenv('LIMITER_MIN_CONCURRENCY', 1))
+    LIMITER_MAX_CONCURRENCY = int(os.getenv('LIMITER_MAX_CONCURRENCY', 64))
+    # Only the worker's own request threads can queue, so the bound has to sit below their
+    # number or the queue never fills and overload is never shed
+    LIMITER_MAX_QUEUE = int(os.getenv('LIMITER_MAX_QUEUE', max(1, WORKER_THREADS // 2)))
+    LIMITER_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LIMITER_QUEUE_TIMEOUT_SECONDS', 30))
+    
+    # Priority lanes for upstream calls: class weights, endpoint classes and the
+    # share of the concurrency limit reserved for interactive traffic; unmapped endpoints get the lowest class
+    PRIORITY_CLASS_WEIGHTS = {'interactive': 4, 'standard': 2}
+    ENDPOINT_PRIORITY_CLASSES = {
+        'improve_section': 'interactive',
+        'improve_section_batch': 'interactive',
+        'analyze': 'standard',
+        'analyze_overall': 'standard'
+    }
+    INTERACTIVE_RESERVED_FRACTION = float(os.getenv('INTERACTIVE_RESERVED_FRACTION', 0.25))
+    
+    # Per-client sliding-window quotas, checked before the request body is parsed
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')  # 'memory', 'redis' or 'local-redis'
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    RATE_LIMIT_WINDOW_SECONDS = int(os.getenv('RATE_LIMIT_WINDOW_SECONDS', 60))
+    RATE_LIMIT_MAX_REQUESTS = int(os.getenv('RATE_LIMIT_MAX_REQUESTS', 30))
+    RATE_LIMIT_MAX_TOKENS = int(os.getenv('RATE_LIMIT_MAX_TOKENS', 300000))
+    # Clients are keyed by X-API-Key only for issued keys (comma separated), otherwise by IP
+    RATE_LIMIT_API_KEYS = [key.strip() for key in os.getenv('RATE_LIMIT_API_KEYS', '').split(',') if key.strip()]
+    # Proxies in front of the app that append to X-Forwarded-For (Render: 1, direct: 0)
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))
+    # Token estimate per request: fixed prompt/output cost plus body size
+    RATE_LIMIT_BASE_TOKENS = {'analyze': 6000, 'analyze_overall': 6000, 'improve_section': 2500}
+    RATE_LIMIT_PDF_BYTES_PER_TOKEN = 40
+    
+    # /analyze output format: 'compact' (short keys, expanded locally) or 'full'
+    ANALYZE_OUTPUT_FORMAT = os.getenv('ANALYZE_OUTPUT_FORMAT', 'compact')
+    # Per-endpoint generation settings: scoring endpoints sample deterministically, and
+    # output caps bound latency (on 2.5 models the cap includes thinking tokens)
+    GENERATION_CONFIG = {
+        'analyze': {'temperature': 0, 'max_output_tokens': 4096},
+        'analyze_overall': {'temperature': 0, 'max_output_tokens': 8192},
+        'improve_section': {'temperature': 0.4, 'max_output_tokens': 3072}
+    }
+    
+    # Per-request deadlines (seconds) for the model endpoints; clients may ask for another
+    # one in the header, up to the maximum. Work stops when it passes or the client disconnects
+    REQUEST_DEADLINE_SECONDS = {'analyze': 90, 'analyze_overall': 90, 'improve_section': 45}
+    REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv('REQUEST_DEADLINE_MAX_SECONDS', 120))
+    REQUEST_DEADLINE_HEADER = 'X-Request-Timeout'
+    
+    # Pre-flight prompt size caps (estimated tokens, prefix included); larger inputs get a 413
+    MAX_INPUT_TOKENS = {'analyze': 16000, 'analyze_overall': 12000, 'improve_section': 4000}
+    # Include the reported token usage of each request in a "debug" response field
+    USAGE_DEBUG_FIELD = os.getenv('USAGE_DEBUG_FIELD', '0') == '1'
+    
+    # Cross-request micro-batching of /improve-section: short sections arriving within the
+    # window share one multi-item prompt (off by default)
+    IMPROVE_SECTION_BATCHING = os.getenv('IMPROVE_SECTION_BATCHING', '0') == '1'
+    IMPROVE_SECTION_BATCH_WINDOW_MS = int(os.getenv('IMPROVE_SECTION_BATCH_WINDOW_MS', 50))
+    IMPROVE_SECTION_BATCH_MAX_SIZE = int(os.getenv('IMPROVE_SECTION_BATCH_MAX_SIZE', 4))
+    # Longer sections always get their own call; batching is skipped when WORKER_THREADS is 1,
+    # where a batch could only ever hold the caller's own section
+    IMPROVE_SECTION_BATCH_MAX_CHARS = int(os.getenv('IMPROVE_SECTION_BATCH_MAX_CHARS', 1500))
+    
+    # Truncated model output: 'repair' closes it locally, 'continue' asks the model for the rest first
+    TRUNCATION_RECOVERY = os.getenv('TRUNCATION_RECOVERY', 'repair')
+    
     # Upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     ALLOWED_EXTENSIONS = {'pdf'}
+    
+    # PDF text extraction: 'auto' times every installed backend and leads with the fastest,
+    # or a comma separated fallback order of 'pymupdf', 'pypdf' and 'pypdf2'
+    PDF_BACKENDS = os.getenv('PDF_BACKENDS', 'auto')
+    PDF_BACKEND_BENCHMARK_SAMPLES = int(os.getenv('PDF_BACKEND_BENCHMARK_SAMPLES', 5))
+    
+    # Upload janitor settings (the Render disk is 1GB, keep headroom below it)
+    UPLOAD_MAX_AGE_HOURS = int(os.getenv('FILE_CLEANUP_AGE_HOURS', 24))
+    UPLOAD_QUOTA_BYTES = int(os.getenv('UPLOAD_QUOTA_BYTES', 900 * 1024 * 1024))
+    UPLOAD_JANITOR_INTERVAL_SECONDS = int(os.getenv('UPLOAD_JANITOR_INTERVAL_SECONDS', 300))
+    # Subdirectories of the stores below, which bound their own files and are skipped by the janitor
+    UPLOAD_STORE_DIRECTORIES = ('results', 'stage_cache', 'job_descriptions', 'profiles')
+    # Entries each content store keeps on disk (least recently used deleted first)
+    CONTENT_STORE_MAX_FILES = int(os.getenv('CONTENT_STORE_MAX_FILES', 2000))
+    
+    # Worker memory: recycle a gunicorn worker once its RSS passes this many MB (0 only tracks RSS)
+    MAX_WORKER_RSS_MB = int(os.getenv('MAX_WORKER_RSS_MB', 400))
+    
+    # Warm each worker up (model clients, PDF libraries, first upstream call) before it serves traffic
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '1') == '1'
+    # Deep readiness checks (uploads directory, model upstream) are reused for this long
+    READINESS_CACHE_SECONDS = float(os.getenv('READINESS_CACHE_SECONDS', 30))
+    READINESS_CHECK_TIMEOUT_SECONDS = float(os.getenv('READINESS_CHECK_TIMEOUT_SECONDS', 5))
+    
+    # Admin endpoints and per-request profiling need this token in the X-Admin-Token header (unset disables them)
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    # Profiles of flagged requests kept on disk (oldest deleted first)
+    PROFILE_RING_SIZE = int(os.getenv('PROFILE_RING_SIZE', 50))
+    
+    # Per-request memory accounting with tracemalloc (diagnostic mode, slows tracked requests down)
+    MEMORY_TRACKING = os.getenv('MEMORY_TRACKING', '0') == '1'
+    MEMORY_TRACKING_WORST_REQUESTS = int(os.getenv('MEMORY_TRACKING_WORST_REQUESTS', 20))
+    MEMORY_TRACKING_TOP_SITES = int(os.getenv('MEMORY_TRACKING_TOP_SITES', 10))
+    
+    # Logging: records are queued to a background writer thread; json or text lines on stdout
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    # Fraction of INFO records kept per logger (logger=rate,...), for the lines logged on every request
+    LOG_SAMPLING = parse_rate_map(os.getenv('LOG_SAMPLING', 'services.analysis_stages=0.1,services.gemini_service=0.1'))
+    # Records waiting for the writer beyond this are dropped instead of blocking requests
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    
+    # Job description cache settings
+    JOB_DESCRIPTION_CACHE_SIZE = int(os.getenv('JOB_DESCRIPTION_CACHE_SIZE', 256))
+    
+    # Stored analysis results, served with strong ETags from GET /results/<id>
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 512))
+    
+    # Model stage outputs of the analysis pipelines, keyed by their inputs
+    STAGE_CACHE_ENABLED = os.getenv('STAGE_CACHE_ENABLED', '1') == '1'
+    STAGE_CACHE_SIZE = int(os.getenv('STAGE_CACHE_SIZE', 256))
+    # Also cache stages that sample (temperature > 0, e.g. improve_section); off so a retry gets a new answer
+    STAGE_CACHE_SAMPLED = os.getenv('STAGE_CACHE_SAMPLED', '0') == '1'
 
 class DevelopmentConfig(Config):
     """Development configuration"""
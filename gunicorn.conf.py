@@ -0,0 +1,31 @@
+"""
+Gunicorn settings, picked up automatically from the working directory
+(`gunicorn wsgi:application`)
+"""
+import os
+
+from utils.worker_memory import watchdog
+
+# Threaded workers: the per-process concurrency limiter, priority lanes and the
+# /improve-section micro-batcher only act on requests that run concurrently in one
+# process, which the default sync worker (one request at a time) never does
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Seconds a recycled worker gets to finish its in-flight requests before it is killed
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 60))
+
+def post_request(worker, req, environ, resp):
+    """Retire a worker whose RSS crossed MAX_WORKER_RSS_MB once the current request is done"""
+    if watchdog.recycle_requested and worker.alive:
+        worker.log.info(f"Recycling worker {worker.pid}: RSS over the limit, draining in-flight requests")
+        # Stops accepting new connections; gunicorn finishes the in-flight ones and forks a replacement
+        worker.alive = False
+
+def post_worker_init(worker):
+    """Warm the worker up after it has loaded the app and before it accepts connections"""
+    # Imported here so the master never creates model clients that would be shared across forks
+    from config import get_config
+    if get_config().WARMUP_ENABLED:
+        from services.readiness import warm_up
+        warm_up()
@@ -1,15 +1,158 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, g, send_file
+import hmac
 import logging
 import os
+from functools import wraps
 
-from services.gemini_service import analyze_resume_with_gemini, improve_resume_section_with_gemini, analyze_resume_overall_with_gemini
-from utils.pdf_extractor import extract_text_from_pdf
-from utils.response_parser import parse_gemini_response
-from utils.errors import BadRequestError, ServerError
+from services import analysis_stages as stages
+from services.job_description_service import register_job_description, get_job_description
+from services.pipeline import Pipeline, Stage, MetricsHook
+from services import memory_tracker
+from services.memory_tracker import MemoryTracker, MemoryHook
+from services.readiness import readiness
+from services.request_profiler import ProfileSession, ProfilingHook, ProfileRing
+from services.result_store import save_result, get_result
+from utils.errors import ApiError, BadRequestError, ForbiddenError, NotFoundError, ServerError, TooManyRequestsError
+from utils import deadlines
 from utils.cors_helper import get_cors_origins
+from utils.metrics import metrics
+from utils.rate_limit import SlidingWindowRateLimiter, create_rate_limit_store, client_identity, hash_api_key
+from config import get_config
 
 # Create a Blueprint for API routes
 api = Blueprint('api', __name__)
+
+config = get_config()
+
+# Per-client quotas for the endpoints that call Gemini
+rate_limiter = SlidingWindowRateLimiter(
+    create_rate_limit_store(config.RATE_LIMIT_STORE, config.RATE_LIMIT_REDIS_URL),
+    window_seconds=config.RATE_LIMIT_WINDOW_SECONDS,
+    max_requests=config.RATE_LIMIT_MAX_REQUESTS,
+    max_tokens=config.RATE_LIMIT_MAX_TOKENS
+)
+issued_api_keys = frozenset(hash_api_key(key) for key in config.RATE_LIMIT_API_KEYS)
+
+@api.before_request
+def enforce_rate_limit():
+    """Reject over-quota clients before the request body (and any PDF) is parsed"""
+    if not config.RATE_LIMIT_ENABLED or request.method == 'OPTIONS':
+        return None
+    
+    endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+    if endpoint not in config.RATE_LIMIT_BASE_TOKENS:
+        return None
+    
+    # Only the declared body size is used, so nothing is read or parsed here
+    body_bytes = request.content_length or 0
+    bytes_per_token = 4 if request.is_json else config.RATE_LIMIT_PDF_BYTES_PER_TOKEN
+    estimated_tokens = config.RATE_LIMIT_BASE_TOKENS[endpoint] + body_bytes // bytes_per_token
+    
+    rate_limiter.check(client_identity(request, issued_api_keys, config.TRUSTED_PROXY_HOPS), estimated_tokens)
+    return None
+
+@api.before_request
+def start_deadline():
+    """Give model requests a deadline, from the client's header or the endpoint default"""
+    endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+    seconds = config.REQUEST_DEADLINE_SECONDS.get(endpoint)
+    if seconds is None or request.method == 'OPTIONS':
+        return None
+    
+    requested = request.headers.get(config.REQUEST_DEADLINE_HEADER)
+    if requested:
+        try:
+            seconds = float(requested)
+        except ValueError:
+            raise BadRequestError(f"{config.REQUEST_DEADLINE_HEADER} must be a number of seconds")
+        if seconds <= 0:
+            raise BadRequestError(f"{config.REQUEST_DEADLINE_HEADER} must be positive")
+        seconds = min(seconds, config.REQUEST_DEADLINE_MAX_SECONDS)
+    
+    # The client socket lets blocking waits notice a closed tab
+    sock = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    g.deadline = deadlines.Deadline(seconds, sock)
+    g.deadline_token = deadlines.activate(g.deadline)
+    return None
+
+@api.teardown_request
+def end_deadline(error=None):
+    """Drop the request's deadline once the response is done"""
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        deadlines.deactivate(token)
+
+def _require_admin():
+    """Reject requests without the configured admin token"""
+    if not config.ADMIN_TOKEN:
+        raise ForbiddenError("Admin access is not configured")
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), config.ADMIN_TOKEN.encode('utf-8')):
+        raise ForbiddenError("A valid X-Admin-Token header is required")
+
+def admin_required(view):
+    """Decorator for admin-only endpoints"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        _require_admin()
+        return view(*args, **kwargs)
+    return wrapper
+
+# Profiles of flagged requests, shared by the workers through the uploads disk
+PROFILED_ENDPOINTS = ('analyze', 'analyze_overall', 'improve_section')
+profile_ring = ProfileRing(os.path.join(config.UPLOAD_FOLDER, 'profiles'), config.PROFILE_RING_SIZE)
+
+@api.before_request
+def start_profile():
+    """Profile an admin's request when it carries the X-Profile header or ?profile=1"""
+    if request.headers.get('X-Profile') != '1' and request.args.get('profile') != '1':
+        return None
+    endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+    if endpoint not in PROFILED_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+    _require_admin()
+    g.profile_session = ProfileSession(endpoint)
+    g.profile_token = g.profile_session.activate()
+    return None
+
+@api.after_request
+def save_profile(response):
+    """Store the profile and point the client at it"""
+    session = g.get('profile_session')
+    if session is not None:
+        if profile_ring.save(session, response.status_code) is not None:
+            response.headers['X-Profile-Id'] = session.id
+    return response
+
+@api.teardown_request
+def end_profile(error=None):
+    """Stop profiling the worker's thread once the response is done"""
+    token = g.pop('profile_token', None)
+    if token is not None:
+        ProfileSession.deactivate(token)
+
+# Worst requests by peak traced memory, kept per worker when MEMORY_TRACKING is on
+memory = MemoryTracker(config.MEMORY_TRACKING_WORST_REQUESTS, config.MEMORY_TRACKING_TOP_SITES)
+
+@api.before_request
+def start_memory_tracking():
+    """Trace the allocations of model requests in memory tracking mode"""
+    if not config.MEMORY_TRACKING or request.method == 'OPTIONS':
+        return None
+    endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+    if endpoint not in PROFILED_ENDPOINTS:
+        return None
+    g.memory_session = memory.begin(endpoint)
+    g.memory_token = memory_tracker.activate(g.memory_session)
+    return None
+
+@api.teardown_request
+def end_memory_tracking(error=None):
+    """Record the request's peak and close its tracing window"""
+    token = g.pop('memory_token', None)
+    if token is not None:
+        memory_tracker.deactivate(token)
+        memory.end(g.pop('memory_session'))
     
 # Debug endpoint for CORS verification
 @api.route('/debug/cors', methods=['GET'])
@@ -34,129 +177,144 @@ def debug_cors():
     # Don't manually add CORS headers here; let Flask-CORS handle it
     return response
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Every pipeline records stage metrics and profiles the stages of flagged requests
+pipeline_hooks = [MetricsHook(), ProfilingHook()]
+if config.MEMORY_TRACKING:
+    pipeline_hooks.append(MemoryHook(memory))
+
+# Analysis pipelines: the local format checks run while the model stage waits on Gemini
+analyze_pipeline = Pipeline('analyze', [
+    Stage('upload', stages.read_resume_upload, requires=['request'], provides='resume_file', concurrent=False),
+    Stage('job_description', stages.read_job_description, requires=['request'], provides='job_description',
+          concurrent=False),
+    Stage('sections', stages.read_analysis_sections, requires=['request'], provides='sections', concurrent=False),
+    Stage('extract', stages.extract_resume, requires=['resume_file'],
+          provides=['pdf_reader', 'layout', 'resume_text'], error=(BadRequestError, "PDF extraction error")),
+    Stage('ats_checks', stages.check_format, requires=['pdf_reader', 'layout'], provides='ats_checks'),
+    Stage('model', stages.analyze_match, requires=['resume_text', 'job_description', 'sections'], provides='analysis',
+          cache=stages.stage_cache, cache_key=lambda **inputs: stages.model_cache_key('analyze', *inputs.values()),
+          error=(ServerError, "Analysis error")),
+    Stage('merge', stages.merge_match_result, requires=['analysis', 'ats_checks', 'sections'], provides='result'),
+], hooks=pipeline_hooks)
+
+analyze_overall_pipeline = Pipeline('analyze_overall', [
+    Stage('upload', stages.read_resume_upload, requires=['request'], provides='resume_file', concurrent=False),
+    Stage('sections', stages.read_overall_sections, requires=['request'], provides='sections', concurrent=False),
+    Stage('extract', stages.extract_resume, requires=['resume_file'],
+          provides=['pdf_reader', 'layout', 'resume_text'], error=(BadRequestError, "PDF extraction error")),
+    Stage('ats_checks', stages.check_format, requires=['pdf_reader', 'layout'], provides='ats_checks'),
+    Stage('model', stages.analyze_overall, requires=['resume_text', 'sections'], provides='analysis',
+          cache=stages.stage_cache, cache_key=lambda **inputs: stages.model_cache_key('analyze_overall', *inputs.values()),
+          error=(ServerError, "Overall analysis error")),
+    Stage('merge', stages.merge_overall_result, requires=['analysis', 'ats_checks', 'sections'], provides='result'),
+], hooks=pipeline_hooks)
+
+improve_section_pipeline = Pipeline('improve_section', [
+    Stage('request', stages.read_section_request, requires=['request'], provides=['section_type', 'original_text'],
+          concurrent=False),
+    Stage('model', stages.improve_section, requires=['section_type', 'original_text'], provides='improvement',
+          cache=stages.stage_cache, cache_key=lambda **inputs: stages.model_cache_key('improve_section', *inputs.values()),
+          error=(ServerError, "Section improvement error")),
+    Stage('annotate', stages.section_result, requires=['improvement', 'section_type'], provides='result'),
+], hooks=pipeline_hooks)
+
+def _run_pipeline(pipeline, respond):
+    """
+    Run an analysis pipeline for the current request and render its result or error
+
+    Args:
+        pipeline (Pipeline): The route's pipeline
+        respond (callable): Builds the response from the finished context
+    """
+    try:
+        context = pipeline.run({'request': request})
+        # Nobody reads a result for a client that left or gave up
+        deadlines.check()
+        return respond(context)
+    except TooManyRequestsError:
+        # Rendered by the app error handler so Retry-After is included
+        raise
+    except ApiError as e:
+        return jsonify(e.to_dict()), e.status_code
+    except Exception as e:
+        logger.error("Unexpected error in %s: %s", pipeline.name, e)
+        error = ServerError(f"Unexpected error: {str(e)}")
+        return jsonify(error.to_dict()), error.status_code
+
 @api.route('/analyze', methods=['POST'])
 def analyze():
     """API endpoint for resume analysis"""
+    return _run_pipeline(analyze_pipeline, lambda context: _stored_result_response(context['result']))
+
+def _stored_result_response(result):
+    """Store an analysis result and respond with its id as a strong ETag"""
+    result_id = save_result(result)
+    response = jsonify(dict(result, result_id=result_id))
+    response.set_etag(result_id)
+    return response
+
+@api.route('/results/<result_id>', methods=['GET'])
+def fetch_result(result_id):
+    """API endpoint to re-fetch a stored analysis result (supports If-None-Match)"""
+    result = get_result(result_id)
+    if result is None:
+        error = NotFoundError(f"Unknown result_id: {result_id}")
+        return jsonify(error.to_dict()), error.status_code
+    
+    response = jsonify(dict(result, result_id=result_id))
+    response.set_etag(result_id)
+    return response
+
+@api.route('/job-descriptions', methods=['POST'])
+def create_job_description():
+    """API endpoint to preprocess a job description once and reuse it across analyses"""
     try:
-        # Check if the required files are in the request
-        if 'resume' not in request.files:
-            raise BadRequestError("No resume file uploaded")
-        
-        resume_file = request.files['resume']
-        job_description = request.form.get('job_description', '')
+        request_data = request.get_json(silent=True) or {}
+        job_description = request_data.get('job_description') or request.form.get('job_description', '')
         
-        logger.info(f"Received analyze request with resume: {resume_file.filename}")
+        if not job_description or not job_description.strip():
+            raise BadRequestError("job_description is required and cannot be empty")
         
-        # Validate file
-        if resume_file.filename == '':
-            raise BadRequestError("No file selected")
+        entry = register_job_description(job_description)
+        logger.info("Registered job description %s (%d skills)", entry['id'], len(entry['skills']))
         
-        # Check if the file is a PDF
-        if not resume_file.filename.endswith('.pdf'):
-            raise BadRequestError("Only PDF files are supported")
-        
-        # Extract text from PDF
-        try:
-            resume_text = extract_text_from_pdf(resume_file)
-            logger.info("Successfully extracted text from PDF")
-        except Exception as e:
-            logger.error(f"PDF extraction error: {str(e)}")
-            raise BadRequestError(f"PDF extraction error: {str(e)}")
-        
-        # Analyze the resume with Gemini
-        try:
-            logger.info("Sending resume to Gemini API for analysis")
-            gemini_response = analyze_resume_with_gemini(resume_text, job_description)
-            
-            logger.info("Parsing Gemini response")
-            analysis_result = parse_gemini_response(gemini_response)
-            
-            # Add status key to the response
-            if isinstance(analysis_result, dict):
-                analysis_result["status"] = "success"
-                
-                # Log basic info about the result
-                logger.info(f"Analysis complete - Score: {analysis_result.get('score', 'N/A')}")
-                return jsonify(analysis_result)
-            else:
-                logger.error("Invalid response format from analysis")
-                raise ServerError("Invalid response format from analysis")
-        except Exception as e:
-            logger.error(f"Analysis error: {str(e)}")
-            raise ServerError(f"Analysis error: {str(e)}")
-            
+        return jsonify(_job_description_response(entry)), 201
     except BadRequestError as e:
         return jsonify(e.to_dict()), e.status_code
-    except ServerError as e:
-        return jsonify(e.to_dict()), e.status_code
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error in job-descriptions: %s", e)
         error = ServerError(f"Unexpected error: {str(e)}")
         return jsonify(error.to_dict()), error.status_code
 
+@api.route('/job-descriptions/<job_description_id>', methods=['GET'])
+def fetch_job_description(job_description_id):
+    """API endpoint to fetch the derived artifacts of a registered job description"""
+    entry = get_job_description(job_description_id)
+    if entry is None:
+        error = NotFoundError(f"Unknown job_description_id: {job_description_id}")
+        return jsonify(error.to_dict()), error.status_code
+    
+    return jsonify(_job_description_response(entry))
+
+def _job_description_response(entry):
+    """Shape a cached job description entry for API responses"""
+    return {
+        "status": "success",
+        "job_description_id": entry['id'],
+        "requirements": entry['requirements'],
+        "skills": entry['skills'],
+        "seniority_level": entry['seniority_level'],
+        "condensed_length": len(entry['condensed']),
+        "original_length": entry['original_length']
+    }
+
 @api.route('/analyze-overall', methods=['POST'])
 def analyze_overall():
     """API endpoint for overall resume analysis without job description"""
-    try:
-        # Check if the required files are in the request
-        if 'resume' not in request.files:
-            raise BadRequestError("No resume file uploaded")
-        
-        resume_file = request.files['resume']
-        
-        logger.info(f"Received analyze-overall request with resume: {resume_file.filename}")
-        
-        # Validate file
-        if resume_file.filename == '':
-            raise BadRequestError("No file selected")
-        
-        # Check if the file is a PDF
-        if not resume_file.filename.endswith('.pdf'):
-            raise BadRequestError("Only PDF files are supported")
-        
-        # Extract text from PDF
-        try:
-            resume_text = extract_text_from_pdf(resume_file)
-            logger.info("Successfully extracted text from PDF")
-        except Exception as e:
-            logger.error(f"PDF extraction error: {str(e)}")
-            raise BadRequestError(f"PDF extraction error: {str(e)}")
-        
-        # Analyze the resume overall with Gemini
-        try:
-            logger.info("Sending resume to Gemini API for overall analysis")
-            gemini_response = analyze_resume_overall_with_gemini(resume_text)
-            
-            logger.info("Parsing Gemini response")
-            analysis_result = parse_gemini_response(gemini_response)
-            
-            # Add status key to the response
-            if isinstance(analysis_result, dict):
-                analysis_result["status"] = "success"
-                
-                # Log basic info about the result
-                logger.info(f"Overall analysis complete - Score: {analysis_result.get('overall_score', 'N/A')}")
-                return jsonify(analysis_result)
-            else:
-                logger.error("Invalid response format from overall analysis")
-                raise ServerError("Invalid response format from overall analysis")
-        except Exception as e:
-            logger.error(f"Overall analysis error: {str(e)}")
-            raise ServerError(f"Overall analysis error: {str(e)}")
-            
-    except BadRequestError as e:
-        return jsonify(e.to_dict()), e.status_code
-    except ServerError as e:
-        return jsonify(e.to_dict()), e.status_code
-    except Exception as e:
-        logger.error(f"Unexpected error in analyze-overall: {str(e)}")
-        error = ServerError(f"Unexpected error: {str(e)}")
-        return jsonify(error.to_dict()), error.status_code
-        
+    return _run_pipeline(analyze_overall_pipeline, lambda context: _stored_result_response(context['result']))
+
 @api.route('/test-format', methods=['GET'])
 def test_format():
     """Test endpoint that returns a sample analysis result with the expected format"""
@@ -265,86 +423,91 @@ def test_format():
 def health_check():
     """
     Health check endpoint for monitoring and Render's health checks
-    Checks API key validity and uploads directory access
+    Reports the API key and the cached deep checks (uploads directory, model upstream)
     """
+    deep = readiness.results()
     health_status = {
         "status": "ok",
         "message": "Service is running",
         "version": "1.0.0",
         "environment": os.getenv("FLASK_ENV", "development"),
         "checks": {
-            "api_key": "ok" if os.getenv("GOOGLE_API_KEY") else "missing",
-            "uploads_directory": "ok"
+            "api_key": "ok" if config.GOOGLE_API_KEYS else "missing",
+            **{name: result['status'] for name, result in deep['checks'].items()}
         }
     }
     
-    # Check if uploads directory is accessible
-    uploads_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
-    if not os.path.exists(uploads_dir) or not os.access(uploads_dir, os.W_OK):
-        health_status["checks"]["uploads_directory"] = "error"
+    if not deep['ready']:
         health_status["status"] = "warning"
     
     return jsonify(health_status)
 
+@api.route('/livez', methods=['GET'])
+def liveness():
+    """Liveness: the worker answers requests; no dependency is checked"""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@api.route('/readyz', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 when the cached deep checks pass, 503 otherwise"""
+    deep = readiness.results()
+    return jsonify({
+        "status": "ready" if deep['ready'] else "not_ready",
+        "pid": os.getpid(),
+        "warmup": readiness.warmup,
+        "checked_at": deep['checked_at'],
+        "age_seconds": deep['age_seconds'],
+        "checks": deep['checks']
+    }), 200 if deep['ready'] else 503
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose the worker's in-process counters, gauges and timing summaries"""
+    return jsonify({
+        "status": "success",
+        "pid": os.getpid(),
+        "metrics": metrics.snapshot()
+    })
+
+@api.route('/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """List the stored request profiles, newest first"""
+    return jsonify({"status": "success", "profiles": profile_ring.list()})
+
+@api.route('/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """Return a profile report, or its raw pstats file with ?format=pstats"""
+    if request.args.get('format') == 'pstats':
+        path = profile_ring.pstats_path(profile_id)
+        if path is None:
+            raise NotFoundError(f"Unknown profile: {profile_id}")
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{profile_id}.prof")
+    report = profile_ring.get(profile_id)
+    if report is None:
+        raise NotFoundError(f"Unknown profile: {profile_id}")
+    return jsonify({"status": "success", "profile": report})
+
+@api.route('/admin/memory', methods=['GET'])
+@admin_required
+def memory_report():
+    """Per-stage memory summaries and the worst requests of this worker"""
+    snapshot = metrics.snapshot()
+    return jsonify({
+        "status": "success",
+        "pid": os.getpid(),
+        "enabled": config.MEMORY_TRACKING,
+        "stage_peaks": {name: summary for name, summary in snapshot['summaries'].items()
+                        if name.startswith('memory.')},
+        "worst_requests": memory.worst()
+    })
+
 @api.route('/improve-section', methods=['POST'])
 def improve_section():
     """API endpoint for section-wise resume improvement"""
-    try:
-        # Get request data
-        request_data = request.get_json()
-        
-        if not request_data:
-            raise BadRequestError("No JSON data provided")
-        
-        section_type = request_data.get('section_type', '')
-        original_text = request_data.get('original_text', '')
-        
-        logger.info(f"Received improve-section request for section: {section_type}")
-        
-        # Validate input
-        if not section_type:
-            raise BadRequestError("section_type is required")
-        
-        if not original_text or not original_text.strip():
-            raise BadRequestError("original_text is required and cannot be empty")
-        
-        # Validate section type
-        valid_sections = ['summary', 'experience', 'skills', 'education', 'projects']
-        if section_type not in valid_sections:
-            raise BadRequestError(f"Invalid section_type. Must be one of: {', '.join(valid_sections)}")
-        
-        # Improve the section with Gemini
-        try:
-            logger.info("Sending section to Gemini API for improvement")
-            gemini_response = improve_resume_section_with_gemini(section_type, original_text)
-            
-            logger.info("Parsing Gemini improvement response")
-            improvement_result = parse_gemini_response(gemini_response)
-            
-            # Add status key to the response
-            if isinstance(improvement_result, dict):
-                improvement_result["status"] = "success"
-                improvement_result["section_type"] = section_type
-                
-                # Log basic info about the result
-                improvement_score = improvement_result.get('improvement_score', 'N/A')
-                logger.info(f"Section improvement complete - Score: {improvement_score}")
-                return jsonify(improvement_result)
-            else:
-                logger.error("Invalid response format from section improvement")
-                raise ServerError("Invalid response format from section improvement")
-        except Exception as e:
-            logger.error(f"Section improvement error: {str(e)}")
-            raise ServerError(f"Section improvement error: {str(e)}")
-            
-    except BadRequestError as e:
-        return jsonify(e.to_dict()), e.status_code
-    except ServerError as e:
-        return jsonify(e.to_dict()), e.status_code
-    except Exception as e:
-        logger.error(f"Unexpected error in improve-section: {str(e)}")
-        error = ServerError(f"Unexpected error: {str(e)}")
-        return jsonify(error.to_dict()), error.status_code
+    return _run_pipeline(improve_section_pipeline, lambda context: jsonify(context['result']))
 
 @api.route('/test-section-improvement', methods=['GET'])
 def test_section_improvement():
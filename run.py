@@ -1,7 +1,10 @@
 import os
+import logging
 from app import app
 from config import get_config
 
+logger = logging.getLogger(__name__)
+
 def init_app():
     """Initialize the application with proper configuration"""
     config = get_config()
@@ -13,17 +16,26 @@ def init_app():
     # Apply configuration to app
     app.config.from_object(config)
     
-    # Clean up old files in uploads directory
+    # Clean up old files in uploads directory in the background
     try:
-        from utils.file_management import cleanup_old_files
-        cleanup_old_files(config.UPLOAD_FOLDER, max_age_hours=24)
+        from utils.file_management import start_upload_janitor
+        start_upload_janitor(
+            config.UPLOAD_FOLDER,
+            max_age_hours=config.UPLOAD_MAX_AGE_HOURS,
+            max_total_bytes=config.UPLOAD_QUOTA_BYTES,
+            interval_seconds=config.UPLOAD_JANITOR_INTERVAL_SECONDS,
+            skip_dirs=config.UPLOAD_STORE_DIRECTORIES
+        )
     except Exception as e:
-        print(f"Error cleaning up files: {e}")
+        logger.error("Error starting upload janitor: %s", e)
     
     return app
 
 if __name__ == "__main__":
     app = init_app()
+    if get_config().WARMUP_ENABLED:
+        from services.readiness import warm_up
+        warm_up()
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("FLASK_DEBUG", "0") == "1"
     app.run(debug=debug, host='0.0.0.0', port=port)
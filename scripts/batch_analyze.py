@@ -0,0 +1,278 @@
+"""
+Offline batch analysis of a directory or zip archive of resume PDFs
+
+Runs the same extract -> analyze -> parse pipeline as the /analyze and
+/analyze-overall routes without HTTP. Text extraction and the local ATS
+checks run in a process pool; model calls run in a bounded thread pool.
+Results are appended to an NDJSON file that doubles as the checkpoint: on
+restart, files that already have a successful result are skipped.
+
+Usage:
+    python -m scripts.batch_analyze resumes/ -o results.ndjson
+    python -m scripts.batch_analyze archive.zip -o results.ndjson --job-description jd.txt --concurrency 8
+    python -m scripts.batch_analyze resumes/ -o scores.ndjson --job-description jd.txt --sections skills_analysis,ats_analysis
+"""
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from services import analysis_stages as stages
+from services.job_description_service import register_job_description
+from services.pipeline import Pipeline, Stage
+from utils.errors import BadRequestError
+from utils.response_parser import ANALYSIS_SECTIONS, OVERALL_SECTIONS
+from utils.ats_checks import run_ats_checks
+from utils.pdf_extractor import load_pdf, extract_text_from_pdf, TextLayout
+
+# The model half of the /analyze and /analyze-overall pipelines; extraction runs in worker processes
+match_pipeline = Pipeline('batch_analyze', [
+    Stage('model', stages.analyze_match, requires=['resume_text', 'job_description', 'sections'], provides='analysis',
+          cache=stages.stage_cache, cache_key=lambda **inputs: stages.model_cache_key('analyze', *inputs.values())),
+    Stage('merge', stages.merge_match_result, requires=['analysis', 'ats_checks', 'sections'], provides='result'),
+])
+
+overall_pipeline = Pipeline('batch_analyze_overall', [
+    Stage('model', stages.analyze_overall, requires=['resume_text', 'sections'], provides='analysis',
+          cache=stages.stage_cache, cache_key=lambda **inputs: stages.model_cache_key('analyze_overall', *inputs.values())),
+    Stage('merge', stages.merge_overall_result, requires=['analysis', 'ats_checks', 'sections'], provides='result'),
+])
+
+def list_sources(input_path):
+    """
+    List the PDFs to process
+
+    Args:
+        input_path (str): A directory (searched recursively) or a .zip archive
+
+    Returns:
+        tuple: (sources, archive) where sources are paths relative to the
+        directory or member names of the archive, and archive is the zip path or None
+    """
+    if zipfile.is_zipfile(input_path):
+        with zipfile.ZipFile(input_path) as archive:
+            names = [name for name in archive.namelist() if name.lower().endswith('.pdf')]
+        return sorted(names), input_path
+
+    sources = []
+    for root, _, files in os.walk(input_path):
+        for name in files:
+            if name.lower().endswith('.pdf'):
+                sources.append(os.path.relpath(os.path.join(root, name), input_path))
+    return sorted(sources), None
+
+def extract_document(input_path, source, archive=None):
+    """
+    Extract text and run the local ATS checks for one PDF (runs in a worker process)
+
+    Returns:
+        tuple: (resume_text, ats_checks, seconds)
+    """
+    start = time.time()
+    if archive:
+        with zipfile.ZipFile(archive) as zipped:
+            data = zipped.read(source)
+    else:
+        with open(os.path.join(input_path, source), 'rb') as pdf_file:
+            data = pdf_file.read()
+
+    pdf_reader = load_pdf(io.BytesIO(data))
+    layout = TextLayout()
+    resume_text = extract_text_from_pdf(pdf_reader, layout)
+    return resume_text, run_ats_checks(pdf_reader, layout), time.time() - start
+
+def analyze_document(resume_text, ats_checks, job_description, sections=None):
+    """
+    Analyze extracted text with the model and merge the local checks (runs in a thread)
+
+    Returns:
+        tuple: (result, seconds)
+    """
+    start = time.time()
+    pipeline = match_pipeline if job_description else overall_pipeline
+    context = pipeline.run({'resume_text': resume_text, 'ats_checks': ats_checks, 'job_description': job_description,
+                            'sections': sections})
+    return context['result'], time.time() - start
+
+def load_checkpoint(output_path, retry_failed=True):
+    """
+    Read finished sources from an existing output file
+
+    A partial last line left by a crash is truncated so new records start on
+    a fresh line.
+
+    Returns:
+        set: Sources that do not need to be processed again
+    """
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+
+    with open(output_path, 'rb+') as output:
+        valid_bytes = 0
+        for line in output:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            valid_bytes += len(line)
+            if record.get('status') == 'success' or not retry_failed:
+                finished.add(record.get('source'))
+        output.truncate(valid_bytes)
+    return finished
+
+class StageTimer:
+    """Collects per-stage durations for the final report"""
+
+    def __init__(self):
+        self.durations = {}
+
+    def add(self, stage, seconds):
+        self.durations.setdefault(stage, []).append(seconds)
+
+    def report(self):
+        lines = []
+        for stage, values in self.durations.items():
+            ordered = sorted(values)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            lines.append(f"  {stage:<10} total {sum(values):8.2f}s  avg {sum(values) / len(values):6.3f}s  p95 {p95:6.3f}s")
+        return '\n'.join(lines)
+
+def run_batch(input_path, output_path, job_description=None, workers=None, concurrency=4,
+              retry_failed=True, limit=None, sections=None):
+    """
+    Process every PDF under input_path that is not yet in the output file
+
+    Args:
+        input_path (str): Directory or zip archive of PDFs
+        output_path (str): NDJSON file for results (also the checkpoint)
+        job_description (str): Analyze against this job description; overall analysis if empty
+        workers (int): Extraction processes (default: CPU count)
+        concurrency (int): Concurrent model calls
+        retry_failed (bool): Process files whose previous attempt failed again
+        limit (int): Process at most this many files
+        sections (list): Response sections to generate, None for all of them
+
+    Returns:
+        tuple: (counts, timer) with succeeded/failed/skipped counts and the
+        elapsed time, and the StageTimer of per-stage durations
+    """
+    sources, archive = list_sources(input_path)
+    finished = load_checkpoint(output_path, retry_failed)
+    todo = [source for source in sources if source not in finished]
+    skipped = len(sources) - len(todo)
+    if limit:
+        todo = todo[:limit]
+
+    if job_description:
+        # Condensed like the /analyze route does, and cached for every file
+        job_description = register_job_description(job_description)['condensed']
+
+    timer = StageTimer()
+    counts = {'succeeded': 0, 'failed': 0, 'skipped': skipped}
+    start = time.time()
+    # Bound the PDFs held in memory between the two stages
+    max_in_flight = (workers or os.cpu_count() or 1) + concurrency * 2
+
+    with open(output_path, 'a', encoding='utf-8') as output, \
+            ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-model') as model_pool:
+
+        def write(record):
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+            counts['succeeded' if record['status'] == 'success' else 'failed'] += 1
+            done = counts['succeeded'] + counts['failed']
+            elapsed = time.time() - start
+            print(f"[{done}/{len(todo)}] {record['source']}: {record['status']} ({done / elapsed:.2f} files/s)",
+                  file=sys.stderr)
+
+        pending = {}
+        remaining = iter(todo)
+
+        def refill():
+            while len(pending) < max_in_flight:
+                source = next(remaining, None)
+                if source is None:
+                    return
+                future = extract_pool.submit(extract_document, input_path, source, archive)
+                pending[future] = ('extract', source, None)
+
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, source, extract_seconds = pending.pop(future)
+                try:
+                    if stage == 'extract':
+                        resume_text, ats_checks, seconds = future.result()
+                        timer.add('extract', seconds)
+                        model_future = model_pool.submit(analyze_document, resume_text, ats_checks, job_description, sections)
+                        pending[model_future] = ('model', source, seconds)
+                        continue
+
+                    result, seconds = future.result()
+                    timer.add('model', seconds)
+                    write({
+                        'source': source,
+                        'status': 'success',
+                        'result': result,
+                        'timings': {'extract_seconds': round(extract_seconds, 3), 'model_seconds': round(seconds, 3)}
+                    })
+                except Exception as e:
+                    write({'source': source, 'status': 'error', 'stage': stage, 'error': str(e)})
+            refill()
+
+    counts['elapsed_seconds'] = time.time() - start
+    return counts, timer
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a directory or zip archive of resume PDFs")
+    parser.add_argument('input', help="Directory of PDFs or a .zip archive")
+    parser.add_argument('-o', '--output', default='batch_results.ndjson', help="NDJSON output and checkpoint file")
+    parser.add_argument('--job-description', help="Text file with a job description (default: overall analysis)")
+    parser.add_argument('--workers', type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent model calls")
+    parser.add_argument('--no-retry-failed', action='store_true', help="Skip files whose previous attempt failed")
+    parser.add_argument('--limit', type=int, default=None, help="Process at most this many files")
+    parser.add_argument('--sections', default='', help="Comma separated response sections to generate (default: all)")
+    args = parser.parse_args()
+
+    try:
+        sections = stages.parse_sections([args.sections], ANALYSIS_SECTIONS if args.job_description else OVERALL_SECTIONS)
+    except BadRequestError as e:
+        parser.error(e.message)
+
+    job_description = None
+    if args.job_description:
+        with open(args.job_description, encoding='utf-8') as jd_file:
+            job_description = jd_file.read()
+
+    counts, timer = run_batch(
+        args.input, args.output,
+        job_description=job_description,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        retry_failed=not args.no_retry_failed,
+        limit=args.limit,
+        sections=sections
+    )
+
+    processed = counts['succeeded'] + counts['failed']
+    elapsed = counts['elapsed_seconds']
+    print(f"Processed {processed} files ({counts['succeeded']} succeeded, {counts['failed']} failed, "
+          f"{counts['skipped']} already done) in {elapsed:.1f}s: "
+          f"{processed / elapsed if elapsed else 0:.2f} files/s")
+    if timer.durations:
+        print("Per-stage time:")
+        print(timer.report())
+    return 1 if counts['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Benchmark harness for /analyze generation latency
+
+Runs the analysis service directly (no HTTP) once per output format and
+reports latency percentiles and estimated output tokens, so schema and
+generation settings changes can be compared.
+
+Usage:
+    python -m scripts.benchmark --runs 20
+    python -m scripts.benchmark --provider gemini --resume resume.pdf --job-description jd.txt --runs 5
+
+With the local provider, generation time is simulated per output token,
+which shows the effect of output size only; use --provider gemini for
+real numbers.
+"""
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from services import gemini_service
+from services.providers import LocalProvider
+from utils.metrics import metrics
+from utils.pdf_extractor import extract_text_from_pdf
+from utils.response_parser import expand_compact_analysis
+
+SAMPLE_RESUME = """Jane Doe - Senior Software Engineer
+jane.doe@example.com | +1 555 123 4567 | linkedin.com/in/janedoe
+
+SUMMARY
+Backend engineer with 7 years of experience building Python and Go services on AWS.
+
+EXPERIENCE
+Acme Corp - Senior Software Engineer (2020 - present)
+- Led migration of a monolith to 14 microservices, cutting deploy time by 80%
+- Built a Kafka event pipeline processing 2M events per day
+Globex - Software Engineer (2017 - 2020)
+- Developed REST APIs in Flask and PostgreSQL for 300k monthly users
+
+EDUCATION
+B.Sc. Computer Science, State University, 2017
+
+SKILLS
+Python, Go, Flask, PostgreSQL, Kafka, AWS, Docker, Terraform
+"""
+
+SAMPLE_JOB_DESCRIPTION = """Senior Backend Engineer
+Requirements: 5+ years of Python, experience with distributed systems, Kubernetes,
+AWS, PostgreSQL, CI/CD pipelines and observability tooling. Experience mentoring engineers.
+"""
+
+# A realistic compact answer; its expansion stands in for the full-format answer
+SAMPLE_COMPACT_ANALYSIS = {
+    "s": 78, "ats": 82, "cmp": 74,
+    "lvl": ["Senior", "Senior", ""],
+    "top": ["Quantified microservice migration", "Event streaming at scale", "Strong Python and AWS background"],
+    "act": [
+        ["H", "Skills", "Add Kubernetes and CI/CD experience if you have it"],
+        ["M", "Experience", "Mention mentoring or leadership of other engineers"],
+        ["L", "Summary", "Tailor the summary to distributed systems work"]
+    ],
+    "m": {"rel": [80, 85, 75], "ats": [78, 70], "cq": [82, 80, 85]},
+    "str": ["Clear, quantified achievements", "Relevant backend stack", "Steady career progression"],
+    "wk": ["No Kubernetes experience listed", "No observability tooling mentioned"],
+    "imp": ["Add a skills line for CI/CD tools", "Describe on-call and monitoring work"],
+    "km": ["Python", "AWS", "PostgreSQL", "distributed systems"],
+    "kx": ["Kubernetes", "CI/CD", "observability", "mentoring"],
+    "atr": ["Use the exact phrase 'CI/CD'", "Add Kubernetes to the skills section if applicable"],
+    "sm": ["Python", "AWS", "PostgreSQL"],
+    "sx": ["Kubernetes", "CI/CD", "Observability"],
+    "sa": ["Go", "Kafka", "Terraform"],
+    "fb": {
+        "ci": "Complete and professional.",
+        "ps": "Solid but could target distributed systems more directly.",
+        "we": "Strong, quantified bullets.",
+        "ed": "Relevant degree, well formatted.",
+        "sk": "Good coverage; missing Kubernetes and CI/CD.",
+        "pr": "No projects section; consider adding one.",
+        "ce": "No certifications listed."
+    },
+    "it": ["Platform engineering", "OpenTelemetry adoption"],
+    "ir": ["Highlight reliability work", "Show infrastructure-as-code experience"],
+    "gap": [
+        ["Kubernetes", ["Certified Kubernetes Application Developer", "Deploy a side project on EKS"]],
+        ["Observability", ["Learn OpenTelemetry", "Add Prometheus/Grafana to a project"]]
+    ]
+}
+
+def _install_local_provider(output_format, args):
+    """Serve every tier from a local provider answering in the given format"""
+    response = SAMPLE_COMPACT_ANALYSIS
+    if output_format == 'full':
+        response = expand_compact_analysis(json.loads(json.dumps(SAMPLE_COMPACT_ANALYSIS)))
+    provider = LocalProvider(
+        name=f'benchmark-{output_format}',
+        latency=args.latency,
+        jitter=args.jitter,
+        seed=0,
+        output_token_seconds=args.output_token_seconds,
+        responses={'analyze': response}
+    )
+    for tier in gemini_service.router.tier_order:
+        gemini_service._providers[(tier, False)] = provider
+        gemini_service._providers[(tier, True)] = provider
+
+def run_benchmark(output_format, resume_text, job_description, args):
+    """
+    Run /analyze generations in one output format
+
+    Returns:
+        dict: Latency percentiles and estimated output tokens
+    """
+    gemini_service.config.ANALYZE_OUTPUT_FORMAT = output_format
+    if args.provider == 'local':
+        _install_local_provider(output_format, args)
+    metrics.reset()
+
+    def timed_call(_):
+        start = time.time()
+        gemini_service.analyze_resume_with_gemini(resume_text, job_description)
+        return time.time() - start
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = sorted(pool.map(timed_call, range(args.runs)))
+
+    output_tokens = metrics.snapshot()['summaries'].get('gemini.analyze.output_tokens_estimated', {})
+    return {
+        'format': output_format,
+        'runs': len(latencies),
+        'p50_seconds': round(latencies[len(latencies) // 2], 3),
+        'p95_seconds': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        'mean_seconds': round(sum(latencies) / len(latencies), 3),
+        'output_tokens': output_tokens.get('avg')
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /analyze latency per output format")
+    parser.add_argument('--provider', choices=['local', 'gemini'], default='local')
+    parser.add_argument('--formats', default='full,compact', help="Comma separated output formats to compare")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--resume', help="PDF resume to analyze (default: built-in sample text)")
+    parser.add_argument('--job-description', help="Text file with the job description")
+    parser.add_argument('--latency', type=float, default=0.2, help="Local provider base latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Local provider latency jitter in seconds")
+    parser.add_argument('--output-token-seconds', type=float, default=0.002,
+                        help="Local provider generation time per output token")
+    args = parser.parse_args()
+
+    resume_text = SAMPLE_RESUME
+    if args.resume:
+        with open(args.resume, 'rb') as pdf_file:
+            resume_text = extract_text_from_pdf(pdf_file)
+    job_description = SAMPLE_JOB_DESCRIPTION
+    if args.job_description:
+        with open(args.job_description, encoding='utf-8') as jd_file:
+            job_description = jd_file.read()
+
+    # Measure single requests, not hedges
+    gemini_service.config.HEDGE_ENABLED = False
+
+    results = [run_benchmark(output_format.strip(), resume_text, job_description, args)
+               for output_format in args.formats.split(',')]
+
+    print(f"{'format':<10}{'runs':>6}{'p50 s':>10}{'p95 s':>10}{'mean s':>10}{'out tok':>10}")
+    for result in results:
+        print(f"{result['format']:<10}{result['runs']:>6}{result['p50_seconds']:>10}"
+              f"{result['p95_seconds']:>10}{result['mean_seconds']:>10}{result['output_tokens'] or '-':>10}")
+    if len(results) > 1 and results[0]['mean_seconds']:
+        baseline = results[0]
+        for result in results[1:]:
+            change = 100 * (result['mean_seconds'] - baseline['mean_seconds']) / baseline['mean_seconds']
+            print(f"{result['format']} vs {baseline['format']}: {change:+.1f}% mean latency")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Soak test: push many /analyze requests through the local model stand-in and track RSS
+
+By default the app runs in this process, with the Flask test client and
+MODEL_PROVIDER=local, so only the extraction, checks, parsing and response
+path is exercised and the RSS is this process's own. With --url, requests
+go to a running server instead. RSS is then summed over --pid and its child
+processes, e.g. the gunicorn master and its workers, so recycled workers
+show up as drops.
+
+Usage:
+    python -m scripts.soak_test --requests 20000 --concurrency 4 --plot rss.png
+    MODEL_PROVIDER=local gunicorn wsgi:application --workers 2 &
+    python -m scripts.soak_test --url http://localhost:8000 --pid $! --requests 50000 --csv rss.csv
+
+The plot needs matplotlib; without it an ASCII chart is printed.
+"""
+import io
+import os
+import sys
+import time
+import uuid
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure the in-process app before it is imported
+os.environ.setdefault('MODEL_PROVIDER', 'local')
+os.environ.setdefault('LOCAL_MODEL_LATENCY_SECONDS', '0')
+os.environ.setdefault('LOCAL_MODEL_JITTER_SECONDS', '0')
+# Identical inputs would otherwise be served from the stage cache after the first pass
+os.environ.setdefault('STAGE_CACHE_ENABLED', '0')
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+from utils.sample_pdf import text_pdf
+from utils.worker_memory import current_rss_bytes
+
+JOB_DESCRIPTION = "Senior Python engineer. Requirements: 5+ years of Python, AWS, PostgreSQL, Docker, CI/CD."
+
+def sample_pdf(index, lines=45):
+    """Build a small single-page text PDF whose content varies with index"""
+    return text_pdf([f'Candidate {index} - Software Engineer'] + [
+        f'Built service {line} for team {index % 97} with Python and AWS, '
+        f'cutting latency by {(index + line) % 90} percent'
+        for line in range(lines)
+    ])
+
+def load_pdfs(pdf_dir):
+    """Read every PDF of a directory, or generate a varied set"""
+    if not pdf_dir:
+        return [sample_pdf(index) for index in range(50)]
+    pdfs = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith('.pdf'):
+            with open(os.path.join(pdf_dir, name), 'rb') as pdf_file:
+                pdfs.append(pdf_file.read())
+    if not pdfs:
+        raise SystemExit(f"No PDFs in {pdf_dir}")
+    return pdfs
+
+def process_tree_rss(pid):
+    """Sum the RSS of a process and its direct children from /proc (Linux only)"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as children:
+            pids += [int(child) for child in children.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for process in pids:
+        try:
+            with open(f'/proc/{process}/statm') as statm:
+                total += int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+def make_in_process_sender():
+    """Send requests to the app in this process"""
+    from app import app
+    local = threading.local()
+
+    def send(pdf):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.post('/analyze', data={
+            'resume': (io.BytesIO(pdf), 'resume.pdf'),
+            'job_description': JOB_DESCRIPTION
+        }, content_type='multipart/form-data')
+        status = response.status_code
+        response.close()
+        return status
+    return send
+
+def make_http_sender(url):
+    """Send multipart requests to a running server"""
+    endpoint = url.rstrip('/') + '/analyze'
+
+    def send(pdf):
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="job_description"\r\n\r\n{JOB_DESCRIPTION}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="resume"; filename="resume.pdf"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'
+        ).encode('utf-8') + pdf + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        request = urllib.request.Request(endpoint, data=body, method='POST',
+                                         headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 'connection-error'
+    return send
+
+def ascii_chart(samples, width=60, height=15):
+    """Render RSS (MB) against completed requests as text"""
+    values = [rss for _, _, rss in samples]
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    columns = [values[min(len(values) - 1, int(i * len(values) / width))] for i in range(width)]
+    rows = []
+    for row in range(height, -1, -1):
+        level = low + span * row / height
+        cells = ''.join('█' if value >= level else ' ' for value in columns)
+        rows.append(f"{level:8.1f} MB |{cells}")
+    rows.append(f"{'':11}+{'-' * width}")
+    rows.append(f"{'':12}0{'requests':^{width - 10}}{samples[-1][1]:>9}")
+    return '\n'.join(rows)
+
+def save_plot(samples, path, title):
+    """
+    Plot RSS over time with matplotlib
+
+    Returns:
+        bool: False if matplotlib is not installed
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, printing an ASCII chart instead", file=sys.stderr)
+        return False
+
+    figure, axis = plt.subplots(figsize=(10, 4))
+    axis.plot([elapsed for elapsed, _, _ in samples], [rss for _, _, rss in samples])
+    axis.set_xlabel('seconds')
+    axis.set_ylabel('RSS (MB)')
+    axis.set_title(title)
+    figure.savefig(path, bbox_inches='tight')
+    print(f"Plot saved to {path}")
+    return True
+
+def growth_per_thousand(samples):
+    """Least-squares slope of RSS (MB) per 1000 completed requests"""
+    points = [(completed, rss) for _, completed, rss in samples]
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0.0
+    return 1000 * sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+def run_soak(send, pdfs, total, concurrency, rss_reader, interval):
+    """
+    Send requests and sample RSS while they run
+
+    Returns:
+        tuple: (samples as (elapsed, completed, rss_mb), status counts, elapsed seconds)
+    """
+    statuses = {}
+    completed = [0]
+    lock = threading.Lock()
+    done = threading.Event()
+    samples = []
+    start = time.time()
+
+    def sample():
+        while True:
+            samples.append((time.time() - start, completed[0], rss_reader() / 2**20))
+            if done.wait(interval):
+                samples.append((time.time() - start, completed[0], rss_reader() / 2**20))
+                return
+
+    def one(index):
+        status = send(pdfs[index % len(pdfs)])
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            completed[0] += 1
+            if completed[0] % 1000 == 0:
+                print(f"{completed[0]}/{total} requests, RSS {rss_reader() / 2**20:.1f} MB", file=sys.stderr)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    done.set()
+    sampler.join()
+    return samples, statuses, time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test /analyze and track RSS over time")
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--url', help="Base URL of a running server (default: run the app in this process)")
+    parser.add_argument('--pid', type=int, help="Server process to measure with --url (its children are included)")
+    parser.add_argument('--pdf-dir', help="Directory of PDFs to send (default: generated sample resumes)")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument('--csv', help="Write the samples to this CSV file")
+    parser.add_argument('--plot', help="Save an RSS plot to this image file (needs matplotlib)")
+    args = parser.parse_args()
+
+    if args.url and not args.pid:
+        parser.error("--pid is required with --url to measure the server's memory")
+
+    pdfs = load_pdfs(args.pdf_dir)
+    send = make_http_sender(args.url) if args.url else make_in_process_sender()
+    rss_reader = (lambda: process_tree_rss(args.pid)) if args.url else current_rss_bytes
+
+    samples, statuses, elapsed = run_soak(send, pdfs, args.requests, args.concurrency, rss_reader, args.interval)
+
+    rss_values = [rss for _, _, rss in samples]
+    print(f"{args.requests} requests in {elapsed:.1f}s ({args.requests / elapsed:.1f} req/s), statuses: {statuses}")
+    print(f"RSS start {rss_values[0]:.1f} MB, end {rss_values[-1]:.1f} MB, peak {max(rss_values):.1f} MB, "
+          f"trend {growth_per_thousand(samples):+.2f} MB per 1000 requests")
+
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8') as csv_file:
+            csv_file.write('elapsed_seconds,completed_requests,rss_mb\n')
+            for elapsed_seconds, completed, rss in samples:
+                csv_file.write(f'{elapsed_seconds:.2f},{completed},{rss:.2f}\n')
+
+    if not (args.plot and save_plot(samples, args.plot, f'/analyze soak test: {args.requests} requests')):
+        print(ascii_chart(samples))
+    return 1 if set(statuses) - {200} else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
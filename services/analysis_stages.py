@@ -0,0 +1,189 @@
+"""
+Stages shared by the analysis pipelines (see services/pipeline.py)
+
+Each stage takes the context values it requires as keyword arguments and
+returns what it provides, so routes and batch jobs only declare how the
+stages are wired together.
+"""
+import os
+import copy
+import json
+import logging
+
+from config import get_config
+from services.gemini_service import analyze_resume_with_gemini, improve_resume_section_with_gemini, analyze_resume_overall_with_gemini
+from services.job_description_service import register_job_description, get_job_description
+from services import request_profiler
+from utils.ats_checks import run_ats_checks, merge_ats_checks
+from utils.content_store import ContentStore, content_hash
+from utils.errors import BadRequestError, NotFoundError
+from utils.pdf_extractor import load_pdf, extract_text_from_pdf, configure_backends, TextLayout
+from utils.response_parser import ANALYSIS_SECTIONS, OVERALL_SECTIONS
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+VALID_SECTIONS = ['summary', 'experience', 'skills', 'education', 'projects']
+
+configure_backends(config.PDF_BACKENDS, config.PDF_BACKEND_BENCHMARK_SAMPLES)
+
+# Model outputs keyed by their inputs, checked before a model stage runs
+stage_cache = ContentStore(
+    max_entries=config.STAGE_CACHE_SIZE,
+    directory=os.path.join(config.UPLOAD_FOLDER, 'stage_cache'),
+    max_files=config.CONTENT_STORE_MAX_FILES
+)
+
+def model_cache_key(stage, *inputs):
+    """
+    Build the cache key of a model stage
+
+    The key covers the inputs and the settings that change the model output,
+    so a new schema or model never serves a stale entry. Stages that sample
+    (temperature above 0) are not cached unless STAGE_CACHE_SAMPLED is set:
+    asking again should give a different answer, not the stored one.
+
+    Returns:
+        str: The key, or None when the stage is not cached
+    """
+    # Debug usage fields describe one call, so they are never served from the cache,
+    # and a profiled request must do the real work
+    if not config.STAGE_CACHE_ENABLED or config.USAGE_DEBUG_FIELD or request_profiler.current():
+        return None
+    if config.GENERATION_CONFIG.get(stage, {}).get('temperature', 0) > 0 and not config.STAGE_CACHE_SAMPLED:
+        return None
+    fingerprint = [stage, config.ANALYZE_OUTPUT_FORMAT, config.MODEL_TIERS, config.GENERATION_CONFIG.get(stage)]
+    return 'stg' + content_hash(json.dumps(fingerprint + list(inputs), sort_keys=True, default=str))[:40]
+
+def read_resume_upload(request):
+    """Validate the uploaded resume file of a multipart request"""
+    if 'resume' not in request.files:
+        raise BadRequestError("No resume file uploaded")
+
+    resume_file = request.files['resume']
+    logger.info("Received %s request with resume: %s", request.path, resume_file.filename)
+
+    if resume_file.filename == '':
+        raise BadRequestError("No file selected")
+
+    if not resume_file.filename.endswith('.pdf'):
+        raise BadRequestError("Only PDF files are supported")
+
+    return resume_file
+
+def read_job_description(request):
+    """Resolve the job description of a request to its cached condensed form"""
+    job_description = request.form.get('job_description', '')
+    job_description_id = request.form.get('job_description_id', '')
+
+    if job_description_id:
+        jd_entry = get_job_description(job_description_id)
+        if jd_entry is None:
+            raise NotFoundError(f"Unknown job_description_id: {job_description_id}")
+        return jd_entry['condensed']
+    if job_description.strip():
+        return register_job_description(job_description)['condensed']
+    return job_description
+
+def parse_sections(values, valid_sections):
+    """
+    Resolve requested response sections
+
+    Args:
+        values (list): Section names, each value possibly comma separated
+        valid_sections (list): The endpoint's sections in response order, score first
+
+    Returns:
+        list: The requested sections in response order with the score first, or None for all of them
+    """
+    names = {name.strip() for value in values for name in value.split(',') if name.strip()}
+    if not names:
+        return None
+    unknown = sorted(names - set(valid_sections))
+    if unknown:
+        raise BadRequestError(f"Unknown sections: {', '.join(unknown)}. Must be among: {', '.join(valid_sections)}")
+    # The first section is the score, which every response carries
+    sections = [valid_sections[0]] + [section for section in valid_sections[1:] if section in names]
+    return None if len(sections) == len(valid_sections) else sections
+
+def read_analysis_sections(request):
+    """Resolve the optional `sections` form field of /analyze (comma separated or repeated)"""
+    return parse_sections(request.form.getlist('sections'), ANALYSIS_SECTIONS)
+
+def read_overall_sections(request):
+    """Resolve the optional `sections` form field of /analyze-overall"""
+    return parse_sections(request.form.getlist('sections'), OVERALL_SECTIONS)
+
+def read_section_request(request):
+    """Validate the JSON body of an improve-section request"""
+    request_data = request.get_json()
+
+    if not request_data:
+        raise BadRequestError("No JSON data provided")
+
+    section_type = request_data.get('section_type', '')
+    original_text = request_data.get('original_text', '')
+
+    logger.info("Received improve-section request for section: %s", section_type)
+
+    if not section_type:
+        raise BadRequestError("section_type is required")
+
+    if not original_text or not original_text.strip():
+        raise BadRequestError("original_text is required and cannot be empty")
+
+    if section_type not in VALID_SECTIONS:
+        raise BadRequestError(f"Invalid section_type. Must be one of: {', '.join(VALID_SECTIONS)}")
+
+    return section_type, original_text
+
+def extract_resume(resume_file):
+    """Extract text from the PDF, recording the layout for the local format checks"""
+    pdf_reader = load_pdf(resume_file)
+    layout = TextLayout()
+    resume_text = extract_text_from_pdf(pdf_reader, layout)
+    logger.info("Successfully extracted text from PDF")
+    return pdf_reader, layout, resume_text
+
+def check_format(pdf_reader, layout):
+    """Run the local ATS format checks"""
+    return run_ats_checks(pdf_reader, layout)
+
+def analyze_match(resume_text, job_description, sections=None):
+    """Analyze the resume against the job description with the model"""
+    logger.info("Sending resume to Gemini API for analysis")
+    return analyze_resume_with_gemini(resume_text, job_description, sections)
+
+def analyze_overall(resume_text, sections=None):
+    """Analyze the resume on its own with the model"""
+    logger.info("Sending resume to Gemini API for overall analysis")
+    return analyze_resume_overall_with_gemini(resume_text, sections)
+
+def improve_section(section_type, original_text):
+    """Rewrite one resume section with the model"""
+    logger.info("Sending section to Gemini API for improvement")
+    return improve_resume_section_with_gemini(section_type, original_text)
+
+def merge_match_result(analysis, ats_checks, sections=None):
+    """Combine the model analysis with the local checks"""
+    # Copied so merging never touches a cached model output
+    result = copy.deepcopy(analysis)
+    merge_ats_checks(result, ats_checks, sections=sections)
+    result["status"] = "success"
+    logger.info("Analysis complete - Score: %s", result.get('score', 'N/A'))
+    return result
+
+def merge_overall_result(analysis, ats_checks, sections=None):
+    """Combine the overall model analysis with the local checks"""
+    result = copy.deepcopy(analysis)
+    merge_ats_checks(result, ats_checks, overall=True, sections=sections)
+    result["status"] = "success"
+    logger.info("Overall analysis complete - Score: %s", result.get('overall_score', 'N/A'))
+    return result
+
+def section_result(improvement, section_type):
+    """Label a section improvement for the response"""
+    result = dict(improvement, status="success", section_type=section_type)
+    logger.info("Section improvement complete - Score: %s", result.get('improvement_score', 'N/A'))
+    return result
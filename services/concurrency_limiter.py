@@ -0,0 +1,314 @@
+"""
+Adaptive (AIMD) concurrency limit with weighted-fair priority lanes in front of upstream model calls
+"""
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from utils.deadlines import POLL_INTERVAL_SECONDS
+from utils.errors import TooManyRequestsError, DeadlineExceededError, ClientDisconnectedError
+from utils.metrics import metrics
+
+class _Waiter:
+    """A caller queued for a slot"""
+    __slots__ = ('priority_class', 'granted', 'enqueued_at')
+
+    def __init__(self, priority_class):
+        self.priority_class = priority_class
+        self.granted = False
+        self.enqueued_at = time.time()
+
+class _Slot:
+    """A held slot; upstream calls attached to it keep it taken until they finish"""
+    __slots__ = ('futures',)
+
+    def __init__(self):
+        self.futures = []
+
+    def hold_until(self, future):
+        """Keep the slot taken until the future completes, even if the caller stops waiting first"""
+        self.futures.append(future)
+
+class PriorityLanes:
+    """
+    Weighted-fair (stride scheduled) FIFO queues, one per priority class.
+
+    Each class advances its virtual time by 1/weight whenever it is served,
+    and the non-empty class with the lowest virtual time goes next, so a class
+    with weight 4 gets four slots for every one of a class with weight 1.
+    """
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+        self.queues = {name: deque() for name in self.weights}
+        self.virtual_time = {name: 0.0 for name in self.weights}
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def push(self, waiter):
+        queue = self.queues[waiter.priority_class]
+        if not queue:
+            # An idle class must not bank credit while it had nothing queued
+            busy = [self.virtual_time[name] for name, other in self.queues.items() if other]
+            if busy:
+                self.virtual_time[waiter.priority_class] = max(self.virtual_time[waiter.priority_class], min(busy))
+        queue.append(waiter)
+
+    def remove(self, waiter):
+        try:
+            self.queues[waiter.priority_class].remove(waiter)
+        except ValueError:
+            pass
+
+    def pop(self, eligible):
+        """
+        Take the next waiter from the eligible classes
+
+        Args:
+            eligible (callable): Returns True if a class may be served now
+
+        Returns:
+            _Waiter: The next waiter, or None
+        """
+        candidates = [name for name, queue in self.queues.items() if queue and eligible(name)]
+        if not candidates:
+            return None
+        chosen = min(candidates, key=lambda name: (self.virtual_time[name], -self.weights[name]))
+        self.virtual_time[chosen] += 1.0 / self.weights[chosen]
+        return self.queues[chosen].popleft()
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits concurrent upstream calls and adapts the limit to observed latency.
+
+    The limit grows additively (by 1/limit per fast call) and shrinks
+    multiplicatively when a call fails or is much slower than the endpoint's
+    baseline latency, at most once per baseline interval. Callers beyond the
+    limit wait in weighted-fair priority lanes; a share of the limit is
+    reserved for the interactive class so long analyses cannot take every
+    slot. When the queue is full callers are rejected immediately
+    with a 429 and a Retry-After estimate.
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=64, max_queue=32,
+                 queue_timeout=30, latency_tolerance=2.0, backoff=0.7, baseline_alpha=0.05,
+                 class_weights=None, endpoint_classes=None, interactive_class='interactive',
+                 reserved_fraction=0.25):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.baseline_alpha = baseline_alpha
+        self.endpoint_classes = dict(endpoint_classes or {})
+        self.interactive_class = interactive_class
+        self.reserved_fraction = reserved_fraction
+        self.lanes = PriorityLanes(class_weights or {interactive_class: 1})
+        self.default_class = min(self.lanes.weights, key=self.lanes.weights.get)
+        self.in_flight = 0
+        self._baselines = {}
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def queued(self):
+        return len(self.lanes)
+
+    def priority_class(self, endpoint):
+        """Get the priority class of an endpoint (the lowest class if unmapped)"""
+        priority_class = self.endpoint_classes.get(endpoint, self.default_class)
+        return priority_class if priority_class in self.lanes.weights else self.default_class
+
+    def _capacity(self, priority_class):
+        """Number of slots a class may fill; the rest is reserved for interactive calls"""
+        limit = int(self.limit)
+        if priority_class == self.interactive_class or limit < 2:
+            return limit
+        reserved = max(1, int(round(limit * self.reserved_fraction)))
+        return limit - reserved
+
+    def _dispatch(self):
+        """Grant free slots to queued callers in weighted-fair order"""
+        granted = False
+        while True:
+            waiter = self.lanes.pop(lambda name: self.in_flight < self._capacity(name))
+            if waiter is None:
+                break
+            waiter.granted = True
+            self.in_flight += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def _retry_after(self):
+        baselines = list(self._baselines.values())
+        typical_latency = sum(baselines) / len(baselines) if baselines else 1.0
+        return max(1, math.ceil(typical_latency * (self.queued + 1) / max(self.limit, 1)))
+
+    def _publish(self):
+        metrics.set_gauge('limiter.in_flight', self.in_flight)
+        metrics.set_gauge('limiter.queued', self.queued)
+        metrics.set_gauge('limiter.limit', round(self.limit, 2))
+        for name, queue in self.lanes.queues.items():
+            metrics.set_gauge(f'scheduler.{name}.queued', len(queue))
+
+    def acquire(self, endpoint, deadline=None):
+        """
+        Take a concurrency slot, waiting in the endpoint's priority lane if necessary
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            deadline (Deadline): The request's deadline; the wait stops when it is abandoned
+
+        Raises:
+            TooManyRequestsError: If the wait queue is full or the wait times out
+            DeadlineExceededError, ClientDisconnectedError: If the request is abandoned while queued
+        """
+        priority_class = self.priority_class(endpoint)
+        with self._condition:
+            if not self.lanes.queues[priority_class] and self.in_flight < self._capacity(priority_class):
+                self.in_flight += 1
+                metrics.observe(f'scheduler.{priority_class}.queue_wait_seconds', 0.0)
+                self._publish()
+                return
+
+            if self.queued >= self.max_queue:
+                metrics.increment('limiter.rejected')
+                metrics.increment(f'limiter.{endpoint}.rejected')
+                raise TooManyRequestsError("Server is busy, please retry shortly", retry_after=self._retry_after())
+
+            waiter = _Waiter(priority_class)
+            self.lanes.push(waiter)
+            self._dispatch()
+            self._publish()
+            try:
+                timeout_at = waiter.enqueued_at + self.queue_timeout
+                while not waiter.granted:
+                    remaining = timeout_at - time.time()
+                    if remaining <= 0:
+                        self.lanes.remove(waiter)
+                        metrics.increment('limiter.timed_out')
+                        raise TooManyRequestsError("Server is busy, please retry shortly", retry_after=self._retry_after())
+                    if deadline is not None and deadline.abandoned():
+                        self.lanes.remove(waiter)
+                        metrics.increment('limiter.abandoned')
+                        deadline.check()
+                    self._condition.wait(min(remaining, POLL_INTERVAL_SECONDS) if deadline is not None else remaining)
+            finally:
+                wait = time.time() - waiter.enqueued_at
+                metrics.observe('limiter.queue_wait_seconds', wait)
+                metrics.observe(f'scheduler.{priority_class}.queue_wait_seconds', wait)
+                self._publish()
+
+    def try_acquire(self, endpoint):
+        """
+        Take a slot only if one is free right now, without queueing
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+
+        Returns:
+            bool: True if a slot was taken and must be released
+        """
+        priority_class = self.priority_class(endpoint)
+        with self._condition:
+            if self.queued or self.in_flight >= self._capacity(priority_class):
+                return False
+            self.in_flight += 1
+            self._publish()
+            return True
+
+    def release(self, endpoint, latency, failed=False, adjust=True):
+        """
+        Return a slot and adjust the limit from the call's outcome
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            latency (float): Duration of the upstream call in seconds
+            failed (bool): True if the upstream call raised an error
+            adjust (bool): False for calls that were cancelled and say nothing about upstream health
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if not adjust:
+                self._dispatch()
+                self._publish()
+                return
+            baseline = self._baselines.get(endpoint)
+            slow = baseline is not None and latency > baseline * self.latency_tolerance
+
+            now = time.time()
+            if failed or slow:
+                # Shrink at most once per baseline interval so one slow burst is one signal
+                if now - self._last_decrease >= (baseline or 1.0):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    metrics.increment('limiter.decreases')
+            elif self.in_flight + 1 >= int(self.limit):
+                # Only grow when the limit was actually the constraint
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            if not failed:
+                self._baselines[endpoint] = latency if baseline is None else \
+                    baseline + self.baseline_alpha * (latency - baseline)
+
+            self._dispatch()
+            self._publish()
+
+    def _release_when_done(self, endpoint, futures, latency, failed, adjust):
+        """Release a slot once every one of the futures has completed"""
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self.release(endpoint, latency, failed, adjust=adjust)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    @contextmanager
+    def slot(self, endpoint, deadline=None):
+        """
+        Context manager that holds a slot for the duration of an upstream call
+
+        Upstream calls attached with hold_until() keep the slot after the block
+        exits until they finish: a call the caller stopped waiting for (the
+        request was abandoned, or a hedge won) still runs upstream and must
+        count against the limit.
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            deadline (Deadline): The request's deadline, if any
+
+        Yields:
+            The held slot
+        """
+        self.acquire(endpoint, deadline)
+        held = _Slot()
+        start = time.time()
+        failed = True
+        adjust = True
+        try:
+            yield held
+            failed = False
+        except (DeadlineExceededError, ClientDisconnectedError):
+            # The request gave up; that says nothing about upstream health
+            adjust = False
+            raise
+        finally:
+            latency = time.time() - start
+            running = [future for future in held.futures if not future.done()]
+            if running:
+                metrics.increment('limiter.held_after_exit')
+                self._release_when_done(endpoint, running, latency, failed, adjust)
+            else:
+                self.release(endpoint, latency, failed, adjust=adjust)
@@ -0,0 +1,237 @@
+"""
+Prompt prefix caching backends
+
+Prompts are laid out as a byte-stable static prefix (instructions, schema and
+optionally the job description) followed by the variable resume text. A
+backend decides whether that prefix can be served from a cached-context handle
+and reports how many prompt tokens were cached versus sent uncached.
+"""
+import time
+import hashlib
+import logging
+import datetime
+import threading
+
+import google.generativeai as genai
+
+from services import genai_adapter
+from utils.token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+def prefix_key(model_name, prefix, scope=''):
+    """Stable key for a (model, prefix) pair, optionally within a scope such as an API key"""
+    return hashlib.sha256(f"{scope}\x00{model_name}\x00{prefix}".encode('utf-8')).hexdigest()
+
+class GenerationResult:
+    """Text of a generation plus token accounting"""
+
+    def __init__(self, text, response=None, cached_tokens=0, uncached_tokens=0, cache_hit=False):
+        self.text = text
+        self.response = response
+        self.cached_tokens = cached_tokens
+        self.uncached_tokens = uncached_tokens
+        self.cache_hit = cache_hit
+
+    @property
+    def usage(self):
+        """
+        Token usage reported by the API
+
+        Returns:
+            dict: prompt, cached, output and total token counts, or None if the
+            response carries no usage_metadata (older SDKs, local stand-ins)
+        """
+        usage = getattr(self.response, 'usage_metadata', None)
+        if usage is None or not getattr(usage, 'prompt_token_count', None):
+            return None
+        return {
+            'prompt_tokens': usage.prompt_token_count,
+            'cached_tokens': getattr(usage, 'cached_content_token_count', 0) or 0,
+            'output_tokens': getattr(usage, 'candidates_token_count', 0) or 0,
+            'total_tokens': getattr(usage, 'total_token_count', 0) or 0
+        }
+
+def _usage_counts(response, prefix, variable_text, cached_estimate):
+    """
+    Read prompt token counts from the response, falling back to local estimates
+
+    Returns:
+        tuple: (cached_tokens, uncached_tokens)
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'prompt_token_count', None):
+        cached = getattr(usage, 'cached_content_token_count', 0) or 0
+        return cached, usage.prompt_token_count - cached
+
+    total = estimate_tokens(prefix) + estimate_tokens(variable_text)
+    return cached_estimate, total - cached_estimate
+
+class ContextCache:
+    """
+    Base backend: no cached-context support, the full prompt is sent every time.
+
+    Because the prefix is byte-stable, providers with implicit prefix caching
+    can still discount it; the counts reported by the API reflect that.
+    """
+    name = 'none'
+
+    def generate(self, model, prefix, variable_text, **kwargs):
+        """
+        Generate content for prefix + variable text
+
+        Args:
+            model: A genai.GenerativeModel (or compatible) instance
+            prefix (str): The static prompt prefix
+            variable_text (str): The per-request part of the prompt
+
+        Returns:
+            GenerationResult: The generated text and token accounting
+        """
+        response = model.generate_content(prefix + variable_text, **kwargs)
+        cached, uncached = _usage_counts(response, prefix, variable_text, 0)
+        return GenerationResult(response.text, response, cached, uncached)
+
+class LocalContextCache(ContextCache):
+    """
+    Local stand-in that simulates a provider-side context cache.
+
+    Prefixes are tracked with a TTL; a repeated prefix counts as cached and the
+    configured discount is applied to the reported billable tokens. The full
+    prompt is still sent to the model.
+    """
+    name = 'local'
+
+    def __init__(self, ttl_seconds=3600, discount=0.75, max_entries=512):
+        self.ttl_seconds = ttl_seconds
+        self.discount = discount
+        self.max_entries = max_entries
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            expires_at = self._handles.get(key)
+            hit = expires_at is not None and expires_at > now
+            if not hit and len(self._handles) >= self.max_entries:
+                self._handles = {k: v for k, v in self._handles.items() if v > now}
+                if len(self._handles) >= self.max_entries:
+                    self._handles.pop(min(self._handles, key=self._handles.get))
+            self._handles[key] = now + self.ttl_seconds
+            return hit
+
+    def generate(self, model, prefix, variable_text, **kwargs):
+        hit = self._lookup(prefix_key(getattr(model, 'model_name', ''), prefix))
+        response = model.generate_content(prefix + variable_text, **kwargs)
+        cached_estimate = estimate_tokens(prefix) if hit else 0
+        cached, uncached = _usage_counts(response, prefix, variable_text, cached_estimate)
+        return GenerationResult(response.text, response, cached, uncached, cache_hit=hit)
+
+    def billable_tokens(self, result):
+        """Prompt tokens after applying the simulated cache discount"""
+        return result.uncached_tokens + result.cached_tokens * (1 - self.discount)
+
+class GeminiContextCache(ContextCache):
+    """
+    Explicit Gemini context caching through `genai.caching.CachedContent`.
+
+    Requires a google-generativeai release with the caching module; with older
+    SDKs (or prefixes below the provider's minimum size) it sends the full
+    prompt like the base backend. A cached context belongs to the project of
+    the key that created it, so handles are kept per API key, and the cached
+    model calls through the pooled model's own client. The SDK creates caches
+    with the globally configured key only; models of other pooled keys send
+    the full prompt.
+    """
+    name = 'gemini'
+
+    def __init__(self, ttl_seconds=3600, min_prefix_tokens=1024, api_key=None):
+        self.ttl_seconds = ttl_seconds
+        self.min_prefix_tokens = min_prefix_tokens
+        self.api_key = api_key
+        self.supported = hasattr(genai, 'caching')
+        self._handles = {}
+        self._lock = threading.Lock()
+        if not self.supported:
+            logger.info("google-generativeai has no caching support; sending full prompts")
+
+    def _handle_for(self, model, prefix):
+        """
+        The cached model for a prefix, under the model's API key
+
+        Returns:
+            tuple: (cached_model, hit), or (None, False) if the model's key cannot create caches
+        """
+        api_key = genai_adapter.api_key_of(model)
+        if api_key is not None and api_key != self.api_key:
+            return None, False
+        scope = hashlib.sha256((self.api_key or '').encode('utf-8')).hexdigest()[:16]
+        key = prefix_key(model.model_name, prefix, scope)
+        now = time.time()
+
+        with self._lock:
+            cached = self._handles.get(key)
+            if cached and cached[1] > now:
+                return cached[0], True
+
+        handle = genai.caching.CachedContent.create(
+            model=model.model_name,
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=self.ttl_seconds)
+        )
+        cached_model = genai.GenerativeModel.from_cached_content(cached_content=handle)
+        client = genai_adapter.client_of(model)
+        if client is not None:
+            # Same key, same client: pooled calls never switch keys through a cached model
+            genai_adapter.bind_client(cached_model, client)
+
+        with self._lock:
+            # Renew slightly before the provider expires the handle
+            self._handles[key] = (cached_model, now + self.ttl_seconds * 0.9)
+        return cached_model, False
+
+    def generate(self, model, prefix, variable_text, **kwargs):
+        if not self.supported or estimate_tokens(prefix) < self.min_prefix_tokens:
+            return super().generate(model, prefix, variable_text, **kwargs)
+
+        try:
+            cached_model, hit = self._handle_for(model, prefix)
+        except Exception as e:
+            logger.warning("Context cache unavailable, sending full prompt: %s", e)
+            return super().generate(model, prefix, variable_text, **kwargs)
+        if cached_model is None:
+            return super().generate(model, prefix, variable_text, **kwargs)
+
+        response = cached_model.generate_content(variable_text, **kwargs)
+        cached, uncached = _usage_counts(response, prefix, variable_text, estimate_tokens(prefix))
+        return GenerationResult(response.text, response, cached, uncached, cache_hit=hit)
+
+_BACKENDS = {
+    ContextCache.name: ContextCache,
+    LocalContextCache.name: LocalContextCache,
+    GeminiContextCache.name: GeminiContextCache
+}
+
+def create_context_cache(name, ttl_seconds=3600, discount=0.75, api_key=None):
+    """
+    Build the configured context cache backend
+
+    Args:
+        name (str): One of 'none', 'local' or 'gemini'
+        ttl_seconds (int): Lifetime of a cached prefix
+        discount (float): Simulated discount for the local backend
+        api_key (str): The globally configured key, the one caches are created with
+
+    Returns:
+        ContextCache: The backend instance
+    """
+    backend = _BACKENDS.get(name)
+    if backend is None:
+        logger.warning("Unknown context cache backend '%s', caching disabled", name)
+        return ContextCache()
+    if backend is LocalContextCache:
+        return LocalContextCache(ttl_seconds=ttl_seconds, discount=discount)
+    if backend is GeminiContextCache:
+        return GeminiContextCache(ttl_seconds=ttl_seconds, api_key=api_key)
+    return ContextCache()
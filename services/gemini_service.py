@@ -1,357 +1,949 @@
 import os
+import re
 import json
+import time
+import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from config import get_config
+from services.concurrency_limiter import AdaptiveConcurrencyLimiter
+from services.context_cache import create_context_cache
+from services.hedging import HedgedExecutor
+from services.key_pool import ApiKeyPool
+from services.micro_batcher import MicroBatcher
+from services.model_router import ModelRouter
+from services.providers import GeminiProvider, LocalProvider, ProviderCancelled
+from utils import deadlines
+from utils.errors import PayloadTooLargeError, TooManyRequestsError, DeadlineExceededError, ClientDisconnectedError
+from utils.metrics import metrics
+from utils.token_estimator import TokenEstimator, estimate_tokens
+from utils.response_parser import (
+    parse_gemini_response, is_truncated_json, validate_and_fix_data,
+    validate_and_fix_overall_data, validate_and_fix_section_data, expand_compact_analysis,
+    COMPACT_SECTION_KEYS
+)
+
 # Load environment variables from .env file if present
 load_dotenv()
 
+config = get_config()
+logger = logging.getLogger(__name__)
+
 # Configure environment
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    print("Warning: GOOGLE_API_KEY not set. Gemini API calls will fail.")
+if not GOOGLE_API_KEY and not config.GOOGLE_API_KEYS:
+    logger.warning("GOOGLE_API_KEY not set. Gemini API calls will fail.")
 
 # Configure Gemini API
 genai.configure(api_key=GOOGLE_API_KEY)
 
-# Set up the model
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Set up the model tiers; the strongest tier is the default model
+router = ModelRouter(config.MODEL_TIERS, config.MODEL_TIER_ROUTES)
+model = router.model(router.tier_order[-1])
+
+# Backend that serves the static prompt prefix from a cached context when possible
+context_cache = create_context_cache(
+    config.CONTEXT_CACHE_BACKEND,
+    ttl_seconds=config.CONTEXT_CACHE_TTL_SECONDS,
+    discount=config.CONTEXT_CACHE_DISCOUNT,
+    api_key=GOOGLE_API_KEY
+)
+
+# Calls are spread over the configured API keys; keys hitting their quota cool down
+key_pool = ApiKeyPool(
+    config.GOOGLE_API_KEYS,
+    requests_per_minute=config.API_KEY_REQUESTS_PER_MINUTE,
+    cooldown_seconds=config.API_KEY_COOLDOWN_SECONDS
+)
+
+# Hedge requests go to separate model objects, optionally a different model per tier
+hedge_router = ModelRouter(
+    {tier: config.HEDGE_MODELS.get(tier, model_name) for tier, model_name in config.MODEL_TIERS.items()},
+    config.MODEL_TIER_ROUTES
+)
+hedger = HedgedExecutor(
+    config.HEDGE_BUDGETS,
+    percentile=config.HEDGE_PERCENTILE,
+    min_samples=config.HEDGE_MIN_SAMPLES,
+    max_workers=config.UPSTREAM_THREADS,
+    max_queue=config.UPSTREAM_QUEUE
+)
+_providers = {}
+
+# Pre-flight prompt token estimates, calibrated against the usage Gemini reports
+token_estimator = TokenEstimator()
+
+# Errors that reach the client as they are instead of as a generic analysis error
+CLIENT_ERRORS = (TooManyRequestsError, PayloadTooLargeError, DeadlineExceededError, ClientDisconnectedError)
+
+def get_provider(tier, hedge=False):
+    """
+    Get the provider serving a model tier
+    
+    Args:
+        tier (str): The model tier
+        hedge (bool): True for the backend that receives hedged requests
+        
+    Returns:
+        ModelProvider: The configured provider for the tier
+    """
+    key = (tier, hedge)
+    provider = _providers.get(key)
+    if provider is None:
+        if config.MODEL_PROVIDER == 'local':
+            provider = LocalProvider(
+                name=f"local-{tier}{'-hedge' if hedge else ''}",
+                latency=config.LOCAL_MODEL_LATENCY_SECONDS,
+                jitter=config.LOCAL_MODEL_JITTER_SECONDS
+            )
+        else:
+            provider = GeminiProvider((hedge_router if hedge else router).model(tier), context_cache, key_pool=key_pool)
+        provider = _providers.setdefault(key, provider)
+    return provider
+
+def create_providers():
+    """
+    Build the provider, and with it the model client, of every tier ahead of the first request
+    
+    Returns:
+        list: The providers
+    """
+    hedges = (False, True) if config.HEDGE_ENABLED else (False,)
+    return [get_provider(tier, hedge) for tier in router.tier_order for hedge in hedges]
+
+def probe_upstream(timeout=None):
+    """
+    Check that the default tier's upstream answers, with the cheapest call it supports
+    
+    Args:
+        timeout (float): Seconds to wait for the answer
+    
+    Raises:
+        Exception: If the upstream cannot be reached
+    """
+    get_provider(router.default_tier).probe(timeout)
+
+# Adaptive concurrency limit with priority lanes, shared by every upstream call of this worker
+limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=config.LIMITER_INITIAL_CONCURRENCY,
+    min_limit=config.LIMITER_MIN_CONCURRENCY,
+    max_limit=config.LIMITER_MAX_CONCURRENCY,
+    max_queue=config.LIMITER_MAX_QUEUE,
+    queue_timeout=config.LIMITER_QUEUE_TIMEOUT_SECONDS,
+    class_weights=config.PRIORITY_CLASS_WEIGHTS,
+    endpoint_classes=config.ENDPOINT_PRIORITY_CLASSES,
+    reserved_fraction=config.INTERACTIVE_RESERVED_FRACTION
+)
+
+# Prompts are laid out as a byte-stable static prefix (instructions and schema)
+# followed by the variable parts, so providers can cache the shared prefix.
+# PDF format checks (format issues and format scores) are computed locally
+# by utils.ats_checks and are not requested from the model.
+ANALYZE_FULL_PROMPT_PREFIX = """You are an expert resume analyst and career advisor. Analyze the resume given at the end of this prompt against the provided job description.
+
+Provide a comprehensive analysis as a JSON object with EXACTLY the following structure:
+
+{
+  "score": 75, // Overall job match score from 0-100
+
+  "summary_insights": {
+    "overall_grade": "B", // Single letter grade (A, B, C, D, F)
+    "ats_readiness": 85, // Score from 0-100
+    "competitiveness": 70, // Score from 0-100 for market competitiveness
+    "experience_level": {
+      "resume_level": "Mid-level", // Junior, Mid-level, Senior
+      "job_level": "Mid-level", // Junior, Mid-level, Senior
+      "match": true, // Boolean indicating if levels match
+      "mismatch_details": "The experience levels align well." // Only provided when there's a mismatch
+    },
+    "top_strengths": ["Strength 1", "Strength 2", "Strength 3"], // 3-5 key strengths
+    "priority_actions": [
+      {
+        "priority": "High", // High, Medium, Low
+        "area": "Skills", // Area to improve
+        "recommendation": "Add missing technical skills like X, Y, Z"
+      }
+      // 2-4 priority actions
+    ]
+  },
+
+  "comprehensive_analysis": {
+    "overall_score": 75, // Same as score above
+    "detailed_metrics": {
+      "relevance": {
+        "score": 80,
+        "details": {
+          "experience_match": 85,
+          "education_match": 75
+        }
+      },
+      "ats_compatibility": {
+        "score": 70,
+        "details": {
+          "keyword_density": 65
+        }
+      },
+      "content_quality": {
+        "score": 75,
+        "details": {
+          "clarity": 70,
+          "impact": 80
+        }
+      },
+      "skills_alignment": {
+        "score": 65,
+        "details": {
+          "matching_skills_percentage": 65,
+          "missing_critical_skills": 4
+        }
+      }
+    },
+    "strengths": ["Detailed strength 1", "Detailed strength 2"],
+    "weaknesses": ["Detailed weakness 1", "Detailed weakness 2"],
+    "improvement_suggestions": ["Improvement suggestion 1", "Improvement suggestion 2"]
+  },
+
+  "ats_analysis": {
+    "score": 75, // ATS score from 0-100
+    "keyword_match": {
+      "percentage": 65, // Overall keyword match percentage
+      "matches": ["Keyword 1", "Keyword 2"], // Keywords found in both
+      "missing": ["Missing keyword 1", "Missing keyword 2"] // Important keywords missing
+    },
+    "recommendations": ["ATS recommendation 1", "ATS recommendation 2"]
+  },
+
+  "skills_analysis": {
+    "matching_skills": ["Skill 1", "Skill 2"], // Skills found in both resume and job
+    "missing_skills": ["Missing skill 1", "Missing skill 2"], // Skills in job but not resume
+    "additional_skills": ["Additional skill 1"] // Skills in resume but not job
+  },
+
+  "section_feedback": {
+    "contact_information": "Feedback on contact section...",
+    "professional_summary": "Feedback on summary...",
+    "work_experience": "Feedback on work experience...",
+    "education": "Feedback on education...",
+    "skills": "Feedback on skills section...",
+    "projects": "Feedback on projects...",
+    "certifications": "Feedback on certifications..."
+  },
+
+  "industry_insights": {
+    "industry_trends": ["Trend 1", "Trend 2"],
+    "recommendations": ["Industry recommendation 1", "Industry recommendation 2"]
+  },
+
+  "gap_analysis": {
+    "identified_gaps": ["Gap 1", "Gap 2"],
+    "learning_paths": [
+      {
+        "gap": "Gap 1",
+        "recommendations": ["Learning recommendation 1", "Learning recommendation 2"]
+      }
+    ]
+  }
+}
+
+Ensure ALL keys are present even if values are empty arrays or default values. DO NOT include any explanation or text outside the JSON structure.
+"""
+
+# Compact wire format for /analyze: short keys and positional arrays keep the
+# output short; utils.response_parser.expand_compact_analysis restores the full
+# response shape and computes the derived fields (grade, duplicate scores,
+# level match, keyword/skill percentages, gap list) locally.
+ANALYZE_PROMPT_PREFIX = """You are an expert resume analyst and career advisor. Analyze the resume given at the end of this prompt against the provided job description.
+
+Respond with a single compact JSON object using EXACTLY these short keys (scores are integers from 0-100):
+
+{
+  "s": 75, // overall job match score
+  "ats": 85, // ATS readiness
+  "cmp": 70, // market competitiveness
+  "lvl": ["Mid-level", "Senior", "Mismatch explanation"], // [resume level, job level, mismatch explanation or ""]; levels are Junior, Mid-level or Senior
+  "top": ["Strength 1", "Strength 2", "Strength 3"], // 3-5 key strengths
+  "act": [["H", "Skills", "Add missing technical skills like X, Y, Z"]], // 2-4 priority actions: [H|M|L, area, recommendation]
+  "m": {
+    "rel": [80, 85, 75], // relevance: [score, experience match, education match]
+    "ats": [70, 65], // ATS compatibility: [score, keyword density]
+    "cq": [75, 70, 80] // content quality: [score, clarity, impact]
+  },
+  "str": ["Detailed strength"], // strengths
+  "wk": ["Detailed weakness"], // weaknesses
+  "imp": ["Improvement suggestion"], // improvement suggestions
+  "km": ["Keyword"], // job description keywords found in the resume
+  "kx": ["Keyword"], // important job description keywords missing from the resume
+  "atr": ["ATS recommendation"], // ATS recommendations
+  "sm": ["Skill"], // skills in both resume and job
+  "sx": ["Skill"], // skills in the job but not the resume
+  "sa": ["Skill"], // skills in the resume but not the job
+  "fb": {"ci": "", "ps": "", "we": "", "ed": "", "sk": "", "pr": "", "ce": ""}, // one-sentence feedback per section: contact information, professional summary, work experience, education, skills, projects, certifications
+  "it": ["Trend"], // industry trends
+  "ir": ["Recommendation"], // industry recommendations
+  "gap": [["Gap", ["Learning recommendation 1", "Learning recommendation 2"]]] // skill or experience gaps with learning recommendations
+}
+
+Include every key, using empty arrays or strings where nothing applies. Keep list items short. Output only the JSON object, without comments, code fences or any other text.
+"""
+
+ANALYZE_OVERALL_PROMPT_PREFIX = """You are an expert resume analyst and career advisor. Analyze the resume given at the end of this prompt to provide comprehensive overall insights about its quality, effectiveness, and areas for improvement.
+
+Provide a comprehensive overall analysis as a JSON object with EXACTLY the following structure:
+
+{
+  "overall_score": 75, // Overall resume quality score from 0-100
+
+  "summary_insights": {
+    "overall_grade": "B", // Single letter grade (A, B, C, D, F)
+    "ats_readiness": 85, // Score from 0-100 for ATS compatibility
+    "market_competitiveness": 70, // Score from 0-100 for market competitiveness
+    "professional_presentation": 80, // Score from 0-100 for overall presentation
+    "experience_level": "Mid-level", // Junior, Mid-level, or Senior classification
+    "top_strengths": ["Strong technical skills", "Relevant experience", "Good education background"], // 3-5 key strengths
+    "priority_improvements": [
+      {
+        "priority": "High", // High, Medium, Low
+        "area": "Skills", // Area to improve
+        "recommendation": "Organize skills section and add trending technologies"
+      }
+      // 2-4 priority improvement areas
+    ]
+  },
+
+  "detailed_analysis": {
+    "content_quality": {
+      "score": 75,
+      "details": {
+        "clarity_and_impact": 70,
+        "achievement_quantification": 65,
+        "keyword_optimization": 80,
+        "professional_language": 85
+      }
+    },
+    "structure_and_format": {
+      "score": 80,
+      "details": {
+        "organization": 85,
+        "readability": 75,
+        "consistency": 80,
+        "visual_appeal": 70
+      }
+    },
+    "ats_compatibility": {
+      "score": 70,
+      "details": {
+        "keyword_density": 65,
+        "section_headers": 80
+      }
+    },
+    "completeness": {
+      "score": 85,
+      "details": {
+        "essential_sections": 90,
+        "contact_information": 95,
+        "work_history": 80,
+        "skills_coverage": 75
+      }
+    }
+  },
+
+  "section_analysis": {
+    "contact_information": {
+      "score": 95,
+      "feedback": "Contact information is complete and professional",
+      "suggestions": ["Consider adding LinkedIn profile", "Ensure phone number is formatted consistently"]
+    },
+    "professional_summary": {
+      "score": 75,
+      "feedback": "Summary provides good overview but could be more impactful",
+      "suggestions": ["Add quantified achievements", "Make it more targeted and compelling"]
+    },
+    "work_experience": {
+      "score": 70,
+      "feedback": "Experience shows progression but lacks quantified achievements",
+      "suggestions": ["Add metrics and numbers", "Use stronger action verbs", "Focus on achievements vs responsibilities"]
+    },
+    "education": {
+      "score": 85,
+      "feedback": "Education section is well-formatted and relevant",
+      "suggestions": ["Consider adding relevant coursework", "Include GPA if strong"]
+    },
+    "skills": {
+      "score": 65,
+      "feedback": "Skills section needs better organization and more current technologies",
+      "suggestions": ["Organize by category", "Add trending technologies", "Remove outdated skills"]
+    },
+    "projects": {
+      "score": 70,
+      "feedback": "Projects demonstrate skills but need more detail",
+      "suggestions": ["Add more technical details", "Include project outcomes", "Highlight technologies used"]
+    },
+    "certifications": {
+      "score": 80,
+      "feedback": "Certifications are relevant and current",
+      "suggestions": ["Add expiration dates", "Include certification numbers"]
+    }
+  },
+
+  "strengths": [
+    "Clear professional progression in experience",
+    "Strong educational background",
+    "Good mix of technical and soft skills",
+    "Professional formatting and layout"
+  ],
+
+  "improvement_areas": [
+    "Lack of quantified achievements and metrics",
+    "Skills section organization could be improved", 
+    "Missing some trending industry technologies",
+    "Could benefit from more impactful summary"
+  ],
+
+  "ats_analysis": {
+    "score": 75,
+    "strengths": ["Standard section headers", "Good keyword usage", "Clean formatting"],
+    "issues": ["Some complex formatting", "Missing key industry terms"],
+    "recommendations": [
+      "Use more standard fonts and formatting",
+      "Add more industry-specific keywords",
+      "Ensure consistent heading styles"
+    ]
+  },
+
+  "industry_insights": {
+    "current_trends": ["Cloud computing adoption", "AI/ML integration", "Remote work capabilities"],
+    "skill_recommendations": ["Cloud platforms (AWS, Azure)", "DevOps tools", "Modern frameworks"],
+    "market_positioning": "Candidate shows solid foundation but needs to modernize skills portfolio"
+  },
+
+  "actionable_recommendations": [
+    {
+      "category": "Content",
+      "priority": "High",
+      "action": "Add quantified achievements to work experience",
+      "impact": "Significantly improves credibility and demonstrates value"
+    },
+    {
+      "category": "Skills",
+      "priority": "High", 
+      "action": "Reorganize skills section and add trending technologies",
+      "impact": "Better ATS compatibility and shows current market relevance"
+    },
+    {
+      "category": "Format",
+      "priority": "Medium",
+      "action": "Ensure consistent formatting throughout",
+      "impact": "Improves professional appearance and readability"
+    }
+  ]
+}
+
+Guidelines for analysis:
+1. Focus on overall resume quality and effectiveness
+2. Evaluate ATS compatibility and modern hiring practices
+3. Assess market competitiveness in current job market
+4. Provide specific, actionable feedback
+5. Consider industry standards and best practices
+6. Evaluate both content and presentation
+7. Identify gaps in skills or experience presentation
+8. Classify the resume's experience level as Junior, Mid-level, or Senior
+
+Ensure ALL keys are present even if values are empty arrays or default values. DO NOT include any explanation or text outside the JSON structure.
+"""
+
+IMPROVE_SECTION_PROMPT_HEADER = """You are an expert resume writer and career coach. I need you to improve a {title} section of a resume.
+
+SECTION TYPE: {title}
+CONTEXT: {context}
+IMPROVEMENT FOCUS: {focus}
+
+"""
+
+IMPROVE_SECTION_OUTPUT_SCHEMA = """{
+  "improved_text": "The completely rewritten and improved version of the section text",
+  "improvement_score": 85, // Score from 0-100 indicating how much improvement was made
+  "key_improvements": [
+    "Specific improvement 1 made to the text",
+    "Specific improvement 2 made to the text",
+    "Specific improvement 3 made to the text"
+  ],
+  "analysis": {
+    "original_strengths": ["Strength 1 of original text", "Strength 2"],
+    "original_weaknesses": ["Weakness 1 of original text", "Weakness 2"],
+    "improvements_made": [
+      {
+        "category": "Content", // Content, Structure, Keywords, Impact, etc.
+        "change": "Description of what was changed",
+        "reason": "Why this change improves the section"
+      },
+      {
+        "category": "Keywords",
+        "change": "Added industry-relevant keywords",
+        "reason": "Improves ATS compatibility and relevance"
+      }
+    ]
+  },
+  "formatting_suggestions": [
+    "Formatting suggestion 1",
+    "Formatting suggestion 2"
+  ],
+  "ats_optimization": {
+    "keyword_density": 75, // Score from 0-100
+    "suggested_keywords": ["keyword1", "keyword2", "keyword3"],
+    "formatting_score": 80 // Score from 0-100
+  },
+  "alternatives": [
+    {
+      "version": "Professional Version",
+      "text": "Alternative version 1 of the improved text"
+    },
+    {
+      "version": "Creative Version", 
+      "text": "Alternative version 2 of the improved text"
+    }
+  ],
+  "tips": [
+    "Additional tip 1 for this section type",
+    "Additional tip 2 for this section type"
+  ]
+}"""
+
+IMPROVE_SECTION_GUIDELINES = """Guidelines for improvement:
+1. Make the text more impactful and results-oriented
+2. Use strong action verbs and quantify achievements where possible
+3. Optimize for ATS (Applicant Tracking Systems) with relevant keywords
+4. Ensure the tone is professional and appropriate
+5. Make it concise but comprehensive
+6. Focus on value proposition and unique selling points
+7. Use industry-standard terminology and best practices
+
+Ensure ALL keys are present even if values are empty arrays or default values. DO NOT include any explanation or text outside the JSON structure.
+"""
+
+IMPROVE_SECTION_PROMPT_SCHEMA = (
+    "Provide comprehensive improvement suggestions for the original text given at the end of this prompt "
+    "as a JSON object with EXACTLY the following structure:\n\n"
+    + IMPROVE_SECTION_OUTPUT_SCHEMA + "\n\n" + IMPROVE_SECTION_GUIDELINES
+)
 
-def analyze_resume_with_gemini(resume_text, job_description):
+# One instruction block for a batch of sections from different requests
+IMPROVE_SECTIONS_BATCH_PROMPT_PREFIX = (
+    "You are an expert resume writer and career coach. Improve each resume section item given at the end "
+    "of this prompt independently of the others. Each item has an id, its section type, the context and "
+    "improvement focus for that section type, and the original text.\n\n"
+    "For EVERY item, produce a JSON object with EXACTLY the following structure plus an \"id\" key holding "
+    "the item's id:\n\n"
+    + IMPROVE_SECTION_OUTPUT_SCHEMA + "\n\n"
+    "Return a single JSON object of the form {\"items\": [...]} with one entry per item, in the input order.\n\n"
+    + IMPROVE_SECTION_GUIDELINES
+)
+
+# Define section-specific improvement prompts
+SECTION_PROMPTS = {
+    "summary": {
+        "title": "Professional Summary",
+        "context": "This is a professional summary/objective section that should be compelling, concise, and tailored to showcase the candidate's value proposition.",
+        "focus": "Make it more impactful, quantify achievements, highlight key strengths, and ensure it's ATS-friendly."
+    },
+    "experience": {
+        "title": "Work Experience",
+        "context": "This is a work experience section that should showcase achievements, responsibilities, and impact in previous roles.",
+        "focus": "Use action verbs, quantify achievements with metrics, show progression, and highlight relevant accomplishments."
+    },
+    "skills": {
+        "title": "Skills Section",
+        "context": "This is a skills section that should list technical and soft skills relevant to the target role.",
+        "focus": "Organize skills by category, prioritize relevant skills, include trending technologies, and ensure keyword optimization."
+    },
+    "education": {
+        "title": "Education",
+        "context": "This is an education section that should highlight academic achievements, relevant coursework, and certifications.",
+        "focus": "Highlight relevant coursework, academic achievements, certifications, and any honors or distinctions."
+    },
+    "projects": {
+        "title": "Projects",
+        "context": "This is a projects section that should showcase personal or professional projects demonstrating skills and experience.",
+        "focus": "Highlight technologies used, quantify impact, show problem-solving abilities, and demonstrate relevant skills."
+    }
+}
+
+@lru_cache(maxsize=256)
+def _schema_subset(prefix, fields):
+    """
+    Cut a prompt's JSON schema down to some of its top-level fields
+    
+    The schema sits between the first line that is just "{" and the first
+    line that is just "}", with one top-level field starting on each line
+    indented by two spaces. Kept fields stay in schema order, and the text
+    around the schema is unchanged.
+    
+    Args:
+        prefix (str): One of the prompt prefixes above
+        fields (frozenset): Top-level keys to keep
+        
+    Returns:
+        str: The prompt prefix for only those fields
+    """
+    head, rest = prefix.split('\n{\n', 1)
+    body, tail = rest.split('\n}\n', 1)
+    separator = '\n\n' if '\n\n  "' in body else '\n'
+    entries = [entry.rstrip() for entry in re.split(r'\n\n?(?=  ")', body)]
+    kept = [entry for entry in entries if re.match(r'  "([^"]+)"', entry).group(1) in fields]
+    for index, entry in enumerate(kept):
+        # Only the last field goes without a comma; a trailing // comment stays after it
+        lines = entry.split('\n')
+        code, comment = re.match(r'^(.*?),?( //.*)?$', lines[-1]).groups()
+        lines[-1] = code + (',' if index < len(kept) - 1 else '') + (comment or '')
+        kept[index] = '\n'.join(lines)
+    return head + '\n{\n' + separator.join(kept) + '\n}\n' + tail
+
+def _analyze_prefix(sections):
+    """The /analyze schema prefix for the output format, limited to the requested sections"""
+    if config.ANALYZE_OUTPUT_FORMAT == 'full':
+        return _schema_subset(ANALYZE_FULL_PROMPT_PREFIX, frozenset(sections)) if sections else ANALYZE_FULL_PROMPT_PREFIX
+    if not sections:
+        return ANALYZE_PROMPT_PREFIX
+    keys = frozenset(key for section in sections for key in COMPACT_SECTION_KEYS[section])
+    return _schema_subset(ANALYZE_PROMPT_PREFIX, keys)
+
+def _improve_section_prefix(section_type):
+    """Build the static prompt prefix for a section type"""
+    section_info = SECTION_PROMPTS.get(section_type, SECTION_PROMPTS["summary"])
+    return IMPROVE_SECTION_PROMPT_HEADER.format(**section_info) + IMPROVE_SECTION_PROMPT_SCHEMA
+
+# Section prefixes are built once so they are identical byte for byte across requests
+IMPROVE_SECTION_PROMPT_PREFIXES = {section_type: _improve_section_prefix(section_type) for section_type in SECTION_PROMPTS}
+
+def _validate_analysis(data, sections=None):
+    """Reject analysis output without a usable match score or a requested comprehensive analysis"""
+    score = data.get('score')
+    if not isinstance(score, (int, float)) or not 0 <= score <= 100:
+        raise ValueError(f"score must be a number between 0 and 100, got {score!r}")
+    if (sections is None or 'comprehensive_analysis' in sections) and not isinstance(data.get('comprehensive_analysis'), dict):
+        raise ValueError("comprehensive_analysis is missing")
+
+def _validate_overall_analysis(data, sections=None):
+    """Reject overall analysis output without a usable overall score or requested summary insights"""
+    score = data.get('overall_score')
+    if not isinstance(score, (int, float)) or not 0 <= score <= 100:
+        raise ValueError(f"overall_score must be a number between 0 and 100, got {score!r}")
+    if (sections is None or 'summary_insights' in sections) and not isinstance(data.get('summary_insights'), dict):
+        raise ValueError("summary_insights is missing")
+
+def _validate_section_improvement(data):
+    """Reject section improvements without rewritten text"""
+    improved_text = data.get('improved_text')
+    if not isinstance(improved_text, str) or not improved_text.strip():
+        raise ValueError("improved_text is missing or empty")
+
+def _validate_section_batch(data):
+    """Reject batch output without a list of items"""
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("items is missing or empty")
+
+CONTINUATION_INSTRUCTION = "Your previous response was cut off. Continue it exactly where it stopped. Output only the remaining JSON text, without repeating anything and without code fences."
+
+def _continue_generation(provider, prompt, partial_text, generation_config=None):
+    """
+    Ask the model for only the missing tail of a truncated response
+    
+    Args:
+        provider (ModelProvider): The provider of the tier that produced the truncated output
+        prompt (str): The original prompt
+        partial_text (str): The truncated response text
+        generation_config (dict): The endpoint's generation settings
+        
+    Returns:
+        str: The partial text followed by its continuation
+    """
+    continuation = provider.continue_text(prompt, partial_text, CONTINUATION_INSTRUCTION, generation_config).strip()
+    if continuation.startswith('```'):
+        continuation = continuation.split('\n', 1)[-1]
+    return partial_text + continuation.replace('```', '')
+
+def _generate(endpoint, prefix, variable_text, validate, fixer, expand=None, generation_config=None, max_input_tokens=None):
+    """
+    Generate and parse content for a static prompt prefix followed by variable text,
+    escalating to stronger model tiers when the output cannot be parsed or is rejected
+    
+    Args:
+        endpoint (str): Name of the calling endpoint, used for routing and metrics
+        prefix (str): The byte-stable prompt prefix
+        variable_text (str): The per-request part of the prompt
+        validate (callable): Raises ValueError when the parsed output is unusable
+        fixer (callable): Fills in sections missing from recovered output once it passed validation
+        expand (callable): Expands a compact wire format into the full response shape
+        generation_config (dict): Overrides the endpoint's generation settings
+        max_input_tokens (int): Overrides the endpoint's input cap
+        
+    Returns:
+        dict: The parsed response
+        
+    Raises:
+        PayloadTooLargeError: If the estimated prompt exceeds the endpoint's input cap
+        DeadlineExceededError, ClientDisconnectedError: If the request is abandoned
+    """
+    estimated_tokens = token_estimator.estimate(endpoint, prefix + variable_text)
+    max_tokens = max_input_tokens or config.MAX_INPUT_TOKENS.get(endpoint)
+    if max_tokens and estimated_tokens > max_tokens:
+        metrics.increment(f"gemini.{endpoint}.input_too_large")
+        raise PayloadTooLargeError(
+            f"Input is too large: about {estimated_tokens} tokens, the limit is {max_tokens}",
+            payload={"estimated_tokens": estimated_tokens, "max_input_tokens": max_tokens}
+        )
+    metrics.observe(f"gemini.{endpoint}.estimated_prompt_tokens", estimated_tokens)
+    
+    tiers = router.tiers_for(endpoint, len(variable_text))
+    generation_config = generation_config or config.GENERATION_CONFIG.get(endpoint)
+    usage_total = {}
+    deadline = deadlines.current()
+    
+    def call(provider, cancel_event):
+        # The model call gets whatever time the request has left
+        start = time.time()
+        try:
+            return provider.generate(endpoint, prefix, variable_text, cancel_event, generation_config,
+                                     timeout=deadline.remaining() if deadline else None)
+        finally:
+            if deadline:
+                deadline.record_upstream(time.time() - start)
+    
+    for attempt, tier in enumerate(tiers):
+        deadlines.check()
+        primary = get_provider(tier)
+        hedge = get_provider(tier, hedge=True) if config.HEDGE_ENABLED else None
+        with limiter.slot(endpoint, deadline) as slot:
+            start = time.time()
+            # A hedge takes its own limiter slot and is skipped when none is free; the primary
+            # call keeps its slot until it finishes upstream, even if the request stops waiting
+            result = hedger.run(
+                endpoint,
+                lambda cancel_event, provider=primary: call(provider, cancel_event),
+                hedge and (lambda cancel_event, provider=hedge: call(provider, cancel_event)),
+                reserve_hedge=lambda: limiter.try_acquire(endpoint),
+                release_hedge=lambda latency, error: limiter.release(
+                    endpoint, latency, failed=error is not None,
+                    adjust=not isinstance(error, ProviderCancelled)
+                ),
+                deadline=deadline,
+                track_primary=slot.hold_until
+            )
+        metrics.observe(f"gemini.tier.{tier}.latency_seconds", time.time() - start)
+        metrics.increment(f"gemini.tier.{tier}.requests")
+        
+        # Report how much of the prompt was served from a cached context
+        metrics.increment(f"gemini.{endpoint}.prompt_tokens.cached", result.cached_tokens)
+        metrics.increment(f"gemini.{endpoint}.prompt_tokens.uncached", result.uncached_tokens)
+        metrics.increment(f"gemini.context_cache.{'hits' if result.cache_hit else 'misses'}")
+        if hasattr(context_cache, 'billable_tokens'):
+            metrics.increment(f"gemini.{endpoint}.prompt_tokens.billable", context_cache.billable_tokens(result))
+        
+        # Actual usage, when the SDK reports it, also calibrates the estimator
+        usage = result.usage
+        if usage:
+            token_estimator.record(endpoint, estimated_tokens, usage['prompt_tokens'])
+            for key, value in usage.items():
+                usage_total[key] = usage_total.get(key, 0) + value
+                metrics.increment(f"gemini.{endpoint}.usage.{key}", value)
+        logger.info("%s tier '%s': estimated %d prompt tokens, reported usage %s", endpoint, tier, estimated_tokens, usage or 'unavailable')
+        
+        text = result.text
+        metrics.observe(f"gemini.{endpoint}.output_tokens_estimated", estimate_tokens(text))
+        if config.TRUNCATION_RECOVERY == 'continue' and is_truncated_json(text):
+            deadlines.check()
+            # Pay only for the missing tail instead of regenerating everything
+            try:
+                text = _continue_generation(primary, prefix + variable_text, text, generation_config)
+                metrics.increment('parser.recovery.continued')
+            except Exception as e:
+                logger.warning("Continuation request failed, repairing truncated output: %s", e)
+        
+        try:
+            parsed = parse_gemini_response(text, fixer, expand, validate)
+            if config.USAGE_DEBUG_FIELD:
+                parsed["debug"] = {
+                    "estimated_prompt_tokens": estimated_tokens,
+                    "usage": usage_total or None,
+                    "attempts": attempt + 1
+                }
+            return parsed
+        except Exception as e:
+            metrics.increment(f"gemini.tier.{tier}.rejected")
+            if attempt == len(tiers) - 1:
+                raise
+            logger.warning("Escalating %s from tier '%s' to '%s': %s", endpoint, tier, tiers[attempt + 1], e)
+            metrics.increment(f"gemini.tier.{tier}.escalations")
+            metrics.increment(f"gemini.{endpoint}.escalations")
+
+def analyze_resume_with_gemini(resume_text, job_description, sections=None):
     """
     Send resume text and job description to Gemini API for analysis
     
     Args:
         resume_text (str): The extracted text from the resume PDF
         job_description (str): The job description provided by the user
+        sections (list): Response sections to generate, None for all of them
         
     Returns:
         dict: The analysis results structured as a JSON object
     """
     
-    # Prepare the prompt for Gemini
-    prompt = f"""
-    You are an expert resume analyst and career advisor. Analyze the following resume against the provided job description.
-    
-    RESUME:
-    {resume_text}
+    # The job description is shared by many resumes, so it can be part of the cached prefix
+    job_description_block = f"""
+JOB DESCRIPTION:
+{job_description}
+"""
+    resume_block = f"""
+RESUME:
+{resume_text}
+"""
+    schema_prefix = _analyze_prefix(sections)
+    if config.CONTEXT_CACHE_INCLUDE_JOB_DESCRIPTION:
+        prefix = schema_prefix + job_description_block
+        variable_text = resume_block
+    else:
+        prefix = schema_prefix
+        variable_text = job_description_block + resume_block
     
-    JOB DESCRIPTION:
-    {job_description}
-    
-    Provide a comprehensive analysis as a JSON object with EXACTLY the following structure:
-
-    {{
-      "score": 75, // Overall job match score from 0-100
-      
-      "summary_insights": {{
-        "overall_grade": "B", // Single letter grade (A, B, C, D, F)
-        "ats_readiness": 85, // Score from 0-100
-        "competitiveness": 70, // Score from 0-100 for market competitiveness
-        "experience_level": {{
-          "resume_level": "Mid-level", // Junior, Mid-level, Senior
-          "job_level": "Mid-level", // Junior, Mid-level, Senior
-          "match": true, // Boolean indicating if levels match
-          "mismatch_details": "The experience levels align well." // Only provided when there's a mismatch
-        }},
-        "top_strengths": ["Strength 1", "Strength 2", "Strength 3"], // 3-5 key strengths
-        "priority_actions": [
-          {{
-            "priority": "High", // High, Medium, Low
-            "area": "Skills", // Area to improve
-            "recommendation": "Add missing technical skills like X, Y, Z"
-          }}
-          // 2-4 priority actions
-        ]
-      }},
-      
-      "comprehensive_analysis": {{
-        "overall_score": 75, // Same as score above
-        "detailed_metrics": {{
-          "relevance": {{
-            "score": 80,
-            "details": {{
-              "experience_match": 85,
-              "education_match": 75
-            }}
-          }},
-          "ats_compatibility": {{
-            "score": 70,
-            "details": {{
-              "keyword_density": 65, 
-              "format_score": 75
-            }}
-          }},
-          "content_quality": {{
-            "score": 75,
-            "details": {{
-              "clarity": 70,
-              "impact": 80
-            }}
-          }},
-          "skills_alignment": {{
-            "score": 65,
-            "details": {{
-              "matching_skills_percentage": 65,
-              "missing_critical_skills": 4
-            }}
-          }}
-        }},
-        "strengths": ["Detailed strength 1", "Detailed strength 2"],
-        "weaknesses": ["Detailed weakness 1", "Detailed weakness 2"],
-        "improvement_suggestions": ["Improvement suggestion 1", "Improvement suggestion 2"]
-      }},
-      
-      "ats_analysis": {{
-        "score": 75, // ATS score from 0-100
-        "format_issues": ["Issue 1", "Issue 2"], // List any formatting issues
-        "keyword_match": {{
-          "percentage": 65, // Overall keyword match percentage
-          "matches": ["Keyword 1", "Keyword 2"], // Keywords found in both
-          "missing": ["Missing keyword 1", "Missing keyword 2"] // Important keywords missing
-        }},
-        "recommendations": ["ATS recommendation 1", "ATS recommendation 2"]
-      }},
-      
-      "skills_analysis": {{
-        "matching_skills": ["Skill 1", "Skill 2"], // Skills found in both resume and job
-        "missing_skills": ["Missing skill 1", "Missing skill 2"], // Skills in job but not resume
-        "additional_skills": ["Additional skill 1"] // Skills in resume but not job
-      }},
-      
-      "section_feedback": {{
-        "contact_information": "Feedback on contact section...",
-        "professional_summary": "Feedback on summary...",
-        "work_experience": "Feedback on work experience...",
-        "education": "Feedback on education...",
-        "skills": "Feedback on skills section...",
-        "projects": "Feedback on projects...",
-        "certifications": "Feedback on certifications..."
-      }},
-      
-      "industry_insights": {{
-        "industry_trends": ["Trend 1", "Trend 2"],
-        "recommendations": ["Industry recommendation 1", "Industry recommendation 2"]
-      }},
-      
-      "gap_analysis": {{
-        "identified_gaps": ["Gap 1", "Gap 2"],
-        "learning_paths": [
-          {{
-            "gap": "Gap 1",
-            "recommendations": ["Learning recommendation 1", "Learning recommendation 2"]
-          }}
-        ]
-      }}
-    }}
-
-    Ensure ALL keys are present even if values are empty arrays or default values. DO NOT include any explanation or text outside the JSON structure.
-    """
+    # Full-format output is used as it is; only the compact format is expanded
+    expand = expand_compact_analysis if config.ANALYZE_OUTPUT_FORMAT != 'full' else (lambda data, sections=None: data)
     
     try:
         # Generate response from Gemini
-        response = model.generate_content(prompt)
-        
-        # Return the response text - will be parsed by the parser
-        return response.text
+        if not sections:
+            return _generate("analyze", prefix, variable_text, _validate_analysis, validate_and_fix_data, expand)
+        # Only the requested sections are expanded; they are filled in once the output has been
+        # validated, so a reply without a score is still rejected and escalated
+        analysis = _generate(
+            "analyze", prefix, variable_text,
+            lambda data: _validate_analysis(data, sections),
+            lambda data: validate_and_fix_data(data, sections),
+            lambda data: expand(data, sections)
+        )
+        return validate_and_fix_data(analysis, sections)
+    except CLIENT_ERRORS:
+        raise
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
+        logger.error("Error calling Gemini API: %s", e)
         raise Exception(f"Error analyzing resume: {str(e)}")
 
 
-def analyze_resume_overall_with_gemini(resume_text):
+def analyze_resume_overall_with_gemini(resume_text, sections=None):
     """
     Send resume text to Gemini API for overall analysis without job description
     
     Args:
         resume_text (str): The extracted text from the resume PDF
+        sections (list): Response sections to generate, None for all of them
         
     Returns:
         dict: The analysis results structured as a JSON object
     """
     
-    # Prepare the prompt for Gemini
-    prompt = f"""
-    You are an expert resume analyst and career advisor. Analyze the following resume to provide comprehensive overall insights about its quality, effectiveness, and areas for improvement.
+    resume_block = f"""
+RESUME:
+{resume_text}
+"""
     
-    RESUME:
-    {resume_text}
+    try:
+        # Generate response from Gemini
+        if not sections:
+            return _generate("analyze_overall", ANALYZE_OVERALL_PROMPT_PREFIX, resume_block, _validate_overall_analysis, validate_and_fix_overall_data)
+        analysis = _generate(
+            "analyze_overall", _schema_subset(ANALYZE_OVERALL_PROMPT_PREFIX, frozenset(sections)), resume_block,
+            lambda data: _validate_overall_analysis(data, sections),
+            lambda data: validate_and_fix_overall_data(data, sections)
+        )
+        return validate_and_fix_overall_data(analysis, sections)
+    except CLIENT_ERRORS:
+        raise
+    except Exception as e:
+        logger.error("Error calling Gemini API for overall analysis: %s", e)
+        raise Exception(f"Error analyzing resume overall: {str(e)}")
+
+
+def _section_batch_block(items):
+    """Build the variable part of a batch prompt: every item with its own section instructions"""
+    blocks = []
+    for item_id, (section_type, original_text) in enumerate(items, 1):
+        section_info = SECTION_PROMPTS.get(section_type, SECTION_PROMPTS["summary"])
+        blocks.append(f"""
+ITEM {item_id}
+SECTION TYPE: {section_info['title']}
+CONTEXT: {section_info['context']}
+IMPROVEMENT FOCUS: {section_info['focus']}
+ORIGINAL TEXT:
+{original_text}
+END ITEM {item_id}
+""")
+    return ''.join(blocks)
+
+def _improve_sections_batch(items):
+    """
+    Improve several sections from different requests with one model call
     
-    Provide a comprehensive overall analysis as a JSON object with EXACTLY the following structure:
-
-    {{
-      "overall_score": 75, // Overall resume quality score from 0-100
-      
-      "summary_insights": {{
-        "overall_grade": "B", // Single letter grade (A, B, C, D, F)
-        "ats_readiness": 85, // Score from 0-100 for ATS compatibility
-        "market_competitiveness": 70, // Score from 0-100 for market competitiveness
-        "professional_presentation": 80, // Score from 0-100 for overall presentation
-        "experience_level": "Mid-level", // Junior, Mid-level, or Senior classification
-        "top_strengths": ["Strong technical skills", "Relevant experience", "Good education background"], // 3-5 key strengths
-        "priority_improvements": [
-          {{
-            "priority": "High", // High, Medium, Low
-            "area": "Skills", // Area to improve
-            "recommendation": "Organize skills section and add trending technologies"
-          }}
-          // 2-4 priority improvement areas
-        ]
-      }},
-      
-      "detailed_analysis": {{
-        "content_quality": {{
-          "score": 75,
-          "details": {{
-            "clarity_and_impact": 70,
-            "achievement_quantification": 65,
-            "keyword_optimization": 80,
-            "professional_language": 85
-          }}
-        }},
-        "structure_and_format": {{
-          "score": 80,
-          "details": {{
-            "organization": 85,
-            "readability": 75,
-            "consistency": 80,
-            "visual_appeal": 70
-          }}
-        }},
-        "ats_compatibility": {{
-          "score": 70,
-          "details": {{
-            "format_compatibility": 75, 
-            "keyword_density": 65,
-            "section_headers": 80,
-            "file_structure": 70
-          }}
-        }},
-        "completeness": {{
-          "score": 85,
-          "details": {{
-            "essential_sections": 90,
-            "contact_information": 95,
-            "work_history": 80,
-            "skills_coverage": 75
-          }}
-        }}
-      }},
-      
-      "section_analysis": {{
-        "contact_information": {{
-          "score": 95,
-          "feedback": "Contact information is complete and professional",
-          "suggestions": ["Consider adding LinkedIn profile", "Ensure phone number is formatted consistently"]
-        }},
-        "professional_summary": {{
-          "score": 75,
-          "feedback": "Summary provides good overview but could be more impactful",
-          "suggestions": ["Add quantified achievements", "Make it more targeted and compelling"]
-        }},
-        "work_experience": {{
-          "score": 70,
-          "feedback": "Experience shows progression but lacks quantified achievements",
-          "suggestions": ["Add metrics and numbers", "Use stronger action verbs", "Focus on achievements vs responsibilities"]
-        }},
-        "education": {{
-          "score": 85,
-          "feedback": "Education section is well-formatted and relevant",
-          "suggestions": ["Consider adding relevant coursework", "Include GPA if strong"]
-        }},
-        "skills": {{
-          "score": 65,
-          "feedback": "Skills section needs better organization and more current technologies",
-          "suggestions": ["Organize by category", "Add trending technologies", "Remove outdated skills"]
-        }},
-        "projects": {{
-          "score": 70,
-          "feedback": "Projects demonstrate skills but need more detail",
-          "suggestions": ["Add more technical details", "Include project outcomes", "Highlight technologies used"]
-        }},
-        "certifications": {{
-          "score": 80,
-          "feedback": "Certifications are relevant and current",
-          "suggestions": ["Add expiration dates", "Include certification numbers"]
-        }}
-      }},
-      
-      "strengths": [
-        "Clear professional progression in experience",
-        "Strong educational background",
-        "Good mix of technical and soft skills",
-        "Professional formatting and layout"
-      ],
-      
-      "improvement_areas": [
-        "Lack of quantified achievements and metrics",
-        "Skills section organization could be improved", 
-        "Missing some trending industry technologies",
-        "Could benefit from more impactful summary"
-      ],
-      
-      "ats_analysis": {{
-        "score": 75,
-        "strengths": ["Standard section headers", "Good keyword usage", "Clean formatting"],
-        "issues": ["Some complex formatting", "Missing key industry terms"],
-        "recommendations": [
-          "Use more standard fonts and formatting",
-          "Add more industry-specific keywords",
-          "Ensure consistent heading styles"
-        ]
-      }},
-      
-      "industry_insights": {{
-        "current_trends": ["Cloud computing adoption", "AI/ML integration", "Remote work capabilities"],
-        "skill_recommendations": ["Cloud platforms (AWS, Azure)", "DevOps tools", "Modern frameworks"],
-        "market_positioning": "Candidate shows solid foundation but needs to modernize skills portfolio"
-      }},
-      
-      "actionable_recommendations": [
-        {{
-          "category": "Content",
-          "priority": "High",
-          "action": "Add quantified achievements to work experience",
-          "impact": "Significantly improves credibility and demonstrates value"
-        }},
-        {{
-          "category": "Skills",
-          "priority": "High", 
-          "action": "Reorganize skills section and add trending technologies",
-          "impact": "Better ATS compatibility and shows current market relevance"
-        }},
-        {{
-          "category": "Format",
-          "priority": "Medium",
-          "action": "Ensure consistent formatting throughout",
-          "impact": "Improves professional appearance and readability"
-        }}
-      ]
-    }}
-
-    Guidelines for analysis:
-    1. Focus on overall resume quality and effectiveness
-    2. Evaluate ATS compatibility and modern hiring practices
-    3. Assess market competitiveness in current job market
-    4. Provide specific, actionable feedback
-    5. Consider industry standards and best practices
-    6. Evaluate both content and presentation
-    7. Identify gaps in skills or experience presentation
-    8. Classify the resume's experience level as Junior, Mid-level, or Senior
-
-    Ensure ALL keys are present even if values are empty arrays or default values. DO NOT include any explanation or text outside the JSON structure.
+    Args:
+        items (list): (section_type, original_text) tuples
+        
+    Returns:
+        list: One improvement dict per item, or None for items the batch could not
+            answer; their callers fall back to a single-section call
+        
+    Raises:
+        TooManyRequestsError: If the upstream queue is full, for every caller
     """
+    if len(items) == 1:
+        return [None]
     
+    size = len(items)
+    section_config = config.GENERATION_CONFIG.get("improve_section", {})
+    generation_config = dict(section_config, max_output_tokens=section_config.get('max_output_tokens', 3072) * size)
+    max_input_tokens = config.MAX_INPUT_TOKENS.get("improve_section", 4000) * size
     try:
-        # Generate response from Gemini
-        response = model.generate_content(prompt)
-        
-        # Return the response text - will be parsed by the parser
-        return response.text
+        # The batch serves several requests, so no single request's deadline cancels it
+        with deadlines.deadline_scope(None):
+            parsed = _generate(
+                "improve_section_batch", IMPROVE_SECTIONS_BATCH_PROMPT_PREFIX, _section_batch_block(items),
+                _validate_section_batch, lambda data: data,
+                generation_config=generation_config, max_input_tokens=max_input_tokens
+            )
+    except TooManyRequestsError:
+        raise
     except Exception as e:
-        print(f"Error calling Gemini API for overall analysis: {e}")
-        raise Exception(f"Error analyzing resume overall: {str(e)}")
+        logger.warning("Section batch of %d failed, improving the sections one by one: %s", size, e)
+        metrics.increment("gemini.improve_section_batch.fallbacks")
+        return [None] * size
+    
+    by_id = {}
+    for position, entry in enumerate(parsed['items'], 1):
+        if isinstance(entry, dict):
+            by_id.setdefault(entry.pop('id', position), entry)
+    
+    results = []
+    for item_id in range(1, size + 1):
+        try:
+            entry = by_id.get(item_id) or by_id.get(str(item_id))
+            if entry is None:
+                raise ValueError(f"item {item_id} is missing")
+            improvement = validate_and_fix_section_data(entry)
+            _validate_section_improvement(improvement)
+            results.append(improvement)
+        except Exception as e:
+            logger.warning("Section batch item %d rejected, improving it on its own: %s", item_id, e)
+            metrics.increment("gemini.improve_section_batch.item_fallbacks")
+            results.append(None)
+    return results
 
+# Short /improve-section calls arriving close together share one upstream call
+section_batcher = MicroBatcher(
+    "improve_section",
+    _improve_sections_batch,
+    window_seconds=config.IMPROVE_SECTION_BATCH_WINDOW_MS / 1000,
+    max_batch_size=config.IMPROVE_SECTION_BATCH_MAX_SIZE
+)
 
 def improve_resume_section_with_gemini(section_type, original_text):
     """
@@ -365,117 +957,24 @@ def improve_resume_section_with_gemini(section_type, original_text):
         dict: The improvement suggestions structured as a JSON object
     """
     
-    # Define section-specific improvement prompts
-    section_prompts = {
-        "summary": {
-            "title": "Professional Summary",
-            "context": "This is a professional summary/objective section that should be compelling, concise, and tailored to showcase the candidate's value proposition.",
-            "focus": "Make it more impactful, quantify achievements, highlight key strengths, and ensure it's ATS-friendly."
-        },
-        "experience": {
-            "title": "Work Experience",
-            "context": "This is a work experience section that should showcase achievements, responsibilities, and impact in previous roles.",
-            "focus": "Use action verbs, quantify achievements with metrics, show progression, and highlight relevant accomplishments."
-        },
-        "skills": {
-            "title": "Skills Section",
-            "context": "This is a skills section that should list technical and soft skills relevant to the target role.",
-            "focus": "Organize skills by category, prioritize relevant skills, include trending technologies, and ensure keyword optimization."
-        },
-        "education": {
-            "title": "Education",
-            "context": "This is an education section that should highlight academic achievements, relevant coursework, and certifications.",
-            "focus": "Highlight relevant coursework, academic achievements, certifications, and any honors or distinctions."
-        },
-        "projects": {
-            "title": "Projects",
-            "context": "This is a projects section that should showcase personal or professional projects demonstrating skills and experience.",
-            "focus": "Highlight technologies used, quantify impact, show problem-solving abilities, and demonstrate relevant skills."
-        }
-    }
-    
-    section_info = section_prompts.get(section_type, section_prompts["summary"])
-    
-    # Prepare the prompt for Gemini
-    prompt = f"""
-    You are an expert resume writer and career coach. I need you to improve a {section_info['title']} section of a resume.
-
-    SECTION TYPE: {section_info['title']}
-    CONTEXT: {section_info['context']}
-    IMPROVEMENT FOCUS: {section_info['focus']}
-
-    ORIGINAL TEXT:
-    {original_text}
-
-    Please provide comprehensive improvement suggestions as a JSON object with EXACTLY the following structure:
-
-    {{
-      "improved_text": "The completely rewritten and improved version of the section text",
-      "improvement_score": 85, // Score from 0-100 indicating how much improvement was made
-      "key_improvements": [
-        "Specific improvement 1 made to the text",
-        "Specific improvement 2 made to the text",
-        "Specific improvement 3 made to the text"
-      ],
-      "analysis": {{
-        "original_strengths": ["Strength 1 of original text", "Strength 2"],
-        "original_weaknesses": ["Weakness 1 of original text", "Weakness 2"],
-        "improvements_made": [
-          {{
-            "category": "Content", // Content, Structure, Keywords, Impact, etc.
-            "change": "Description of what was changed",
-            "reason": "Why this change improves the section"
-          }},
-          {{
-            "category": "Keywords",
-            "change": "Added industry-relevant keywords",
-            "reason": "Improves ATS compatibility and relevance"
-          }}
-        ]
-      }},
-      "formatting_suggestions": [
-        "Formatting suggestion 1",
-        "Formatting suggestion 2"
-      ],
-      "ats_optimization": {{
-        "keyword_density": 75, // Score from 0-100
-        "suggested_keywords": ["keyword1", "keyword2", "keyword3"],
-        "formatting_score": 80 // Score from 0-100
-      }},
-      "alternatives": [
-        {{
-          "version": "Professional Version",
-          "text": "Alternative version 1 of the improved text"
-        }},
-        {{
-          "version": "Creative Version", 
-          "text": "Alternative version 2 of the improved text"
-        }}
-      ],
-      "tips": [
-        "Additional tip 1 for this section type",
-        "Additional tip 2 for this section type"
-      ]
-    }}
-
-    Guidelines for improvement:
-    1. Make the text more impactful and results-oriented
-    2. Use strong action verbs and quantify achievements where possible
-    3. Optimize for ATS (Applicant Tracking Systems) with relevant keywords
-    4. Ensure the tone is professional and appropriate
-    5. Make it concise but comprehensive
-    6. Focus on value proposition and unique selling points
-    7. Use industry-standard terminology and best practices
-
-    Ensure ALL keys are present even if values are empty arrays or default values. DO NOT include any explanation or text outside the JSON structure.
-    """
+    prefix = IMPROVE_SECTION_PROMPT_PREFIXES.get(section_type, IMPROVE_SECTION_PROMPT_PREFIXES["summary"])
+    original_block = f"""
+ORIGINAL TEXT:
+{original_text}
+"""
     
     try:
-        # Generate response from Gemini
-        response = model.generate_content(prompt)
+        # A single-threaded worker never has a second caller to batch with, so waiting out the window only adds latency
+        if (config.IMPROVE_SECTION_BATCHING and config.WORKER_THREADS > 1
+                and len(original_text) <= config.IMPROVE_SECTION_BATCH_MAX_CHARS):
+            improvement = section_batcher.submit((section_type, original_text))
+            if improvement is not None:
+                return improvement
         
-        # Return the response text - will be parsed by the parser
-        return response.text
+        # Generate response from Gemini
+        return _generate("improve_section", prefix, original_block, _validate_section_improvement, validate_and_fix_section_data)
+    except CLIENT_ERRORS:
+        raise
     except Exception as e:
-        print(f"Error calling Gemini API for section improvement: {e}")
+        logger.error("Error calling Gemini API for section improvement: %s", e)
         raise Exception(f"Error improving section: {str(e)}")
@@ -1,15 +1,18 @@
 import os
 import json
+import logging
 from dotenv import load_dotenv
 import google.generativeai as genai
 
 # Load environment variables from .env file if present
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configure environment
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
-    print("Warning: GOOGLE_API_KEY not set. Gemini API calls will fail.")
+    logger.warning("GOOGLE_API_KEY not set. Gemini API calls will fail.")
 
 # Configure Gemini API
 genai.configure(api_key=GOOGLE_API_KEY)
@@ -155,7 +158,7 @@ def analyze_resume_with_gemini(resume_text, job_description):
         # Return the response text - will be parsed by the parser
         return response.text
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
+        logger.error("Error calling Gemini API: %s", e)
         raise Exception(f"Error analyzing resume: {str(e)}")
 
 
@@ -349,7 +352,7 @@ def analyze_resume_overall_with_gemini(resume_text):
         # Return the response text - will be parsed by the parser
         return response.text
     except Exception as e:
-        print(f"Error calling Gemini API for overall analysis: {e}")
+        logger.error("Error calling Gemini API for overall analysis: %s", e)
         raise Exception(f"Error analyzing resume overall: {str(e)}")
 
 
@@ -477,5 +480,5 @@ def improve_resume_section_with_gemini(section_type, original_text):
         # Return the response text - will be parsed by the parser
         return response.text
     except Exception as e:
-        print(f"Error calling Gemini API for section improvement: {e}")
+        logger.error("Error calling Gemini API for section improvement: %s", e)
         raise Exception(f"Error improving section: {str(e)}")
@@ -0,0 +1,156 @@
+"""
+The one place that touches google-generativeai internals
+
+Releases before 0.4 take neither a per-call timeout nor a client per model
+in their public API. Clients are therefore built per API key with the SDK's
+client manager and bound to models here, wrapped so each RPC gets the
+calling thread's timeout. Everything else talks to the SDK through its
+public API. Each internal is checked where it is used and fails with an
+error naming this module, and tests/test_genai_adapter.py pins them against
+the installed SDK.
+"""
+import inspect
+import threading
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.api_core import retry as google_retry
+from google.generativeai import client as genai_client
+
+# google-generativeai 0.4+ takes per-call options such as a timeout
+SDK_ACCEPTS_TIMEOUT = 'request_options' in inspect.signature(genai.GenerativeModel.generate_content).parameters
+
+# RPCs of the generative service client that get the calling thread's timeout
+_TIMED_METHODS = frozenset({'generate_content', 'stream_generate_content', 'count_tokens'})
+
+_local = threading.local()
+
+@contextmanager
+def call_timeout(seconds):
+    """
+    Bound the SDK calls made by this thread through a bound client
+
+    Args:
+        seconds (float): Seconds each RPC may take, None for the SDK default
+    """
+    previous = getattr(_local, 'timeout', None)
+    _local.timeout = seconds
+    try:
+        yield
+    finally:
+        _local.timeout = previous
+
+def _bounded_retry(seconds):
+    """The SDK's default retry policy, with its overall deadline cut to the given seconds"""
+    return google_retry.Retry(
+        initial=1.0,
+        maximum=10.0,
+        multiplier=1.3,
+        predicate=google_retry.if_exception_type(google_exceptions.ServiceUnavailable),
+        timeout=seconds
+    )
+
+class TimeoutClient:
+    """
+    Generative service client proxy that passes the calling thread's timeout to each RPC
+
+    The default retry policy keeps retrying for 60 seconds whatever timeout an
+    attempt has, so the retry deadline is bounded as well.
+    """
+
+    def __init__(self, client, api_key=None):
+        self.wrapped = client
+        self.api_key = api_key
+
+    def __getattr__(self, name):
+        attribute = getattr(self.wrapped, name)
+        if name not in _TIMED_METHODS:
+            return attribute
+
+        def call(*args, **kwargs):
+            timeout = getattr(_local, 'timeout', None)
+            if timeout is not None:
+                kwargs.setdefault('timeout', timeout)
+                kwargs.setdefault('retry', _bounded_retry(timeout))
+            return attribute(*args, **kwargs)
+        return call
+
+def make_keyed_client(api_key):
+    """
+    Build a generative service client bound to one API key
+
+    genai.configure() sets a single process-wide key, so each pooled key gets
+    its own client manager instead of reconfiguring the global one.
+
+    Raises:
+        RuntimeError: If the installed SDK no longer has the client manager this relies on
+    """
+    manager_class = getattr(genai_client, '_ClientManager', None)
+    if manager_class is None:
+        raise RuntimeError(
+            f"google-generativeai {genai.__version__} has no client._ClientManager; "
+            "services/genai_adapter.py needs updating for this release"
+        )
+    manager = manager_class()
+    manager.configure(api_key=api_key)
+    return manager.get_default_client('generative')
+
+def default_client():
+    """The process-wide generative service client, configured by genai.configure()"""
+    return genai_client.get_default_generative_client()
+
+def _check_model(model):
+    if not hasattr(model, '_client'):
+        raise RuntimeError(
+            f"google-generativeai {genai.__version__} has no GenerativeModel._client; "
+            "services/genai_adapter.py needs updating for this release"
+        )
+
+def timed_model(model):
+    """
+    Make sure a model sends its calls through a timeout-aware client, creating
+    the default client the way the SDK would on the model's first call
+
+    Args:
+        model (genai.GenerativeModel): The model
+
+    Returns:
+        genai.GenerativeModel: The same model
+    """
+    _check_model(model)
+    if not isinstance(model._client, TimeoutClient):
+        bind_client(model, model._client or default_client())
+    return model
+
+def bind_client(model, client, api_key=None):
+    """
+    Make a model send its calls through the given client, with per-call timeouts
+
+    Args:
+        model (genai.GenerativeModel): The model
+        client: A generative service client
+        api_key (str): The key the client was built with, None for the configured key
+
+    Returns:
+        genai.GenerativeModel: The same model
+
+    Raises:
+        RuntimeError: If the installed SDK no longer keeps its client where this expects
+    """
+    _check_model(model)
+    if isinstance(client, TimeoutClient):
+        api_key = api_key if api_key is not None else client.api_key
+        client = client.wrapped
+    model._client = TimeoutClient(client, api_key)
+    return model
+
+def client_of(model):
+    """The client a model is bound to, None if it still uses the SDK's default"""
+    _check_model(model)
+    return model._client if isinstance(model._client, TimeoutClient) else None
+
+def api_key_of(model):
+    """The API key of a model's bound client, None for the globally configured key"""
+    client = client_of(model)
+    return client.api_key if client is not None else None
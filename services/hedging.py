@@ -0,0 +1,176 @@
+"""
+Hedged requests: issue a second request once the first exceeds the learned
+tail latency and take whichever finishes first
+"""
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.deadlines import POLL_INTERVAL_SECONDS
+from utils.errors import TooManyRequestsError
+from utils.metrics import metrics
+
+class HedgedExecutor:
+    """
+    Runs a primary call and, once it is slower than the endpoint's learned
+    latency percentile, a hedge call on another backend.
+
+    The first successful result wins; the loser is cancelled through its
+    cancel event (providers that cannot stop simply finish in the background).
+    Hedges per endpoint are capped at a fraction of its requests. At most
+    max_workers calls run at once and max_queue more may wait for a thread;
+    calls that cannot be interrupted keep their thread until they finish, so
+    beyond that a new call is rejected instead of queueing behind them.
+    """
+
+    def __init__(self, budgets, percentile=95, min_samples=20, window=200, max_workers=32, max_queue=0):
+        self.budgets = dict(budgets)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._requests = {}
+        self._hedges = {}
+        self._lock = threading.Lock()
+        self._window = window
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self._capacity = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def _submit(self, call, cancel_event, reserved=False):
+        """Start a call, or return None when every thread is busy and the queue is full"""
+        if not reserved and not self._capacity.acquire(blocking=False):
+            return None
+        future = self._executor.submit(self._timed, call, cancel_event)
+        future.add_done_callback(lambda _: self._capacity.release())
+        return future
+
+    def hedge_delay(self, endpoint):
+        """
+        Get the learned delay after which a request is hedged
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+
+        Returns:
+            float: Seconds, or None until enough latencies have been observed
+        """
+        with self._lock:
+            samples = self._latencies.get(endpoint)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))]
+
+    def _record(self, endpoint, latency):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self._window)).append(latency)
+
+    def _admit_hedge(self, endpoint):
+        """Check the endpoint's hedge budget and count the hedge if allowed"""
+        with self._lock:
+            requests = self._requests.get(endpoint, 0)
+            hedges = self._hedges.get(endpoint, 0)
+            if hedges + 1 > self.budgets.get(endpoint, 0) * requests:
+                return False
+            self._hedges[endpoint] = hedges + 1
+            return True
+
+    def _timed(self, call, cancel_event):
+        start = time.time()
+        result = call(cancel_event)
+        return result, time.time() - start
+
+    def _result(self, future, deadline, cancel_events):
+        """Wait for a call; if the request is abandoned first, cancel the calls and stop"""
+        if deadline is None:
+            return future.result()
+        try:
+            return deadline.wait(future)
+        except BaseException:
+            for cancel_event in cancel_events:
+                cancel_event.set()
+            raise
+
+    def run(self, endpoint, primary, hedge=None, reserve_hedge=None, release_hedge=None, deadline=None,
+            track_primary=None):
+        """
+        Run a call with an optional hedge
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            primary (callable): Takes a cancel event and returns the result
+            hedge (callable): Same signature, run against another backend
+            reserve_hedge (callable): Returns True if capacity for a hedge is available
+            release_hedge (callable): Called with (latency, error) when the hedge finishes
+            deadline (Deadline): The request's deadline; the calls are cancelled when it is abandoned
+            track_primary (callable): Called with the primary call's future, which may outlive run()
+
+        Returns:
+            The result of whichever call succeeded first
+        """
+        with self._lock:
+            self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+
+        primary_cancel = threading.Event()
+        primary_future = self._submit(primary, primary_cancel)
+        if primary_future is None:
+            metrics.increment('hedge.executor_full')
+            raise TooManyRequestsError("Server is busy, please retry shortly", retry_after=1)
+        if track_primary:
+            track_primary(primary_future)
+        delay = self.hedge_delay(endpoint) if hedge is not None else None
+
+        if delay is None:
+            result, latency = self._result(primary_future, deadline, [primary_cancel])
+            self._record(endpoint, latency)
+            return result
+
+        if deadline is not None:
+            # A hedge never starts after the request has run out of time
+            delay = min(delay, deadline.remaining())
+        done, _ = wait([primary_future], timeout=delay)
+        abandoned = deadline is not None and deadline.abandoned()
+        # A hedge needs a free thread, budget and a limiter slot, checked in that order
+        thread_free = not (done or abandoned) and self._capacity.acquire(blocking=False)
+        if not thread_free or not self._admit_hedge(endpoint) or (reserve_hedge and not reserve_hedge()):
+            if thread_free:
+                self._capacity.release()
+            result, latency = self._result(primary_future, deadline, [primary_cancel])
+            self._record(endpoint, latency)
+            return result
+
+        metrics.increment(f'hedge.{endpoint}.issued')
+        hedge_cancel = threading.Event()
+        hedge_future = self._submit(hedge, hedge_cancel, reserved=True)
+        if release_hedge:
+            hedge_started = time.time()
+            hedge_future.add_done_callback(
+                lambda future: release_hedge(time.time() - hedge_started, future.exception())
+            )
+
+        futures = {primary_future: ('primary', hedge_cancel), hedge_future: ('hedge', primary_cancel)}
+        pending = set(futures)
+        last_error = None
+        poll = POLL_INTERVAL_SECONDS if deadline is not None else None
+        while pending:
+            done, pending = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+            if not done and deadline.abandoned():
+                primary_cancel.set()
+                hedge_cancel.set()
+                deadline.check()
+            for future in done:
+                winner, loser_cancel = futures[future]
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    continue
+                # Cancel the loser and do not wait for it
+                loser_cancel.set()
+                result, latency = future.result()
+                if winner == 'primary':
+                    self._record(endpoint, latency)
+                else:
+                    self._record(endpoint, delay + latency)
+                metrics.increment(f'hedge.{endpoint}.won_by_{winner}')
+                return result
+
+        raise last_error
@@ -0,0 +1,250 @@
+"""
+Job description preprocessing: normalisation, hashing and cached derived artifacts
+"""
+import re
+import os
+import time
+import unicodedata
+
+from config import get_config
+from utils.content_store import ContentStore, content_hash
+
+config = get_config()
+
+# Derived artifacts are keyed by the hash of the normalised text, so the same
+# job description posted by many clients is only processed once
+_store = ContentStore(
+    max_entries=config.JOB_DESCRIPTION_CACHE_SIZE,
+    directory=os.path.join(config.UPLOAD_FOLDER, 'job_descriptions'),
+    max_files=config.CONTENT_STORE_MAX_FILES
+)
+
+ID_PREFIX = 'jd'
+ID_HASH_LENGTH = 24
+MAX_CONDENSED_CHARS = 4000
+MAX_REQUIREMENTS = 20
+
+_BULLET_RE = re.compile(r'^\s*(?:[-*•▪●◦‣⁃∙]|\d+[.)])\s+')
+_YEARS_RE = re.compile(r'(\d{1,2})\s*\+?\s*(?:-\s*\d{1,2}\s*)?(?:years?|yrs?)', re.IGNORECASE)
+
+_REQUIREMENT_MARKERS = (
+    'experience', 'required', 'requirement', 'must', 'proficien', 'knowledge of',
+    'familiar', 'degree', 'ability to', 'skilled', 'expertise', 'understanding of',
+    'years', 'strong', 'hands-on', 'qualification'
+)
+
+# Headings whose sections carry no signal for resume matching
+_BOILERPLATE_HEADINGS = (
+    'about us', 'about the company', 'who we are', 'benefits', 'perks', 'what we offer',
+    'equal opportunity', 'eeo', 'how to apply', 'compensation', 'salary', 'our values'
+)
+
+_SENIORITY_KEYWORDS = (
+    ('Senior', ('senior', 'sr.', 'sr ', 'lead', 'principal', 'staff', 'head of', 'architect')),
+    ('Junior', ('junior', 'jr.', 'jr ', 'entry level', 'entry-level', 'graduate', 'intern')),
+    ('Mid-level', ('mid-level', 'mid level', 'intermediate')),
+)
+
+KNOWN_SKILLS = (
+    'Python', 'Java', 'JavaScript', 'TypeScript', 'C++', 'C#', 'Go', 'Golang', 'Rust', 'Ruby',
+    'PHP', 'Kotlin', 'Swift', 'Scala', 'R', 'SQL', 'NoSQL', 'Bash', 'HTML', 'CSS', 'Sass',
+    'React', 'Angular', 'Vue.js', 'Next.js', 'Node.js', 'Express', 'Django', 'Flask',
+    'FastAPI', 'Spring', 'Spring Boot', '.NET', 'Rails', 'Laravel', 'GraphQL', 'REST',
+    'gRPC', 'Redux', 'Tailwind', 'jQuery', 'PostgreSQL', 'MySQL', 'MongoDB', 'Redis',
+    'Elasticsearch', 'Cassandra', 'DynamoDB', 'SQLite', 'Oracle', 'Snowflake', 'BigQuery',
+    'Kafka', 'RabbitMQ', 'Spark', 'Hadoop', 'Airflow', 'dbt', 'AWS', 'Azure', 'GCP',
+    'Google Cloud', 'Docker', 'Kubernetes', 'Terraform', 'Ansible', 'Jenkins', 'GitHub Actions',
+    'GitLab CI', 'CI/CD', 'Linux', 'Git', 'Microservices', 'Serverless', 'Machine Learning',
+    'Deep Learning', 'NLP', 'Computer Vision', 'TensorFlow', 'PyTorch', 'scikit-learn',
+    'Pandas', 'NumPy', 'LLM', 'Data Analysis', 'Data Engineering', 'Tableau', 'Power BI',
+    'Excel', 'Figma', 'Jira', 'Agile', 'Scrum', 'Unit Testing', 'Selenium', 'Cypress',
+    'Jest', 'PyTest', 'Android', 'iOS', 'React Native', 'Flutter', 'Networking', 'Security',
+    'OAuth', 'System Design', 'Distributed Systems', 'Communication', 'Leadership',
+    'Mentoring', 'Project Management', 'Stakeholder Management', 'Problem Solving'
+)
+
+def _skill_pattern(skill):
+    # Word boundaries do not work around symbols such as "C++" or ".NET"
+    return re.compile(r'(?<![\w+#.])' + re.escape(skill.lower()) + r'(?![\w+#])')
+
+_SKILL_PATTERNS = tuple((skill, _skill_pattern(skill)) for skill in KNOWN_SKILLS)
+
+def normalize_job_description(text):
+    """
+    Normalise a job description so trivially different copies hash identically
+
+    Args:
+        text (str): The raw job description text
+
+    Returns:
+        str: Text with unicode, bullets and whitespace normalised
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    lines = []
+    for line in text.split('\n'):
+        line = _BULLET_RE.sub('- ', line)
+        line = re.sub(r'[ \t]+', ' ', line).strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+
+    return '\n'.join(lines).strip()
+
+def job_description_id(normalized_text):
+    """
+    Derive the stable id of a normalised job description
+
+    Args:
+        normalized_text (str): Output of normalize_job_description
+
+    Returns:
+        str: The job description id
+    """
+    return f"{ID_PREFIX}{content_hash(normalized_text)[:ID_HASH_LENGTH]}"
+
+def _is_heading(line):
+    return len(line) < 60 and not line.startswith('- ') and (line.endswith(':') or line.isupper())
+
+def _relevant_lines(normalized_text):
+    """Drop boilerplate sections and duplicate lines"""
+    relevant = []
+    seen = set()
+    skipping = False
+
+    for line in normalized_text.split('\n'):
+        if not line:
+            continue
+        if _is_heading(line):
+            heading = line.rstrip(':').lower()
+            skipping = any(marker in heading for marker in _BOILERPLATE_HEADINGS)
+        if skipping:
+            continue
+        key = line.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        relevant.append(line)
+
+    return relevant
+
+def extract_requirements(lines):
+    """
+    Pick out the requirement statements of a job description
+
+    Args:
+        lines (list): Relevant, normalised lines
+
+    Returns:
+        list: Up to MAX_REQUIREMENTS requirement strings
+    """
+    requirements = []
+    for line in lines:
+        if _is_heading(line):
+            continue
+        lowered = line.lower()
+        if any(marker in lowered for marker in _REQUIREMENT_MARKERS):
+            requirements.append(line[2:] if line.startswith('- ') else line)
+        if len(requirements) >= MAX_REQUIREMENTS:
+            break
+    return requirements
+
+def extract_skills(text):
+    """
+    Find known skills mentioned in a job description
+
+    Args:
+        text (str): Normalised job description text
+
+    Returns:
+        list: Skill names in vocabulary order
+    """
+    lowered = text.lower()
+    return [skill for skill, pattern in _SKILL_PATTERNS if pattern.search(lowered)]
+
+def detect_seniority(text):
+    """
+    Classify the seniority level a job description asks for
+
+    Args:
+        text (str): Normalised job description text
+
+    Returns:
+        str: Junior, Mid-level, Senior, or None when it cannot be determined
+    """
+    lowered = f" {text.lower()} "
+    for level, keywords in _SENIORITY_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return level
+
+    years = [int(match) for match in _YEARS_RE.findall(text)]
+    if years:
+        required = max(years)
+        if required >= 5:
+            return 'Senior'
+        if required >= 2:
+            return 'Mid-level'
+        return 'Junior'
+
+    return None
+
+def condense(lines):
+    """
+    Build the condensed job description text that is embedded in prompts
+
+    Args:
+        lines (list): Relevant, normalised lines
+
+    Returns:
+        str: The condensed text, capped at MAX_CONDENSED_CHARS
+    """
+    condensed = '\n'.join(lines)
+    if len(condensed) > MAX_CONDENSED_CHARS:
+        condensed = condensed[:MAX_CONDENSED_CHARS].rsplit('\n', 1)[0]
+    return condensed
+
+def register_job_description(text):
+    """
+    Normalise a job description and compute (or reuse) its derived artifacts
+
+    Args:
+        text (str): The raw job description text
+
+    Returns:
+        dict: The cached entry with id, requirements, skills, seniority and condensed text
+    """
+    normalized = normalize_job_description(text)
+    if not normalized:
+        raise ValueError("Job description is empty")
+
+    jd_id = job_description_id(normalized)
+    entry = _store.get(jd_id)
+    if entry is not None:
+        return entry
+
+    lines = _relevant_lines(normalized)
+    entry = {
+        'id': jd_id,
+        'requirements': extract_requirements(lines),
+        'skills': extract_skills(normalized),
+        'seniority_level': detect_seniority(normalized),
+        'condensed': condense(lines) or normalized[:MAX_CONDENSED_CHARS],
+        'original_length': len(text),
+        'created_at': int(time.time())
+    }
+    _store.put(jd_id, entry)
+    return entry
+
+def get_job_description(jd_id):
+    """
+    Look up a previously registered job description
+
+    Args:
+        jd_id (str): The job description id
+
+    Returns:
+        dict: The cached entry or None if the id is unknown
+    """
+    if not jd_id or not jd_id.startswith(ID_PREFIX):
+        return None
+    return _store.get(jd_id)
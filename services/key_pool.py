@@ -0,0 +1,183 @@
+"""
+Pool of Gemini API keys with per-key rate tracking and quota-aware rotation
+"""
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from services import genai_adapter
+from utils.errors import TooManyRequestsError
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def is_quota_error(error):
+    """Check whether an upstream error means the key ran out of quota"""
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'resource has been exhausted' in message
+
+class ApiKey:
+    """One pooled key and its load: calls in flight, recent calls and cooldown"""
+
+    def __init__(self, key):
+        self.key = key
+        # Only a fingerprint of the key is ever logged or exported
+        self.name = 'key-' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]
+        self.in_flight = 0
+        self.recent = deque()
+        self.cooldown_until = 0.0
+        self.quota_errors = 0
+
+    def requests_last_minute(self, now):
+        while self.recent and self.recent[0] <= now - 60:
+            self.recent.popleft()
+        return len(self.recent)
+
+class ApiKeyPool:
+    """
+    Spreads calls over several API keys (or projects).
+
+    Each call goes to the healthy key with the fewest calls in flight, ties
+    broken by calls in the last minute. A key at its per-minute cap is
+    skipped, and a key that returns a quota error is evicted for a cooldown
+    that doubles with consecutive quota errors. Model objects are created
+    once per (key, model) with the key's own client, so shared models never
+    switch keys under a concurrent call.
+    """
+
+    def __init__(self, keys, requests_per_minute=0, cooldown_seconds=60, max_cooldown_seconds=900,
+                 client_factory=genai_adapter.make_keyed_client, model_factory=genai.GenerativeModel):
+        unique_keys = list(dict.fromkeys(key for key in keys if key))
+        self.keys = [ApiKey(key) for key in unique_keys]
+        self.requests_per_minute = requests_per_minute
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.client_factory = client_factory
+        self.model_factory = model_factory
+        self._clients = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _available(self, api_key, now, charge=True):
+        if api_key.cooldown_until > now:
+            return False
+        return not charge or not self.requests_per_minute or api_key.requests_last_minute(now) < self.requests_per_minute
+
+    def _retry_after(self, now):
+        """Seconds until the first key can take a call again"""
+        waits = []
+        for api_key in self.keys:
+            wait = max(api_key.cooldown_until - now, 0)
+            if self.requests_per_minute and api_key.requests_last_minute(now) >= self.requests_per_minute:
+                wait = max(wait, api_key.recent[0] + 60 - now)
+            waits.append(wait)
+        return max(1, math.ceil(min(waits)))
+
+    def _publish(self, now):
+        healthy = 0
+        for api_key in self.keys:
+            metrics.set_gauge(f'key_pool.{api_key.name}.in_flight', api_key.in_flight)
+            metrics.set_gauge(f'key_pool.{api_key.name}.requests_last_minute', api_key.requests_last_minute(now))
+            healthy += api_key.cooldown_until <= now
+        metrics.set_gauge('key_pool.healthy_keys', healthy)
+
+    def acquire(self, exclude=(), charge=True):
+        """
+        Take the least-loaded healthy key
+
+        Args:
+            exclude (iterable): Keys not to use (e.g. keys that just failed for this call)
+            charge (bool): Count the call against the key's per-minute cap; False for
+                free calls such as health probes, which may also use a key at its cap
+
+        Returns:
+            ApiKey: The key, which must be released
+
+        Raises:
+            TooManyRequestsError: If every key is cooling down or at its rate cap
+        """
+        now = time.time()
+        with self._lock:
+            candidates = [api_key for api_key in self.keys if api_key not in exclude and self._available(api_key, now, charge)]
+            if not candidates:
+                metrics.increment('key_pool.exhausted')
+                raise TooManyRequestsError("All API keys are over quota, please retry later",
+                                           retry_after=self._retry_after(now))
+            api_key = min(candidates, key=lambda candidate: (candidate.in_flight, candidate.requests_last_minute(now)))
+            api_key.in_flight += 1
+            if charge:
+                api_key.recent.append(now)
+            self._publish(now)
+        if charge:
+            metrics.increment(f'key_pool.{api_key.name}.requests')
+        return api_key
+
+    def release(self, api_key, error=None):
+        """
+        Return a key, evicting it for a cooldown if the call hit its quota
+
+        Args:
+            api_key (ApiKey): The key taken with acquire()
+            error (Exception): The error the call raised, if any
+        """
+        now = time.time()
+        with self._lock:
+            api_key.in_flight -= 1
+            if error is not None and is_quota_error(error):
+                api_key.quota_errors += 1
+                cooldown = min(self.cooldown_seconds * 2 ** (api_key.quota_errors - 1), self.max_cooldown_seconds)
+                api_key.cooldown_until = now + cooldown
+                metrics.increment(f'key_pool.{api_key.name}.quota_errors')
+                logger.warning("API key %s hit its quota, evicted for %.0fs", api_key.name, cooldown)
+            elif error is None:
+                api_key.quota_errors = 0
+            self._publish(now)
+
+    @contextmanager
+    def lease(self, exclude=()):
+        """Context manager that holds a key for the duration of one call"""
+        api_key = self.acquire(exclude)
+        error = None
+        try:
+            yield api_key
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(api_key, error)
+
+    def model(self, api_key, model_name):
+        """
+        Get the model object for a model name bound to a key's client
+
+        Args:
+            api_key (ApiKey): The pooled key
+            model_name (str): The model name
+
+        Returns:
+            genai.GenerativeModel: A model that always calls with this key
+        """
+        cache_key = (api_key.name, model_name)
+        with self._lock:
+            model = self._models.get(cache_key)
+            if model is not None:
+                return model
+            client = self._clients.get(api_key.name)
+        if client is None:
+            client = self.client_factory(api_key.key)
+        model = genai_adapter.bind_client(self.model_factory(model_name), client, api_key.key)
+        with self._lock:
+            self._clients.setdefault(api_key.name, client)
+            return self._models.setdefault(cache_key, model)
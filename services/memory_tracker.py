@@ -0,0 +1,199 @@
+"""
+Optional per-request memory accounting with tracemalloc
+
+tracemalloc only traces while a tracked request is in flight, so its
+snapshots hold just the allocations made since the request started and stay
+cheap to take. Stage peaks feed the metrics; the worst requests keep their
+top allocation sites for the admin endpoint.
+"""
+import os
+import time
+import heapq
+import threading
+import tracemalloc
+import contextvars
+
+from utils.metrics import metrics
+
+_current = contextvars.ContextVar('memory_session', default=None)
+
+# Allocations made by the tracking itself
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def _site(frame):
+    """file:line of an allocation, relative to the project or site-packages"""
+    filename = frame.filename
+    if 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    elif os.path.isabs(filename):
+        filename = os.path.relpath(filename)
+    return f"{filename}:{frame.lineno}"
+
+def current():
+    """The memory session of the request being served, or None"""
+    return _current.get()
+
+class MemorySession:
+    """Memory figures of one request: its peak, per-stage peaks and largest allocation sites"""
+
+    def __init__(self, endpoint, baseline):
+        self.endpoint = endpoint
+        self.started = time.time()
+        self.baseline = baseline
+        self.peak = baseline
+        self.stages = {}
+        self.sites = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, peak, stage_peak, retained, sites):
+        """Record a finished stage; peak is the absolute traced peak during it"""
+        with self._lock:
+            self.peak = max(self.peak, peak)
+            self.stages[name] = {'peak_bytes': stage_peak, 'retained_bytes': retained}
+            for site, size, count in sites:
+                # A site keeps the largest size it reached at any stage boundary
+                if site not in self.sites or size > self.sites[site]['size_bytes']:
+                    self.sites[site] = {'site': site, 'stage': name, 'size_bytes': size, 'blocks': count}
+
+    def summary(self, top_sites):
+        """JSON-serialisable figures of the request"""
+        with self._lock:
+            sites = sorted(self.sites.values(), key=lambda site: -site['size_bytes'])[:top_sites]
+            return {
+                'endpoint': self.endpoint,
+                'started': self.started,
+                'peak_bytes': self.peak - self.baseline,
+                'stages': dict(self.stages),
+                'top_sites': sites
+            }
+
+class MemoryTracker:
+    """
+    Opens a tracemalloc window around tracked requests and keeps the worst ones
+
+    The window is shared: tracing starts with the first tracked request in
+    flight and stops after the last, so concurrent requests (gthread
+    workers, stages running side by side) are traced together and their
+    figures are upper bounds.
+
+    Args:
+        worst_requests (int): Requests with the highest peaks to keep
+        top_sites (int): Allocation sites kept per request
+    """
+
+    def __init__(self, worst_requests=20, top_sites=10):
+        self.worst_requests = worst_requests
+        self.top_sites = top_sites
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._stages = 0
+        self._owns_tracing = False
+        self._worst = []
+        self._sequence = 0
+
+    def begin(self, endpoint):
+        """
+        Start tracking a request
+
+        Returns:
+            MemorySession: The request's session
+        """
+        with self._lock:
+            if self._requests == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            self._requests += 1
+            baseline = tracemalloc.get_traced_memory()[0]
+        return MemorySession(endpoint, baseline)
+
+    def end(self, session):
+        """Finish a request: record its peak and close the window if it was the last"""
+        summary = session.summary(self.top_sites)
+        metrics.observe(f"memory.{session.endpoint}.request_peak_bytes", summary['peak_bytes'])
+        with self._lock:
+            self._requests -= 1
+            if self._requests == 0 and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+            self._sequence += 1
+            entry = (summary['peak_bytes'], self._sequence, summary)
+            if len(self._worst) < self.worst_requests:
+                heapq.heappush(self._worst, entry)
+            elif entry > self._worst[0]:
+                heapq.heapreplace(self._worst, entry)
+
+    def stage_started(self):
+        """Reset the peak if nothing else is running; returns the traced bytes at the start"""
+        with self._lock:
+            if self._stages == 0:
+                tracemalloc.reset_peak()
+            self._stages += 1
+            return tracemalloc.get_traced_memory()[0]
+
+    def stage_finished(self):
+        """
+        Mark a stage as done
+
+        Returns:
+            tuple: (traced bytes now, peak traced bytes since the stage started)
+        """
+        with self._lock:
+            self._stages -= 1
+            return tracemalloc.get_traced_memory()
+
+    def site_sizes(self):
+        """
+        Allocation sites holding the most traced memory right now
+
+        Returns:
+            list: (file:line, bytes, blocks) tuples, largest first
+        """
+        statistics = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS).statistics('lineno')
+        return [(_site(stat.traceback[0]), stat.size, stat.count) for stat in statistics[:self.top_sites]]
+
+    def worst(self):
+        """The kept requests, highest peak first"""
+        with self._lock:
+            return [summary for _, _, summary in sorted(self._worst, reverse=True)]
+
+class MemoryHook:
+    """
+    Pipeline hook that records each stage's peak and live allocation sites
+    for requests with a memory session
+    """
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self._local = threading.local()
+
+    def before_stage(self, pipeline, stage, context):
+        if _current.get() is None:
+            return
+        self._local.start = self.tracker.stage_started()
+
+    def after_stage(self, pipeline, stage, context, seconds, error=None, cache_hit=None):
+        start = getattr(self._local, 'start', None)
+        session = _current.get()
+        if start is None or session is None:
+            return
+        self._local.start = None
+        traced, peak = self.tracker.stage_finished()
+        stage_peak = max(peak - start, 0)
+        metrics.observe(f"memory.{pipeline.name}.{stage.name}.peak_bytes", stage_peak)
+        session.add_stage(stage.name, peak, stage_peak, traced - start, self.tracker.site_sizes())
+
+def activate(session):
+    """Make session the current one; returns the token for deactivate()"""
+    return _current.set(session)
+
+def deactivate(token):
+    """Restore the session that was current before activate()"""
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
@@ -0,0 +1,107 @@
+"""
+Cross-request micro-batching: calls arriving within a short window share one upstream call
+"""
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from utils import deadlines
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class _Batch:
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.items = []
+        self.futures = []
+        self.created = time.time()
+
+class MicroBatcher:
+    """
+    Collects calls that arrive within window_seconds of each other into one batch.
+
+    The first caller of a batch becomes its leader: it waits until the batch is
+    full or its window has passed, runs process_batch for every item on its own
+    thread and hands each waiting caller its result. No item waits longer than
+    the window before its batch is sent, and a batch never exceeds max_batch_size.
+
+    Args:
+        name (str): Name used in metrics
+        process_batch (callable): Takes the list of items and returns one result
+            per item, in order; a result may be an exception, which is raised
+            only to that item's caller
+        window_seconds (float): How long a batch stays open for more items
+        max_batch_size (int): Items at which a batch is sent immediately
+    """
+
+    def __init__(self, name, process_batch, window_seconds=0.05, max_batch_size=8):
+        self.name = name
+        self.process_batch = process_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._open = None
+        self._condition = threading.Condition()
+
+    def submit(self, item):
+        """
+        Add an item to the open batch (or open one) and wait for its result
+
+        Args:
+            item: The call's input
+
+        Returns:
+            The item's result
+
+        Raises:
+            Exception: The item's error, or the batch error if the whole batch failed
+            DeadlineExceededError, ClientDisconnectedError: If the caller's request is abandoned first
+        """
+        future = Future()
+        with self._condition:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch(time.time() + self.window_seconds)
+            batch.items.append(item)
+            batch.futures.append(future)
+            if len(batch.items) >= self.max_batch_size:
+                self._open = None
+                self._condition.notify_all()
+
+        if leader:
+            with self._condition:
+                while self._open is batch:
+                    remaining = batch.deadline - time.time()
+                    if remaining <= 0:
+                        self._open = None
+                        break
+                    self._condition.wait(remaining)
+            self._run(batch)
+
+        # A caller whose request is abandoned stops waiting; the batch still completes for the others
+        return deadlines.wait(future)
+
+    def _run(self, batch):
+        size = len(batch.items)
+        metrics.increment(f"batcher.{self.name}.batches")
+        metrics.observe(f"batcher.{self.name}.batch_size", size)
+        metrics.observe(f"batcher.{self.name}.window_seconds", time.time() - batch.created)
+        try:
+            results = self.process_batch(batch.items)
+            if len(results) != size:
+                raise RuntimeError(f"Batch of {size} items returned {len(results)} results")
+        except Exception as e:
+            # Release the waiting callers before anything else can go wrong
+            for future in batch.futures:
+                future.set_exception(e)
+            metrics.increment(f"batcher.{self.name}.failed_batches")
+            logger.warning("%s batch of %d failed: %s", self.name, size, getattr(e, 'message', type(e).__name__))
+            return
+
+        for future, result in zip(batch.futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,61 @@
+"""
+Tiered model routing: pick a model tier per endpoint and input size and
+escalate to stronger tiers when the output is rejected
+"""
+import threading
+
+import google.generativeai as genai
+
+class ModelRouter:
+    """
+    Maps endpoints and input sizes to model tiers.
+
+    Tiers are ordered from the cheapest to the strongest model. Each endpoint
+    has a list of (tier, max_input_chars) rules; the first rule the input fits
+    selects the starting tier, and every stronger tier is an escalation step.
+    """
+
+    def __init__(self, tiers, routes, default_tier=None, model_factory=genai.GenerativeModel):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = dict(tiers)
+        self.tier_order = list(tiers)
+        self.routes = dict(routes)
+        self.default_tier = default_tier or self.tier_order[-1]
+        self.model_factory = model_factory
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def tiers_for(self, endpoint, input_size):
+        """
+        Get the tiers to try for a request, in escalation order
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            input_size (int): Size of the variable prompt text in characters
+
+        Returns:
+            list: Tier names, starting tier first
+        """
+        start = self.default_tier
+        for tier, max_chars in self.routes.get(endpoint, []):
+            if tier in self.tiers and (max_chars is None or input_size <= max_chars):
+                start = tier
+                break
+        return self.tier_order[self.tier_order.index(start):]
+
+    def model(self, tier):
+        """
+        Get the shared model object of a tier
+
+        Args:
+            tier (str): Tier name
+
+        Returns:
+            The model instance, created on first use
+        """
+        with self._lock:
+            model = self._models.get(tier)
+            if model is None:
+                model = self._models[tier] = self.model_factory(self.tiers[tier])
+            return model
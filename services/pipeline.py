@@ -0,0 +1,169 @@
+"""
+Small staged pipeline engine: declared stages over a shared context, with
+per-stage timing hooks, cache checks at stage boundaries and concurrent
+execution of stages that do not depend on each other
+"""
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils import deadlines
+from utils.errors import ApiError
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Shared by all pipelines for stages that run next to another stage
+stage_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='pipeline')
+
+class Stage:
+    """
+    One step of a pipeline
+
+    Args:
+        name (str): Stage name, used in metrics
+        func (callable): Called with the required context values as keyword
+            arguments; returns the single provided value, or a tuple of values
+            when several are provided
+        requires (tuple): Context keys the stage reads
+        provides (tuple): Context keys the stage writes
+        cache: Optional store with get(key)/put(key, value) for JSON-serialisable outputs
+        cache_key (callable): Builds the cache key from the required values; None skips the cache
+        error (tuple): (ApiError subclass, message prefix) used to wrap unexpected errors
+        concurrent (bool): False for stages that must run on the calling thread
+            (e.g. ones that read the Flask request)
+    """
+
+    def __init__(self, name, func, requires=(), provides=(), cache=None, cache_key=None,
+                 error=None, concurrent=True):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.provides = (provides,) if isinstance(provides, str) else tuple(provides)
+        self.cache = cache
+        self.cache_key = cache_key
+        self.error = error
+        self.concurrent = concurrent
+
+class MetricsHook:
+    """Records stage durations, errors and cache outcomes in the metrics registry"""
+
+    def before_stage(self, pipeline, stage, context):
+        pass
+
+    def after_stage(self, pipeline, stage, context, seconds, error=None, cache_hit=None):
+        prefix = f"pipeline.{pipeline.name}.{stage.name}"
+        metrics.observe(f"{prefix}.seconds", seconds)
+        if error is not None:
+            metrics.increment(f"{prefix}.errors")
+        if cache_hit is not None:
+            metrics.increment(f"{prefix}.cache_{'hits' if cache_hit else 'misses'}")
+
+class Pipeline:
+    """
+    Runs declared stages as soon as their required context keys are available.
+
+    When several stages are ready at once, the last declared one runs on the
+    calling thread and the others on the shared stage executor, so the slow
+    stage (usually the model call) should be declared after its siblings. Hooks see every stage before and
+    after it runs; the default hook records timings in the metrics registry.
+
+    Stages run with the caller's context variables, so they see the request's
+    deadline. No stage starts after it has passed, and the caller stops waiting
+    for running stages once the request is abandoned.
+    """
+
+    def __init__(self, name, stages, hooks=None):
+        self.name = name
+        self.stages = list(stages)
+        self.hooks = list(hooks) if hooks is not None else [MetricsHook()]
+
+    def _cached(self, stage, inputs):
+        """Return (key, outputs) for a stage with a cache; outputs is None on a miss"""
+        if stage.cache is None or stage.cache_key is None:
+            return None, None
+        key = stage.cache_key(**inputs)
+        if key is None:
+            return None, None
+        entry = stage.cache.get(key)
+        return key, (entry['outputs'] if entry is not None else None)
+
+    def _run_stage(self, stage, context):
+        inputs = {key: context[key] for key in stage.requires}
+        for hook in self.hooks:
+            hook.before_stage(self, stage, context)
+
+        start = time.time()
+        cache_hit = None
+        try:
+            cache_key, outputs = self._cached(stage, inputs)
+            if cache_key is not None:
+                cache_hit = outputs is not None
+            if outputs is None:
+                result = stage.func(**inputs)
+                outputs = list(result) if len(stage.provides) > 1 else [result]
+                if cache_key is not None:
+                    stage.cache.put(cache_key, {'outputs': outputs})
+        except Exception as e:
+            for hook in self.hooks:
+                hook.after_stage(self, stage, context, time.time() - start, error=e, cache_hit=cache_hit)
+            if isinstance(e, ApiError) or stage.error is None:
+                raise
+            error_class, message = stage.error
+            logger.error("%s: %s", message, e)
+            raise error_class(f"{message}: {str(e)}") from e
+
+        context.update(zip(stage.provides, outputs))
+        for hook in self.hooks:
+            hook.after_stage(self, stage, context, time.time() - start, cache_hit=cache_hit)
+
+    def run(self, context=None):
+        """
+        Run every stage
+
+        Args:
+            context (dict): Initial values (e.g. the request)
+
+        Returns:
+            dict: The context with every stage's outputs
+        """
+        context = dict(context or {})
+        pending = list(self.stages)
+        running = {}
+        start = time.time()
+
+        try:
+            while pending or running:
+                ready = [stage for stage in pending if all(key in context for key in stage.requires)]
+                if not ready and not running:
+                    missing = {key for stage in pending for key in stage.requires if key not in context}
+                    raise RuntimeError(f"Pipeline {self.name} cannot satisfy {sorted(missing)}")
+
+                for stage in ready:
+                    pending.remove(stage)
+                # Keep one ready stage for this thread (always the non-concurrent ones)
+                inline = [stage for stage in ready if not stage.concurrent] or ready[-1:]
+                deadlines.check()
+                for stage in ready:
+                    if stage not in inline:
+                        running[stage_executor.submit(
+                            contextvars.copy_context().run, self._run_stage, stage, context
+                        )] = stage
+
+                if inline:
+                    for stage in inline:
+                        self._run_stage(stage, context)
+                    continue
+
+                poll = deadlines.POLL_INTERVAL_SECONDS if deadlines.current() else None
+                done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                if not done:
+                    deadlines.check()
+                for future in done:
+                    running.pop(future)
+                    future.result()
+        finally:
+            metrics.observe(f"pipeline.{self.name}.seconds", time.time() - start)
+
+        return context
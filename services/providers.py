@@ -0,0 +1,236 @@
+"""
+Model provider abstraction: a Gemini-backed provider and a local stand-in
+with injected latency for tests, soak runs and development without an API key
+"""
+import re
+import json
+import random
+import threading
+
+import google.generativeai as genai
+
+from services import genai_adapter
+from services.context_cache import GenerationResult
+from services.key_pool import is_quota_error
+from utils.token_estimator import estimate_tokens
+
+class ProviderCancelled(Exception):
+    """Raised by providers that stop work early because the caller no longer needs it"""
+
+class ModelProvider:
+    """Base class for anything that can answer a prompt"""
+    name = 'base'
+
+    def generate(self, endpoint, prefix, variable_text, cancel_event=None, generation_config=None, timeout=None):
+        """
+        Generate content for a static prompt prefix followed by variable text
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            prefix (str): The byte-stable prompt prefix
+            variable_text (str): The per-request part of the prompt
+            cancel_event (threading.Event): Set when the result is no longer needed
+            generation_config (dict): Sampling settings and output token cap
+            timeout (float): Seconds the caller will wait for the answer, None for no limit
+
+        Returns:
+            GenerationResult: The generated text and token accounting
+        """
+        raise NotImplementedError
+
+    def continue_text(self, prompt, partial_text, instruction, generation_config=None):
+        """
+        Ask for only the continuation of a truncated response
+
+        Args:
+            prompt (str): The original prompt
+            partial_text (str): The truncated response text
+            instruction (str): The continuation instruction
+            generation_config (dict): Sampling settings and output token cap
+
+        Returns:
+            str: The continuation text
+        """
+        raise NotImplementedError
+
+    def probe(self, timeout=None):
+        """
+        Make the cheapest possible round trip to the upstream
+
+        Args:
+            timeout (float): Seconds to wait for the answer, None for no limit
+
+        Raises:
+            Exception: If the upstream cannot be reached
+        """
+        raise NotImplementedError
+
+class GeminiProvider(ModelProvider):
+    """
+    Provider backed by a genai.GenerativeModel and a context cache backend.
+
+    With an API key pool, each call runs on the least-loaded healthy key; a
+    call that hits a key's quota is retried once per remaining key.
+    """
+
+    def __init__(self, model, context_cache, name=None, key_pool=None):
+        self.model = model
+        self.context_cache = context_cache
+        self.key_pool = key_pool
+        self.name = name or getattr(model, 'model_name', 'gemini')
+
+    def _call(self, call, charge=True):
+        """Run call(model) on a pooled key, or on the shared model without a pool (charge: see ApiKeyPool.acquire)"""
+        if not self.key_pool:
+            return call(self.model if genai_adapter.SDK_ACCEPTS_TIMEOUT else genai_adapter.timed_model(self.model))
+
+        tried = []
+        while True:
+            api_key = self.key_pool.acquire(exclude=tried, charge=charge)
+            try:
+                result = call(self.key_pool.model(api_key, self.model.model_name))
+            except Exception as e:
+                self.key_pool.release(api_key, e)
+                if not is_quota_error(e) or len(tried) + 1 >= len(self.key_pool):
+                    raise
+                tried.append(api_key)
+                continue
+            self.key_pool.release(api_key)
+            return result
+
+    def _timed(self, call, timeout, charge=True):
+        """Run call(model) with every SDK request bounded by timeout"""
+        if timeout is None:
+            return self._call(lambda model: call(model, {}), charge)
+        timeout = max(timeout, 1.0)
+        if genai_adapter.SDK_ACCEPTS_TIMEOUT:
+            return self._call(lambda model: call(model, {'request_options': {'timeout': timeout}}), charge)
+        # Older SDKs take no per-call options; the model's client passes the timeout to the RPC
+        with genai_adapter.call_timeout(timeout):
+            return self._call(lambda model: call(model, {}), charge)
+
+    def generate(self, endpoint, prefix, variable_text, cancel_event=None, generation_config=None, timeout=None):
+        # The SDK call cannot be interrupted; a cancelled loser finishes in the background,
+        # bounded by the request deadline
+        return self._timed(
+            lambda model, options: self.context_cache.generate(
+                model, prefix, variable_text, generation_config=generation_config, **options
+            ),
+            timeout
+        )
+
+    def continue_text(self, prompt, partial_text, instruction, generation_config=None):
+        response = self._call(lambda model: model.generate_content([
+            {"role": "user", "parts": [prompt]},
+            {"role": "model", "parts": [partial_text]},
+            {"role": "user", "parts": [instruction]}
+        ], generation_config=generation_config))
+        return response.text
+
+    def probe(self, timeout=None):
+        # Token counting is free and goes through the same client and connection as generation,
+        # so it is not counted against the keys' per-minute caps
+        self._timed(lambda model, options: model.count_tokens('ping', **options), timeout, charge=False)
+
+# Minimal valid responses returned by the local stand-in
+LOCAL_RESPONSES = {
+    # /analyze answers in the compact wire format
+    'analyze': {
+        's': 72, 'ats': 80, 'cmp': 70, 'lvl': ['Mid-level', 'Mid-level', ''], 'top': [], 'act': [],
+        'm': {'rel': [75, 80, 70], 'ats': [70, 65], 'cq': [70, 70, 70]},
+        'str': [], 'wk': [], 'imp': [], 'km': [], 'kx': [], 'atr': [], 'sm': [], 'sx': [], 'sa': [],
+        'fb': {}, 'it': [], 'ir': [], 'gap': []
+    },
+    'analyze_overall': {
+        'overall_score': 74,
+        'summary_insights': {'overall_grade': 'B', 'ats_readiness': 80, 'market_competitiveness': 70, 'professional_presentation': 75, 'experience_level': 'Mid-level', 'top_strengths': [], 'priority_improvements': []},
+        'detailed_analysis': {},
+        'section_analysis': {},
+        'strengths': [],
+        'improvement_areas': [],
+        'ats_analysis': {'score': 75, 'strengths': [], 'issues': [], 'recommendations': []},
+        'industry_insights': {'current_trends': [], 'skill_recommendations': [], 'market_positioning': ''},
+        'actionable_recommendations': []
+    },
+    'improve_section': {
+        'improved_text': 'Improved section text.',
+        'improvement_score': 80,
+        'key_improvements': [],
+        'analysis': {'original_strengths': [], 'original_weaknesses': [], 'improvements_made': []},
+        'formatting_suggestions': [],
+        'ats_optimization': {'keyword_density': 70, 'suggested_keywords': [], 'formatting_score': 75},
+        'alternatives': [],
+        'tips': []
+    }
+}
+
+def _local_section_batch(prefix, variable_text):
+    """Answer a section batch with one canned improvement per ITEM marker"""
+    item_ids = [int(item_id) for item_id in re.findall(r'^ITEM (\d+)$', variable_text, re.MULTILINE)]
+    return json.dumps({'items': [dict(LOCAL_RESPONSES['improve_section'], id=item_id) for item_id in item_ids]})
+
+LOCAL_RESPONSES['improve_section_batch'] = _local_section_batch
+
+class LocalProvider(ModelProvider):
+    """
+    Local stand-in for the model backend.
+
+    Returns canned responses per endpoint after an injected latency
+    (base plus uniform jitter, plus a per-output-token cost to mimic
+    generation time) and can fail a fraction of calls. Latency waits on
+    the cancel event, so a cancelled call stops immediately.
+    """
+
+    def __init__(self, name='local', latency=0.0, jitter=0.0, failure_rate=0.0, responses=None, seed=None,
+                 output_token_seconds=0.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.responses = responses or LOCAL_RESPONSES
+        self.output_token_seconds = output_token_seconds
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+            latency = self.latency(self.calls) if callable(self.latency) else self.latency
+            return latency + self._random.uniform(0, self.jitter), self._random.random() < self.failure_rate
+
+    def generate(self, endpoint, prefix, variable_text, cancel_event=None, generation_config=None, timeout=None):
+        response = self.responses.get(endpoint, {})
+        text = response(prefix, variable_text) if callable(response) else json.dumps(response)
+
+        delay, fail = self._delay()
+        delay += estimate_tokens(text) * self.output_token_seconds
+        timed_out = timeout is not None and delay > timeout
+        if timed_out:
+            delay = timeout
+        if delay > 0:
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    raise ProviderCancelled(f"{self.name} call cancelled")
+            else:
+                threading.Event().wait(delay)
+
+        if timed_out:
+            raise TimeoutError(f"{self.name} call timed out after {timeout:.2f}s")
+
+        if fail:
+            raise Exception(f"{self.name}: injected upstream failure")
+
+        return GenerationResult(text, None, 0, estimate_tokens(prefix) + estimate_tokens(variable_text))
+
+    def continue_text(self, prompt, partial_text, instruction, generation_config=None):
+        return ''
+
+    def probe(self, timeout=None):
+        delay, fail = self._delay()
+        if delay > 0:
+            threading.Event().wait(delay if timeout is None else min(delay, timeout))
+        if timeout is not None and delay > timeout:
+            raise TimeoutError(f"{self.name} probe timed out after {timeout:.2f}s")
+        if fail:
+            raise Exception(f"{self.name}: injected upstream failure")
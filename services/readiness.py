@@ -0,0 +1,208 @@
+"""
+Worker warm-up and cached readiness checks
+
+warm_up() runs once per worker before it serves traffic. It builds the model
+clients, parses a tiny PDF and a tiny model response so the libraries' first-use
+costs are paid up front, and runs the deep checks. Deep checks (uploads directory,
+model upstream) are rerun every READINESS_CACHE_SECONDS by a background thread,
+so /readyz and /health only read the latest results however often they are polled.
+"""
+import io
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from config import get_config
+from services import gemini_service
+from utils import pdf_extractor
+from utils.metrics import metrics
+from utils.response_parser import parse_gemini_response
+from utils.sample_pdf import text_pdf
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+WARMUP_PDF = text_pdf(['Jane Doe - Software Engineer - Python, AWS, PostgreSQL'])
+WARMUP_RESPONSE = '```json\n{"score": 1, "skills": ["Python"]}\n```'
+
+def check_uploads_directory(timeout=None):
+    """Create and delete a file in the uploads directory"""
+    path = os.path.join(config.UPLOAD_FOLDER, f'.readiness-{os.getpid()}-{uuid.uuid4().hex[:8]}')
+    with open(path, 'w') as probe_file:
+        probe_file.write('ok')
+    os.remove(path)
+
+def check_model_upstream(timeout=None):
+    """Cheap round trip to the default model tier"""
+    gemini_service.probe_upstream(timeout)
+
+# Floor of the refresh interval, so a zero cache interval does not spin the refresher
+MIN_REFRESH_SECONDS = 1.0
+
+class ReadinessChecker:
+    """
+    Runs deep checks on a background thread, once per cache interval
+
+    Requests only read the latest results and never wait for a check. Each
+    check runs on its own thread with a timeout, and a check that is still
+    hanging from an earlier refresh is reported as failed instead of being
+    started again.
+
+    Args:
+        checks (dict): Check name -> callable taking a timeout and raising on failure
+        cache_seconds (float): Time between refreshes
+        timeout_seconds (float): How long a single check may take
+    """
+
+    def __init__(self, checks, cache_seconds=30, timeout_seconds=5):
+        self.checks = dict(checks)
+        self.cache_seconds = cache_seconds
+        self.timeout_seconds = timeout_seconds
+        self.warmup = None
+        self._results = None
+        self._checked_at = None
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.checks), 1), thread_name_prefix='readiness')
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._refresher = None
+        self._stopped = threading.Event()
+
+    def _run_checks(self):
+        start = time.time()
+        futures = {}
+        for name, check in self.checks.items():
+            pending = self._pending.get(name)
+            if pending is None or pending.done():
+                pending = self._pending[name] = self._executor.submit(check, self.timeout_seconds)
+            futures[name] = pending
+
+        results = {}
+        for name, future in futures.items():
+            check_start = time.time()
+            try:
+                future.result(timeout=max(self.timeout_seconds - (time.time() - start), 0))
+                results[name] = {'status': 'ok'}
+            except FutureTimeoutError:
+                results[name] = {'status': 'error', 'error': f"No answer within {self.timeout_seconds:g}s"}
+            except Exception as e:
+                results[name] = {'status': 'error', 'error': getattr(e, 'message', None) or str(e) or type(e).__name__}
+            results[name]['seconds'] = round(time.time() - check_start, 6)
+            if results[name]['status'] != 'ok':
+                metrics.increment(f'readiness.{name}.failures')
+        return results
+
+    def refresh(self):
+        """Run the deep checks now and keep their results"""
+        with self._refresh_lock:
+            results = self._run_checks()
+            self._results, self._checked_at = results, time.time()
+        metrics.set_gauge('readiness.ready', int(all(result['status'] == 'ok' for result in results.values())))
+
+    def _refresh_loop(self):
+        interval = max(self.cache_seconds, MIN_REFRESH_SECONDS)
+        while not self._stopped.is_set():
+            checked_at = self._checked_at
+            # Results from the warm-up count as the first refresh
+            due = 0 if checked_at is None else interval - (time.time() - checked_at)
+            if due <= 0:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Readiness refresh failed: %s", e)
+                due = interval
+            self._stopped.wait(due)
+
+    def start(self):
+        """Start the background refresher of this process (idempotent)"""
+        with self._start_lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stopped.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name='readiness-refresher', daemon=True)
+            self._refresher.start()
+
+    def stop(self):
+        """Stop the background refresher"""
+        self._stopped.set()
+
+    def results(self):
+        """
+        The latest deep check results, without running any check
+
+        Starts the background refresher on first use. Until its first refresh
+        completes, every check is reported as pending and the worker as not ready.
+
+        Returns:
+            dict: {'ready', 'checked_at', 'age_seconds', 'checks'}
+        """
+        if self._refresher is None:
+            self.start()
+
+        results, checked_at = self._results, self._checked_at
+        if results is None:
+            return {
+                'ready': False,
+                'checked_at': None,
+                'age_seconds': None,
+                'checks': {name: {'status': 'pending'} for name in self.checks}
+            }
+        return {
+            'ready': all(result['status'] == 'ok' for result in results.values()),
+            'checked_at': checked_at,
+            'age_seconds': round(time.time() - checked_at, 3),
+            'checks': results
+        }
+
+# One per worker process; shared by the routes and the gunicorn hooks
+readiness = ReadinessChecker(
+    {'uploads_directory': check_uploads_directory, 'model_upstream': check_model_upstream},
+    cache_seconds=config.READINESS_CACHE_SECONDS,
+    timeout_seconds=config.READINESS_CHECK_TIMEOUT_SECONDS
+)
+
+def warm_up():
+    """
+    Pay the first-request costs of this worker before it serves traffic
+
+    Builds the model clients, extracts a tiny PDF with every installed backend,
+    parses a tiny model response and runs the deep checks, which also makes
+    the first upstream connection, then starts their background refresher.
+    Failures are logged, never raised: a worker that could not warm up still
+    serves, and /readyz reports what is wrong.
+
+    Returns:
+        dict: Seconds per step and the readiness results
+    """
+    steps = {}
+
+    def step(name, action):
+        start = time.time()
+        try:
+            action()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, getattr(e, 'message', None) or e)
+        steps[name] = round(time.time() - start, 6)
+
+    def parse_pdf():
+        reader = pdf_extractor.load_pdf(io.BytesIO(WARMUP_PDF))
+        pdf_extractor.has_text_layer(reader)
+        # Straight to each backend, so the warm-up document is not part of the backend benchmark
+        for backend in pdf_extractor.backend_chain.backends:
+            backend.extract_pages(reader)
+
+    start = time.time()
+    step('model_clients', gemini_service.create_providers)
+    step('pdf', parse_pdf)
+    step('parser', lambda: parse_gemini_response(WARMUP_RESPONSE))
+    step('deep_checks', readiness.refresh)
+    readiness.start()
+    seconds = time.time() - start
+
+    metrics.observe('warmup.seconds', seconds)
+    readiness.warmup = {'completed_at': time.time(), 'seconds': round(seconds, 6), 'steps': steps}
+    logger.info("Worker %d warmed up in %.2fs", os.getpid(), seconds)
+    return {'steps': steps, 'readiness': readiness.results()}
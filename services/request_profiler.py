@@ -0,0 +1,281 @@
+"""
+Opt-in per-request profiling: the pipeline stages of a flagged request run under
+cProfile and the merged profile is kept in a bounded on-disk ring
+"""
+import os
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+# Functions whose subtrees are broken out in every report
+FOCUS_FUNCTIONS = ('extract_text_from_pdf', 'parse_gemini_response')
+
+_current = contextvars.ContextVar('profile_session', default=None)
+
+def current():
+    """The profile session of the request being served, or None"""
+    return _current.get()
+
+def _label(func):
+    """Readable name of a pstats function key (file, line, name)"""
+    filename, line, name = func
+    if filename == '~':
+        return name
+    for marker in ('site-packages' + os.sep, 'lib' + os.sep + 'python'):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    return f"{filename}:{line}({name})"
+
+def _row(stats, func):
+    calls, _, self_seconds, cumulative_seconds, _ = stats.stats[func]
+    return {
+        'function': _label(func),
+        'calls': calls,
+        'self_seconds': round(self_seconds, 6),
+        'cumulative_seconds': round(cumulative_seconds, 6)
+    }
+
+class ProfileSession:
+    """
+    Profiles collected for one request, one per pipeline stage
+
+    Args:
+        endpoint (str): Name of the profiled endpoint
+    """
+
+    def __init__(self, endpoint):
+        self.started = time.time()
+        # Sortable by creation time down to the microsecond, unique across workers
+        self.id = (f"prf{time.strftime('%Y%m%d%H%M%S', time.gmtime(self.started))}"
+                   f"{int(self.started * 1e6) % 1000000:06d}{uuid.uuid4().hex[:6]}")
+        self.endpoint = endpoint
+        self.stages = []
+        self._roots = []
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def activate(self):
+        """Make this the current session; returns the token for deactivate()"""
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        """Restore the session that was current before activate()"""
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(None)
+
+    def add(self, stage, profiler, seconds, error=None):
+        """Record a finished stage and its profiler"""
+        code = getattr(stage.func, '__code__', None)
+        with self._lock:
+            self.stages.append({'stage': stage.name, 'seconds': round(seconds, 6), 'error': error is not None})
+            self._profiles.append(profiler)
+            if code is not None:
+                self._roots.append((code.co_filename, code.co_firstlineno, code.co_name))
+
+    def stats(self):
+        """Merge the stage profiles; None if no stage ran"""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        stats.calc_callees()
+        return stats
+
+    def _call_tree(self, stats, max_depth=8, min_share=0.01):
+        """Indented call tree below each stage function, edges weighted by cumulative time"""
+        lines = []
+
+        def walk(func, seconds, calls, depth, path, total):
+            lines.append(f"{'  ' * depth}{seconds * 1000:9.2f} ms {calls:>6}x  {_label(func)}")
+            if depth >= max_depth:
+                return
+            callees = stats.all_callees.get(func, {})
+            for callee, (_, edge_calls, _, edge_seconds) in sorted(callees.items(), key=lambda item: -item[1][3]):
+                if callee in path or edge_seconds < max(total * min_share, 0.0005):
+                    continue
+                walk(callee, edge_seconds, edge_calls, depth + 1, path | {callee}, total)
+
+        for root in dict.fromkeys(self._roots):
+            if root in stats.stats:
+                calls, _, _, cumulative, _ = stats.stats[root]
+                walk(root, cumulative, calls, 0, {root}, cumulative)
+        return '\n'.join(lines)
+
+    def _focus(self, stats, name, top):
+        """The function and the descendants with the most self time"""
+        entries = [func for func in stats.stats if func[2] == name]
+        if not entries:
+            return None
+        seen = set(entries)
+        queue = list(entries)
+        while queue:
+            for callee in stats.all_callees.get(queue.pop(), {}):
+                if callee not in seen:
+                    seen.add(callee)
+                    queue.append(callee)
+        descendants = sorted(seen - set(entries), key=lambda func: -stats.stats[func][2])
+        return {
+            'totals': [_row(stats, func) for func in entries],
+            'top_functions': [_row(stats, func) for func in descendants[:top]]
+        }
+
+    def report(self, status_code, stats, top=30):
+        """
+        Summarise the profile
+
+        Args:
+            status_code (int): Status of the profiled response
+            stats (pstats.Stats): The merged profile
+            top (int): Functions to list
+
+        Returns:
+            dict: JSON-serialisable report
+        """
+        report = {
+            'id': self.id,
+            'endpoint': self.endpoint,
+            'created': self.started,
+            'wall_seconds': round(time.time() - self.started, 6),
+            'status_code': status_code,
+            'stages': self.stages
+        }
+        if stats is None:
+            return report
+        ordered = sorted(stats.stats, key=lambda func: -stats.stats[func][3])
+        report['top_functions'] = [_row(stats, func) for func in ordered[:top]]
+        report['focus'] = {name: self._focus(stats, name, top // 2) for name in FOCUS_FUNCTIONS}
+        report['call_tree'] = self._call_tree(stats)
+        return report
+
+class ProfilingHook:
+    """
+    Pipeline hook that profiles each stage when the request has a profile session
+
+    Without a session the only cost is one context variable lookup per stage.
+    Each stage gets its own profiler on the thread it runs on, so stages
+    running side by side are all captured.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def before_stage(self, pipeline, stage, context):
+        if _current.get() is None:
+            return
+        profiler = cProfile.Profile()
+        self._local.profiler = (profiler, time.time())
+        profiler.enable()
+
+    def after_stage(self, pipeline, stage, context, seconds, error=None, cache_hit=None):
+        running = getattr(self._local, 'profiler', None)
+        if running is None:
+            return
+        self._local.profiler = None
+        profiler, started = running
+        profiler.disable()
+        session = _current.get()
+        if session is not None:
+            session.add(stage, profiler, time.time() - started, error)
+
+class ProfileRing:
+    """
+    The most recent profiles on disk, shared by all workers
+
+    Each profile is stored as <id>.json (the report) and <id>.prof (pstats
+    data for snakeviz or `python -m pstats`); the oldest are deleted beyond
+    max_entries.
+    """
+
+    def __init__(self, directory, max_entries=50):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id, extension):
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, session, status_code):
+        """
+        Store a finished session
+
+        Returns:
+            dict: The report, or None if it could not be stored
+        """
+        stats = session.stats()
+        report = session.report(status_code, stats)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if stats is not None:
+                stats.dump_stats(self._path(session.id, 'prof'))
+            tmp_path = self._path(session.id, f'{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f)
+            os.replace(tmp_path, self._path(session.id, 'json'))
+        except OSError as e:
+            logger.warning("Could not store profile %s: %s", session.id, e)
+            return None
+        self._prune()
+        return report
+
+    def _prune(self):
+        with self._lock:
+            try:
+                names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+            except OSError:
+                return
+            excess = len(names) - self.max_entries
+            # Ids start with their creation time, so name order is age order
+            for name in sorted(names)[:max(excess, 0)]:
+                profile_id = name[:-len('.json')]
+                for extension in ('json', 'prof'):
+                    try:
+                        os.remove(self._path(profile_id, extension))
+                    except OSError:
+                        pass
+
+    def list(self):
+        """Summaries of the stored profiles, newest first"""
+        try:
+            names = sorted((name for name in os.listdir(self.directory) if name.endswith('.json')), reverse=True)
+        except OSError:
+            return []
+        summaries = []
+        for name in names:
+            report = self.get(name[:-len('.json')])
+            if report is not None:
+                summaries.append({key: report.get(key) for key in
+                                  ('id', 'endpoint', 'created', 'wall_seconds', 'status_code')})
+        return summaries
+
+    def get(self, profile_id):
+        """The stored report of a profile, or None"""
+        if not profile_id.isalnum():
+            return None
+        try:
+            with open(self._path(profile_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def pstats_path(self, profile_id):
+        """Path of the pstats file of a profile, or None"""
+        if not profile_id.isalnum():
+            return None
+        path = self._path(profile_id, 'prof')
+        return path if os.path.exists(path) else None
@@ -0,0 +1,48 @@
+"""
+Storage of analysis results keyed by the hash of their content
+"""
+import os
+import json
+
+from config import get_config
+from utils.content_store import ContentStore, content_hash
+
+config = get_config()
+
+ID_PREFIX = 'res'
+ID_HASH_LENGTH = 32
+
+_store = ContentStore(
+    max_entries=config.RESULT_CACHE_SIZE,
+    directory=os.path.join(config.UPLOAD_FOLDER, 'results'),
+    max_files=config.CONTENT_STORE_MAX_FILES
+)
+
+def save_result(result):
+    """
+    Store an analysis result under its content hash
+
+    Args:
+        result (dict): The analysis result
+
+    Returns:
+        str: The result id, also usable as a strong ETag
+    """
+    canonical = json.dumps(result, sort_keys=True, separators=(',', ':'))
+    result_id = f"{ID_PREFIX}{content_hash(canonical)[:ID_HASH_LENGTH]}"
+    _store.put(result_id, result)
+    return result_id
+
+def get_result(result_id):
+    """
+    Look up a stored analysis result
+
+    Args:
+        result_id (str): The result id
+
+    Returns:
+        dict: The stored result or None if it is unknown
+    """
+    if not result_id or not result_id.startswith(ID_PREFIX):
+        return None
+    return _store.get(result_id)
@@ -0,0 +1,15 @@
+"""
+Shared test setup: the app runs against the local model stand-in with no
+injected latency, and the project root is importable
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before any app module reads its configuration
+os.environ.setdefault('MODEL_PROVIDER', 'local')
+os.environ.setdefault('LOCAL_MODEL_LATENCY_SECONDS', '0')
+os.environ.setdefault('LOCAL_MODEL_JITTER_SECONDS', '0')
+os.environ.setdefault('STAGE_CACHE_ENABLED', '0')
+os.environ.setdefault('WARMUP_ENABLED', '0')
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from services.concurrency_limiter import AdaptiveConcurrencyLimiter
+from utils.errors import TooManyRequestsError, DeadlineExceededError
+
+def limiter(**kwargs):
+    return AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_limit=1, **kwargs)
+
+def test_full_queue_is_rejected_immediately():
+    busy = limiter(max_queue=1, queue_timeout=5)
+    busy.acquire('analyze')
+    waiter = threading.Thread(target=lambda: busy.acquire('analyze'))
+    waiter.start()
+    for _ in range(100):
+        if busy.queued:
+            break
+        threading.Event().wait(0.01)
+
+    with pytest.raises(TooManyRequestsError):
+        busy.acquire('analyze')
+
+    busy.release('analyze', 0.1)
+    waiter.join(timeout=5)
+    assert busy.in_flight == 1 and busy.queued == 0
+
+def test_abandoned_call_keeps_its_slot_until_it_finishes_upstream():
+    busy = limiter()
+    upstream = Future()
+    with pytest.raises(DeadlineExceededError):
+        with busy.slot('analyze') as slot:
+            slot.hold_until(upstream)
+            raise DeadlineExceededError("Request deadline exceeded")
+
+    # The request is gone, but its upstream call still runs
+    assert busy.in_flight == 1
+    assert not busy.try_acquire('analyze')
+
+    upstream.set_result(None)
+    assert busy.in_flight == 0
+    assert busy.limit == 1
+
+def test_finished_call_releases_on_exit():
+    busy = limiter()
+    upstream = Future()
+    upstream.set_result(None)
+    with busy.slot('analyze') as slot:
+        slot.hold_until(upstream)
+    assert busy.in_flight == 0
@@ -0,0 +1,51 @@
+import types
+
+import google.generativeai as genai
+import pytest
+
+from services import genai_adapter
+from services.context_cache import GeminiContextCache
+from tests.test_genai_adapter import RecordingClient
+
+PREFIX = 'instructions ' * 2000
+
+@pytest.fixture
+def caching(monkeypatch):
+    """A stand-in for the caching module of newer SDKs"""
+    created = []
+
+    def create(model, contents, ttl):
+        created.append(model)
+        return types.SimpleNamespace(model=model)
+
+    monkeypatch.setattr(genai, 'caching', types.SimpleNamespace(CachedContent=types.SimpleNamespace(create=create)),
+                        raising=False)
+    monkeypatch.setattr(genai.GenerativeModel, 'from_cached_content',
+                        classmethod(lambda cls, cached_content: cls(cached_content.model)), raising=False)
+    return created
+
+def pooled_model(api_key):
+    return genai_adapter.bind_client(genai.GenerativeModel('gemini-pro'), RecordingClient(), api_key)
+
+def test_cached_model_uses_the_pooled_client(caching):
+    cache = GeminiContextCache(api_key='configured-key')
+    model = pooled_model('configured-key')
+
+    first = cache.generate(model, PREFIX, 'resume')
+    second = cache.generate(model, PREFIX, 'resume')
+
+    assert caching == ['models/gemini-pro']
+    assert (first.cache_hit, second.cache_hit) == (False, True)
+    # Both generations went through the pooled key's own client
+    assert len(genai_adapter.client_of(model).wrapped.calls) == 2
+
+def test_other_pooled_keys_send_the_full_prompt(caching):
+    cache = GeminiContextCache(api_key='configured-key')
+    cache.generate(pooled_model('configured-key'), PREFIX, 'resume')
+    other = pooled_model('other-key')
+
+    result = cache.generate(other, PREFIX, 'resume')
+
+    assert caching == ['models/gemini-pro']
+    assert result.cache_hit is False
+    assert len(genai_adapter.client_of(other).wrapped.calls) == 1
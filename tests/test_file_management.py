@@ -0,0 +1,52 @@
+import os
+
+from utils import file_management
+from utils.content_store import ContentStore
+
+def write(directory, name, size, last_used):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (last_used, last_used))
+    return path
+
+def test_quota_evicts_least_recently_used_first(tmp_path):
+    oldest = write(tmp_path, 'a', 100, 1000)
+    middle = write(tmp_path, 'b', 100, 2000)
+    newest = write(tmp_path, 'c', 100, 3000)
+
+    assert file_management.cleanup_old_files(str(tmp_path), max_age_hours=10 ** 6, max_total_bytes=150) == 2
+    assert not os.path.exists(oldest) and not os.path.exists(middle) and os.path.exists(newest)
+
+def test_failed_removal_does_not_count_as_freed(tmp_path, monkeypatch):
+    stuck = write(tmp_path, 'a', 100, 1000)
+    middle = write(tmp_path, 'b', 100, 2000)
+    newest = write(tmp_path, 'c', 100, 3000)
+    remove = file_management._remove
+    monkeypatch.setattr(file_management, '_remove', lambda path: False if path == stuck else remove(path))
+
+    # The stuck file stays on disk, so the sweep goes on until the others fit
+    assert file_management.cleanup_old_files(str(tmp_path), max_age_hours=10 ** 6, max_total_bytes=150) == 2
+    assert os.path.exists(stuck) and not os.path.exists(middle) and not os.path.exists(newest)
+
+def test_store_directories_are_left_to_their_stores(tmp_path):
+    store = tmp_path / 'results'
+    store.mkdir()
+    kept = write(str(store), 'res1.json', 100, 1000)
+    upload = write(str(tmp_path), 'upload.pdf', 100, 1000)
+
+    assert file_management.cleanup_old_files(str(tmp_path), max_age_hours=1, max_total_bytes=0, skip_dirs={'results'}) == 1
+    assert os.path.exists(kept) and not os.path.exists(upload)
+
+def test_content_store_keeps_recently_used_files(tmp_path):
+    store = ContentStore(max_entries=10, directory=str(tmp_path), max_files=2)
+    store.put('a', {'n': 1})
+    store.put('b', {'n': 2})
+    for key, last_used in (('a', 1000), ('b', 2000)):
+        os.utime(tmp_path / f'{key}.json', (last_used, last_used))
+
+    # A memory hit marks the file as used, so 'b' is the least recently used
+    assert store.get('a') == {'n': 1}
+    store.put('c', {'n': 3})
+
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json']
@@ -0,0 +1,92 @@
+import google.generativeai as genai
+import pytest
+from google.ai import generativelanguage as glm
+
+from services import genai_adapter
+from services.context_cache import ContextCache
+from services.providers import GeminiProvider
+
+class RecordingClient:
+    """Generative service client that records the keyword arguments of each RPC"""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, request, **kwargs):
+        self.calls.append(('generate_content', kwargs))
+        return glm.GenerateContentResponse(candidates=[
+            glm.Candidate(content=glm.Content(parts=[glm.Part(text='{"ok": true}')], role='model'))
+        ])
+
+    def count_tokens(self, request, **kwargs):
+        self.calls.append(('count_tokens', kwargs))
+        return glm.CountTokensResponse(total_tokens=1)
+
+def provider(client):
+    model = genai_adapter.bind_client(genai.GenerativeModel('gemini-pro'), client)
+    return GeminiProvider(model, ContextCache())
+
+def test_deadline_reaches_the_rpc():
+    client = RecordingClient()
+    result = provider(client).generate('analyze', 'prefix ', 'text', timeout=7.5)
+    assert result.text == '{"ok": true}'
+    (method, kwargs), = client.calls
+    assert method == 'generate_content' and kwargs['timeout'] == 7.5
+
+def test_probe_timeout_reaches_the_rpc():
+    client = RecordingClient()
+    provider(client).probe(timeout=2)
+    (method, kwargs), = client.calls
+    assert method == 'count_tokens' and kwargs['timeout'] == 2
+
+def test_no_timeout_leaves_the_sdk_default():
+    client = RecordingClient()
+    provider(client).generate('analyze', 'prefix ', 'text')
+    assert client.calls == [('generate_content', {})]
+
+def test_timeout_applies_only_inside_its_scope():
+    client = genai_adapter.TimeoutClient(RecordingClient())
+    with genai_adapter.call_timeout(3):
+        client.count_tokens(None)
+    client.count_tokens(None)
+    (_, scoped), (_, unscoped) = client.wrapped.calls
+    # The SDK's default retry would otherwise keep going for 60 seconds
+    assert scoped['timeout'] == 3 and scoped['retry'].timeout == 3
+    assert unscoped == {}
+
+# The tests below pin the SDK internals the adapter relies on to the installed release
+
+def test_keyed_clients_carry_their_own_key():
+    first, second = genai_adapter.make_keyed_client('key-one'), genai_adapter.make_keyed_client('key-two')
+    assert isinstance(first, glm.GenerativeServiceClient)
+    assert first._transport._credentials.token == 'key-one'
+    assert second._transport._credentials.token == 'key-two'
+
+def test_models_keep_their_client_where_the_adapter_expects():
+    model = genai.GenerativeModel('gemini-pro')
+    assert hasattr(model, '_client')
+    client = RecordingClient()
+    genai_adapter.bind_client(model, client, 'key-one')
+    assert genai_adapter.client_of(model).wrapped is client
+    assert genai_adapter.api_key_of(model) == 'key-one'
+    # generate_content and count_tokens go through the bound client
+    model.generate_content('hello')
+    model.count_tokens('hello')
+    assert [method for method, _ in client.calls] == ['generate_content', 'count_tokens']
+
+def test_pooled_models_use_their_key_client():
+    from services.key_pool import ApiKeyPool
+    pool = ApiKeyPool(['key-one', 'key-two'])
+    first, second = pool.keys
+    model = pool.model(first, 'gemini-pro')
+    assert pool.model(first, 'gemini-pro') is model
+    assert genai_adapter.client_of(model).wrapped._transport._credentials.token == 'key-one'
+    assert genai_adapter.api_key_of(pool.model(second, 'gemini-pro')) == 'key-two'
+
+def test_missing_internals_fail_loudly(monkeypatch):
+    from google.generativeai import client as genai_client
+    monkeypatch.delattr(genai_client, '_ClientManager')
+    with pytest.raises(RuntimeError, match='genai_adapter'):
+        genai_adapter.make_keyed_client('key-one')
+    with pytest.raises(RuntimeError, match='genai_adapter'):
+        genai_adapter.bind_client(object(), RecordingClient())
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from services.hedging import HedgedExecutor
+from services.providers import LocalProvider, ProviderCancelled
+from utils.errors import TooManyRequestsError
+
+def call(provider, seen):
+    def run(cancel_event):
+        try:
+            result = provider.generate('improve_section', 'prefix', 'text', cancel_event=cancel_event)
+            seen.append((provider.name, 'finished'))
+            return provider.name, result
+        except ProviderCancelled:
+            seen.append((provider.name, 'cancelled'))
+            raise
+    return run
+
+def warmed_up(latency=0.01, budget=1.0):
+    """An executor that has learned a hedge delay of `latency` for the endpoint"""
+    executor = HedgedExecutor({'improve_section': budget}, percentile=95, min_samples=5)
+    # Enough samples that the few calls of a test do not move the percentile
+    for _ in range(100):
+        executor._record('improve_section', latency)
+    return executor
+
+def wait_for(seen, count):
+    for _ in range(200):
+        if len(seen) >= count:
+            return
+        threading.Event().wait(0.01)
+
+def test_no_hedge_until_enough_latencies_are_observed():
+    executor = HedgedExecutor({'improve_section': 1.0}, min_samples=5)
+    primary, hedge = LocalProvider('primary'), LocalProvider('hedge')
+    seen = []
+    assert executor.run('improve_section', call(primary, seen), call(hedge, seen))[0] == 'primary'
+    assert hedge.calls == 0
+
+def test_fast_primary_is_not_hedged():
+    executor = warmed_up(latency=1.0)
+    primary, hedge = LocalProvider('primary'), LocalProvider('hedge')
+    seen = []
+    assert executor.run('improve_section', call(primary, seen), call(hedge, seen))[0] == 'primary'
+    assert hedge.calls == 0
+
+def test_hedge_wins_and_the_slow_primary_is_cancelled():
+    executor = warmed_up()
+    primary, hedge = LocalProvider('primary', latency=5), LocalProvider('hedge')
+    seen = []
+    assert executor.run('improve_section', call(primary, seen), call(hedge, seen))[0] == 'hedge'
+    wait_for(seen, 2)
+    assert seen == [('hedge', 'finished'), ('primary', 'cancelled')]
+
+def test_primary_wins_and_the_hedge_is_cancelled():
+    executor = warmed_up()
+    primary, hedge = LocalProvider('primary', latency=0.2), LocalProvider('hedge', latency=5)
+    seen = []
+    assert executor.run('improve_section', call(primary, seen), call(hedge, seen))[0] == 'primary'
+    wait_for(seen, 2)
+    assert seen == [('primary', 'finished'), ('hedge', 'cancelled')]
+
+def test_failed_hedge_falls_back_to_the_primary():
+    executor = warmed_up()
+    primary, hedge = LocalProvider('primary', latency=0.2), LocalProvider('hedge', failure_rate=1.0)
+    assert executor.run('improve_section', call(primary, []), call(hedge, []))[0] == 'primary'
+
+def test_error_is_raised_when_both_calls_fail():
+    executor = warmed_up()
+    primary = LocalProvider('primary', latency=0.1, failure_rate=1.0)
+    hedge = LocalProvider('hedge', latency=0.2, failure_rate=1.0)
+    with pytest.raises(Exception, match='injected upstream failure'):
+        executor.run('improve_section', call(primary, []), call(hedge, []))
+
+def test_hedges_stay_within_the_budget():
+    executor = warmed_up(budget=0.5)
+    primary, hedge = LocalProvider('primary', latency=0.1), LocalProvider('hedge', latency=5)
+    # The budget admits a hedge once hedges stay within half of the requests: the 2nd and the 4th
+    for _ in range(4):
+        executor.run('improve_section', call(primary, []), call(hedge, []))
+    assert hedge.calls == 2
+
+def test_hedge_is_skipped_without_spare_capacity():
+    executor = warmed_up()
+    primary, hedge = LocalProvider('primary', latency=0.05), LocalProvider('hedge')
+    result = executor.run('improve_section', call(primary, []), call(hedge, []), reserve_hedge=lambda: False)
+    assert result[0] == 'primary' and hedge.calls == 0
+
+def test_calls_are_rejected_when_every_upstream_thread_is_busy():
+    executor = HedgedExecutor({'improve_section': 1.0}, max_workers=1, max_queue=0)
+    started, stuck = threading.Event(), threading.Event()
+    worker = threading.Thread(target=lambda: executor.run(
+        'improve_section', lambda cancel_event: started.set() or stuck.wait(5)
+    ))
+    worker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(TooManyRequestsError):
+            executor.run('improve_section', lambda cancel_event: 'late')
+    finally:
+        stuck.set()
+        worker.join(timeout=5)
+    assert executor.run('improve_section', lambda cancel_event: 'done') == 'done'
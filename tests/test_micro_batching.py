@@ -0,0 +1,75 @@
+import re
+import threading
+
+from services import gemini_service
+from services.providers import LocalProvider
+
+# Top-level keys of the section improvement schema the prompts ask for
+SECTION_FIELDS = re.findall(r'^  "(\w+)"', gemini_service.IMPROVE_SECTION_OUTPUT_SCHEMA, re.M)
+
+SECTION = {
+    'improved_text': 'Improved',
+    'improvement_score': 82,
+    'key_improvements': ['Stronger verbs'],
+    'analysis': {
+        'original_strengths': ['Clear scope'],
+        'original_weaknesses': ['No metrics'],
+        'improvements_made': [{'category': 'Impact', 'change': 'Added metrics', 'reason': 'Shows results'}]
+    },
+    'formatting_suggestions': ['Lead with the outcome'],
+    'ats_optimization': {'keyword_density': 70, 'suggested_keywords': ['Python'], 'formatting_score': 80},
+    'alternatives': [{'version': 'Professional Version', 'text': 'Improved, formally'}],
+    'tips': ['Quantify results']
+}
+
+def section(improved_text):
+    return dict(SECTION, improved_text=improved_text)
+
+def test_fixture_has_every_schema_field():
+    assert list(SECTION) == SECTION_FIELDS
+
+def test_single_threaded_worker_skips_the_batch_window(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(gemini_service.config, 'IMPROVE_SECTION_BATCHING', True)
+    monkeypatch.setattr(gemini_service.config, 'WORKER_THREADS', 1)
+    monkeypatch.setattr(gemini_service.section_batcher, 'submit', submitted.append)
+    monkeypatch.setattr(gemini_service, '_generate', lambda *args, **kwargs: SECTION)
+
+    assert gemini_service.improve_resume_section_with_gemini('summary', 'Did things') == SECTION
+    assert submitted == []
+
+def test_threaded_worker_batches_concurrent_sections(monkeypatch):
+    batches = []
+    batcher = gemini_service.MicroBatcher(
+        'test', lambda items: batches.append(list(items)) or [SECTION] * len(items),
+        window_seconds=5, max_batch_size=2
+    )
+    monkeypatch.setattr(gemini_service.config, 'IMPROVE_SECTION_BATCHING', True)
+    monkeypatch.setattr(gemini_service.config, 'WORKER_THREADS', 8)
+    monkeypatch.setattr(gemini_service, 'section_batcher', batcher)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda text=text: results.append(gemini_service.improve_resume_section_with_gemini('summary', text)))
+        for text in ('First', 'Second')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    # A full batch goes out at once, without waiting for the 5 second window
+    assert results == [SECTION, SECTION]
+    assert len(batches) == 1 and sorted(text for _, text in batches[0]) == ['First', 'Second']
+
+def test_batch_output_is_split_back_to_its_items(monkeypatch):
+    items = [dict(section('Second improved'), id=2), dict(section(''), id=3), dict(section('First improved'), id=1)]
+    provider = LocalProvider(responses={'improve_section_batch': {'items': items}})
+    monkeypatch.setattr(gemini_service, 'get_provider', lambda tier, hedge=False: provider)
+    monkeypatch.setattr(gemini_service.config, 'HEDGE_ENABLED', False)
+
+    results = gemini_service._improve_sections_batch([('summary', 'First'), ('skills', 'Second'), ('projects', 'Third')])
+
+    # Answers come back in input order without their ids; an item without rewritten text falls back
+    assert results == [section('First improved'), section('Second improved'), None]
+    assert provider.calls == 1
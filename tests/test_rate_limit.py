@@ -0,0 +1,81 @@
+import pytest
+from flask import Flask, request
+
+from utils.errors import TooManyRequestsError
+from utils.rate_limit import (
+    SlidingWindowRateLimiter, MemoryRateLimitStore, RedisRateLimitStore, LocalRedisStandIn,
+    client_identity, hash_api_key
+)
+
+app = Flask(__name__)
+
+def identity(headers, remote_addr='10.0.0.1', api_keys=frozenset(), proxy_hops=1):
+    with app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': remote_addr}):
+        return client_identity(request, api_keys, proxy_hops)
+
+def test_issued_api_key_identifies_the_client():
+    issued = frozenset({hash_api_key('issued-key')})
+    assert identity({'X-API-Key': 'issued-key'}, api_keys=issued) == 'key:' + hash_api_key('issued-key')
+
+def test_unknown_api_key_falls_back_to_the_address():
+    issued = frozenset({hash_api_key('issued-key')})
+    assert identity({'X-API-Key': 'made-up', 'X-Forwarded-For': '203.0.113.9'}, api_keys=issued) == 'ip:203.0.113.9'
+    assert identity({'X-API-Key': 'another'}, api_keys=issued) == identity({'X-API-Key': 'third'}, api_keys=issued)
+
+def test_client_written_forwarded_entries_are_ignored():
+    # The trusted proxy appends the real address after whatever the client sent
+    assert identity({'X-Forwarded-For': '1.1.1.1, 203.0.113.9'}) == 'ip:203.0.113.9'
+    assert identity({'X-Forwarded-For': '2.2.2.2, 203.0.113.9'}) == 'ip:203.0.113.9'
+    assert identity({'X-Forwarded-For': '1.1.1.1, 203.0.113.9, 10.1.1.1'}, proxy_hops=2) == 'ip:203.0.113.9'
+
+def test_forwarded_header_is_ignored_without_trusted_proxies():
+    assert identity({'X-Forwarded-For': '1.1.1.1'}, proxy_hops=0) == 'ip:10.0.0.1'
+    assert identity({'X-Forwarded-For': '1.1.1.1'}, proxy_hops=2) == 'ip:10.0.0.1'
+
+@pytest.fixture(params=['memory', 'local-redis'])
+def store(request):
+    return MemoryRateLimitStore() if request.param == 'memory' else RedisRateLimitStore(LocalRedisStandIn())
+
+def test_request_quota(store, monkeypatch):
+    monkeypatch.setattr('utils.rate_limit.time.time', lambda: 600.0)
+    limiter = SlidingWindowRateLimiter(store, window_seconds=60, max_requests=3, max_tokens=10 ** 6)
+    for _ in range(3):
+        limiter.check('ip:a')
+    with pytest.raises(TooManyRequestsError) as error:
+        limiter.check('ip:a')
+    assert error.value.retry_after == 60
+    # Other clients have their own counters, and rejected requests are not counted
+    limiter.check('ip:b')
+    assert store.get_many(['rl:req:ip:a:10'])[0] == 3
+
+def test_token_quota(store, monkeypatch):
+    monkeypatch.setattr('utils.rate_limit.time.time', lambda: 600.0)
+    limiter = SlidingWindowRateLimiter(store, window_seconds=60, max_requests=100, max_tokens=1000)
+    limiter.check('ip:a', estimated_tokens=600)
+    with pytest.raises(TooManyRequestsError):
+        limiter.check('ip:a', estimated_tokens=600)
+    limiter.check('ip:a', estimated_tokens=400)
+
+def test_previous_window_is_weighted_by_its_overlap(store, monkeypatch):
+    now = [600.0]
+    monkeypatch.setattr('utils.rate_limit.time.time', lambda: now[0])
+    limiter = SlidingWindowRateLimiter(store, window_seconds=60, max_requests=4, max_tokens=10 ** 6)
+    for _ in range(4):
+        limiter.check('ip:a')
+    # Halfway through the next window half of the previous count still applies: 2 + 2 = 4
+    now[0] = 690.0
+    limiter.check('ip:a')
+    limiter.check('ip:a')
+    with pytest.raises(TooManyRequestsError) as error:
+        limiter.check('ip:a')
+    assert error.value.retry_after == 30
+
+def test_browser_clients_may_send_an_api_key():
+    from app import create_app
+    client = create_app().test_client()
+    response = client.options('/analyze', headers={
+        'Origin': 'http://localhost:5173',
+        'Access-Control-Request-Method': 'POST',
+        'Access-Control-Request-Headers': 'X-API-Key'
+    })
+    assert 'x-api-key' in response.headers.get('Access-Control-Allow-Headers', '').lower()
@@ -0,0 +1,131 @@
+import threading
+
+from services import readiness as readiness_module
+from services.key_pool import ApiKeyPool
+from services.providers import GeminiProvider
+from services.readiness import ReadinessChecker
+
+class Check:
+    """A check whose outcome the test switches: ok, failing or hanging"""
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, timeout):
+        self.calls += 1
+        self.release.wait()
+        if self.error:
+            raise self.error
+
+def checker(check, **kwargs):
+    return ReadinessChecker({'upstream': check, 'disk': lambda timeout: None}, **kwargs)
+
+def test_ready_when_every_check_passes():
+    readiness = checker(Check())
+    readiness.refresh()
+    results = readiness.results()
+    assert results['ready'] is True
+    assert {name: result['status'] for name, result in results['checks'].items()} == {'upstream': 'ok', 'disk': 'ok'}
+
+def test_requests_never_wait_for_a_check():
+    check = Check()
+    check.release.clear()
+    readiness = checker(check, cache_seconds=60)
+    try:
+        # The first read starts the refresher and answers at once, before any check is done
+        results = readiness.results()
+        assert results['ready'] is False
+        assert results['checks']['upstream'] == {'status': 'pending'}
+    finally:
+        check.release.set()
+        readiness.stop()
+
+def test_results_are_refreshed_in_the_background(monkeypatch):
+    monkeypatch.setattr(readiness_module, 'MIN_REFRESH_SECONDS', 0.01)
+    check = Check()
+    readiness = checker(check, cache_seconds=0.01)
+    readiness.refresh()
+    check.error = RuntimeError('upstream down')
+    try:
+        # Reads return the cached results; only the refresher runs the checks again
+        for _ in range(200):
+            if not readiness.results()['ready']:
+                break
+            threading.Event().wait(0.01)
+        assert readiness.results()['checks']['upstream']['error'] == 'upstream down'
+    finally:
+        readiness.stop()
+
+def test_results_are_reused_until_refreshed():
+    check = Check()
+    readiness = checker(check, cache_seconds=60)
+    readiness.refresh()
+    readiness.stop()
+    check.error = RuntimeError('upstream down')
+    assert readiness.results()['ready'] is True
+    assert check.calls == 1
+
+def test_failure_and_recovery():
+    check = Check()
+    readiness = checker(check, cache_seconds=0)
+    readiness.refresh()
+    assert readiness.results()['ready'] is True
+
+    check.error = RuntimeError('upstream down')
+    readiness.refresh()
+    results = readiness.results()
+    assert results['ready'] is False
+    assert results['checks']['upstream']['status'] == 'error'
+    assert results['checks']['upstream']['error'] == 'upstream down'
+    assert results['checks']['disk']['status'] == 'ok'
+
+    check.error = None
+    readiness.refresh()
+    assert readiness.results()['ready'] is True
+
+def test_hanging_check_times_out_and_is_not_started_again():
+    check = Check()
+    check.release.clear()
+    readiness = checker(check, cache_seconds=0, timeout_seconds=0.05)
+    try:
+        readiness.refresh()
+        first = readiness.results()
+        assert first['ready'] is False
+        assert 'No answer within' in first['checks']['upstream']['error']
+        readiness.refresh()
+        assert readiness.results()['ready'] is False
+        assert check.calls == 1
+    finally:
+        check.release.set()
+
+    # Once the hanging call returns, the next refresh starts a new one
+    for _ in range(100):
+        readiness.refresh()
+        if check.calls >= 2:
+            break
+        threading.Event().wait(0.01)
+    assert readiness.results()['ready'] is True
+    assert check.calls >= 2
+
+class CountingModel:
+    """Stand-in for genai.GenerativeModel that only counts tokens"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._client = None
+
+    def count_tokens(self, contents, **kwargs):
+        return {'total_tokens': 1}
+
+def test_upstream_probe_is_not_counted_against_the_key_rate_cap():
+    pool = ApiKeyPool(['key'], requests_per_minute=1, client_factory=lambda key: object(), model_factory=CountingModel)
+    provider = GeminiProvider(CountingModel('gemini-pro'), context_cache=None, key_pool=pool)
+
+    for _ in range(3):
+        provider.probe(timeout=1)
+
+    # The key's one call per minute is still free for a real request
+    pool.release(pool.acquire())
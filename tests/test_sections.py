@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from services import gemini_service
+from services.providers import LocalProvider
+from utils.response_parser import parse_gemini_response, expand_compact_analysis, validate_and_fix_data
+
+
+SECTIONS = ['score', 'skills_analysis', 'ats_analysis']
+
+# Full-format output for a request that left out summary_insights
+FULL_OUTPUT = {
+    'score': 81,
+    'ats_analysis': {
+        'score': 77,
+        'keyword_match': {'percentage': 50, 'matches': ['Python'], 'missing': ['AWS']},
+        'recommendations': ['Add AWS']
+    },
+    'skills_analysis': {'matching_skills': ['Python'], 'missing_skills': ['AWS'], 'additional_skills': ['Go']}
+}
+
+def truncated(output, before):
+    """JSON text of the output cut off just before one of its keys"""
+    text = json.dumps(output)
+    return text[:text.index(f'"{before}"')]
+
+def test_full_output_without_summary_insights_is_not_expanded():
+    parsed = parse_gemini_response(
+        json.dumps(FULL_OUTPUT),
+        lambda data: validate_and_fix_data(data, SECTIONS),
+        lambda data: validate_and_fix_data(expand_compact_analysis(data, SECTIONS), SECTIONS)
+    )
+    assert parsed == FULL_OUTPUT
+
+def test_compact_output_is_expanded_to_the_requested_sections():
+    compact = {'s': 64, 'ats': 70, 'km': ['Python'], 'kx': [], 'atr': [], 'sm': ['Python'], 'sx': ['AWS'], 'sa': []}
+    expanded = validate_and_fix_data(expand_compact_analysis(compact, SECTIONS), SECTIONS)
+    assert set(expanded) == set(SECTIONS)
+    assert expanded['skills_analysis']['missing_skills'] == ['AWS']
+    assert expanded['ats_analysis']['keyword_match']['percentage'] == 100
+
+@pytest.mark.parametrize('output_format', ['full', 'compact'])
+def test_analyze_with_sections(monkeypatch, output_format):
+    response = FULL_OUTPUT if output_format == 'full' else dict(
+        {'s': 81, 'ats': 77, 'km': ['Python'], 'kx': ['AWS'], 'atr': ['Add AWS'],
+         'sm': ['Python'], 'sx': ['AWS'], 'sa': ['Go']},
+        # Sections that were not asked for are dropped
+        it=['Trend']
+    )
+    provider = LocalProvider(responses={'analyze': response})
+    monkeypatch.setattr(gemini_service, 'get_provider', lambda tier, hedge=False: provider)
+    monkeypatch.setattr(gemini_service.config, 'ANALYZE_OUTPUT_FORMAT', output_format)
+    monkeypatch.setattr(gemini_service.config, 'HEDGE_ENABLED', False)
+
+    result = gemini_service.analyze_resume_with_gemini('Python developer', 'Python and AWS', SECTIONS)
+
+    assert set(result) == set(SECTIONS)
+    assert result['score'] == 81
+    assert result['skills_analysis']['matching_skills'] == ['Python']
+    assert result['skills_analysis']['additional_skills'] == ['Go']
+    assert result['ats_analysis']['keyword_match']['missing'] == ['AWS']
+
+@pytest.mark.parametrize('output_format', ['full', 'compact'])
+def test_sectioned_reply_without_score_escalates(monkeypatch, output_format):
+    without_score = {k: v for k, v in FULL_OUTPUT.items() if k != 'score'}
+    if output_format == 'compact':
+        without_score = {'km': ['Python'], 'kx': ['AWS'], 'sm': ['Python'], 'sx': ['AWS'], 'sa': ['Go']}
+    providers = {
+        'fast': LocalProvider('fast', responses={'analyze': without_score}),
+        'strong': LocalProvider('strong', responses={'analyze': FULL_OUTPUT})
+    }
+    monkeypatch.setattr(gemini_service, 'get_provider', lambda tier, hedge=False: providers[tier])
+    monkeypatch.setattr(gemini_service.router, 'tiers_for', lambda endpoint, size: ['fast', 'strong'])
+    monkeypatch.setattr(gemini_service.config, 'ANALYZE_OUTPUT_FORMAT', output_format)
+    monkeypatch.setattr(gemini_service.config, 'HEDGE_ENABLED', False)
+
+    result = gemini_service.analyze_resume_with_gemini('Python developer', 'Python and AWS', SECTIONS)
+
+    assert providers['fast'].calls == 1 and providers['strong'].calls == 1
+    assert result['score'] == 81
+
+def test_overall_sectioned_reply_without_score_escalates(monkeypatch):
+    providers = {
+        'fast': LocalProvider('fast', responses={'analyze_overall': {'strengths': ['Clear']}}),
+        'strong': LocalProvider('strong', responses={'analyze_overall': {'overall_score': 70, 'strengths': ['Clear']}})
+    }
+    monkeypatch.setattr(gemini_service, 'get_provider', lambda tier, hedge=False: providers[tier])
+    monkeypatch.setattr(gemini_service.router, 'tiers_for', lambda endpoint, size: ['fast', 'strong'])
+    monkeypatch.setattr(gemini_service.config, 'HEDGE_ENABLED', False)
+
+    result = gemini_service.analyze_resume_overall_with_gemini('Python developer', ['strengths'])
+
+    assert providers['strong'].calls == 1
+    assert result == {'overall_score': 70, 'strengths': ['Clear']}
+
+def test_output_truncated_before_score_is_rejected_before_it_is_filled_in():
+    # Score last, as a model may order it
+    output = {k: FULL_OUTPUT[k] for k in ('ats_analysis', 'skills_analysis', 'score')}
+    fix = lambda data: validate_and_fix_data(data, SECTIONS)
+
+    with pytest.raises(ValueError, match='score'):
+        parse_gemini_response(truncated(output, 'score'), fix,
+                              validate=lambda data: gemini_service._validate_analysis(data, SECTIONS))
+
+    # Truncated after the score, the repaired output is accepted and completed
+    parsed = parse_gemini_response(truncated(FULL_OUTPUT, 'skills_analysis'), fix,
+                                   validate=lambda data: gemini_service._validate_analysis(data, SECTIONS))
+    assert parsed['score'] == 81 and set(parsed) == set(SECTIONS)
+
+@pytest.mark.parametrize('sections', [None, SECTIONS])
+def test_reply_truncated_before_score_escalates(monkeypatch, sections):
+    output = {k: FULL_OUTPUT[k] for k in ('ats_analysis', 'skills_analysis', 'score')}
+    providers = {
+        'fast': LocalProvider('fast', responses={'analyze': lambda prefix, text: truncated(output, 'score')}),
+        # A full analysis also needs its comprehensive analysis
+        'strong': LocalProvider('strong', responses={'analyze': dict(FULL_OUTPUT, comprehensive_analysis={})})
+    }
+    monkeypatch.setattr(gemini_service, 'get_provider', lambda tier, hedge=False: providers[tier])
+    monkeypatch.setattr(gemini_service.router, 'tiers_for', lambda endpoint, size: ['fast', 'strong'])
+    monkeypatch.setattr(gemini_service.config, 'ANALYZE_OUTPUT_FORMAT', 'full')
+    monkeypatch.setattr(gemini_service.config, 'TRUNCATION_RECOVERY', 'repair')
+    monkeypatch.setattr(gemini_service.config, 'HEDGE_ENABLED', False)
+
+    result = gemini_service.analyze_resume_with_gemini('Python developer', 'Python and AWS', sections)
+
+    assert providers['fast'].calls == 1 and providers['strong'].calls == 1
+    assert result['score'] == 81
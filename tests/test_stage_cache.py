@@ -0,0 +1,14 @@
+from services import analysis_stages
+
+def test_sampling_stages_are_not_cached(monkeypatch):
+    monkeypatch.setattr(analysis_stages.config, 'STAGE_CACHE_ENABLED', True)
+    monkeypatch.setattr(analysis_stages.config, 'USAGE_DEBUG_FIELD', False)
+    assert analysis_stages.model_cache_key('analyze', 'resume', 'job', None) is not None
+    assert analysis_stages.model_cache_key('improve_section', 'summary', 'text') is None
+
+def test_sampling_stages_are_cached_when_opted_in(monkeypatch):
+    monkeypatch.setattr(analysis_stages.config, 'STAGE_CACHE_ENABLED', True)
+    monkeypatch.setattr(analysis_stages.config, 'USAGE_DEBUG_FIELD', False)
+    monkeypatch.setattr(analysis_stages.config, 'STAGE_CACHE_SAMPLED', True)
+    key = analysis_stages.model_cache_key('improve_section', 'summary', 'text')
+    assert key is not None and key == analysis_stages.model_cache_key('improve_section', 'summary', 'text')
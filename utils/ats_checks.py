@@ -0,0 +1,250 @@
+"""
+Deterministic ATS format checks computed from the PDF structure
+"""
+import re
+from collections import defaultdict
+
+from utils.response_parser import requested
+
+# Fonts every PDF reader provides, so not embedding them is harmless
+STANDARD_FONTS = {
+    'Times-Roman', 'Times-Bold', 'Times-Italic', 'Times-BoldItalic',
+    'Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique', 'Helvetica-BoldOblique',
+    'Courier', 'Courier-Bold', 'Courier-Oblique', 'Courier-BoldOblique',
+    'Symbol', 'ZapfDingbats'
+}
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+PHONE_RE = re.compile(r'\+?\d[\d\s().-]{7,}\d')
+
+# Fraction of the page height treated as header/footer area
+HEADER_FOOTER_MARGIN = 0.05
+# Text segments at least this long count as body text when looking for columns
+COLUMN_TEXT_MIN_CHARS = 20
+# Rough glyph width in points, and the horizontal gap that separates two segments
+APPROX_GLYPH_WIDTH = 5
+SEGMENT_GAP = 15
+MIN_COLUMN_ROWS = 5
+MIN_TABLE_ROWS = 3
+# Pages with images and less text than this probably carry their text in images
+IMAGE_PAGE_MAX_CHARS = 200
+
+PENALTIES = {
+    'text_layer': 60,
+    'text_in_images': 15,
+    'multi_column': 15,
+    'tables': 10,
+    'embedded_fonts': 10,
+    'header_footer_contact': 10
+}
+
+ISSUE_MESSAGES = {
+    'text_layer': "Some pages have no text layer; ATS systems cannot read scanned content",
+    'text_in_images': "Text appears to be embedded in images, which ATS systems cannot read",
+    'multi_column': "Multi-column layout detected; ATS systems may read columns out of order",
+    'tables': "Tables detected; ATS systems often scramble table content",
+    'embedded_fonts': "Non-standard fonts are not embedded and may render or parse incorrectly",
+    'header_footer_contact': "Contact information is placed in the page header/footer, which many ATS systems skip"
+}
+
+def _resolve(obj):
+    return obj.get_object() if hasattr(obj, 'get_object') else obj
+
+def _page_resources(page):
+    return _resolve(page.get('/Resources')) or {}
+
+def _count_images(resources, depth=0):
+    """Count image XObjects, looking one level into form XObjects"""
+    xobjects = _resolve(resources.get('/XObject')) or {}
+    count = 0
+    for name in xobjects:
+        xobject = _resolve(xobjects[name])
+        subtype = xobject.get('/Subtype')
+        if subtype == '/Image':
+            count += 1
+        elif subtype == '/Form' and depth == 0:
+            count += _count_images(_resolve(xobject.get('/Resources')) or {}, depth + 1)
+    return count
+
+def _non_embedded_fonts(resources):
+    fonts = _resolve(resources.get('/Font')) or {}
+    missing = set()
+    for name in fonts:
+        font = _resolve(fonts[name])
+        base_font = str(font.get('/BaseFont', '')).lstrip('/')
+        descriptor = font.get('/FontDescriptor')
+        if descriptor is None and font.get('/Subtype') == '/Type0':
+            descendants = _resolve(font.get('/DescendantFonts')) or []
+            if descendants:
+                descriptor = _resolve(descendants[0]).get('/FontDescriptor')
+        if descriptor is None:
+            # Type3 fonts are drawn from the PDF itself; simple fonts without a
+            # descriptor must be one of the standard 14
+            if font.get('/Subtype') != '/Type3' and base_font not in STANDARD_FONTS:
+                missing.add(base_font)
+            continue
+        descriptor = _resolve(descriptor)
+        embedded = any(key in descriptor for key in ('/FontFile', '/FontFile2', '/FontFile3'))
+        # Subset prefixes such as "ABCDEF+Calibri" only appear on embedded fonts
+        if not embedded and base_font.split('+')[-1] not in STANDARD_FONTS:
+            missing.add(base_font)
+    return missing
+
+def _row_segments(page_draws):
+    """
+    Group text draws into rows by baseline and merge adjacent draws into segments
+
+    Returns:
+        list: Rows of (x, glyph_count) segments sorted left to right
+    """
+    rows = defaultdict(list)
+    for x, y, length in page_draws:
+        rows[round(y / 2)].append((x, length))
+
+    segmented = []
+    for draws in rows.values():
+        segments = []
+        for x, length in sorted(draws):
+            if segments:
+                start, glyphs = segments[-1]
+                if x - (start + glyphs * APPROX_GLYPH_WIDTH) <= SEGMENT_GAP:
+                    segments[-1] = (start, glyphs + length)
+                    continue
+            segments.append((x, length))
+        segmented.append(segments)
+    return segmented
+
+def _layout_signals(page_draws, width):
+    """
+    Count rows that look like side-by-side columns and rows that look like table rows
+
+    Returns:
+        tuple: (column_rows, table_rows, total_rows)
+    """
+    rows = _row_segments(page_draws)
+    if not rows:
+        return 0, 0, 0
+
+    left_margin = min(row[0][0] for row in rows)
+    column_rows = table_rows = 0
+    for row in rows:
+        if len(row) >= 3:
+            table_rows += 1
+            continue
+        # Long text starting well away from the left margin belongs to another column
+        if any(x - left_margin > width * 0.3 and glyphs >= COLUMN_TEXT_MIN_CHARS for x, glyphs in row):
+            column_rows += 1
+    return column_rows, table_rows, len(rows)
+
+def run_ats_checks(pdf_reader, layout):
+    """
+    Compute ATS format checks from the PDF structure
+
+    Args:
+        pdf_reader (PdfReader): The reader used for text extraction
+        layout (TextLayout): Text positions collected during extraction
+
+    Returns:
+        dict: format_score (0-100), format_issues (list) and per-check results
+    """
+    draws_by_page = defaultdict(list)
+    for page_index, x, y, length in layout.draws:
+        draws_by_page[page_index].append((x, y, length))
+    lines_by_page = defaultdict(list)
+    for page_index, x, y, text in layout.lines:
+        lines_by_page[page_index].append((x, y, text))
+
+    pages_without_text = []
+    image_only_pages = []
+    column_pages = []
+    table_pages = []
+    contact_in_margins = False
+    missing_fonts = set()
+
+    for page_index, page in enumerate(pdf_reader.pages):
+        resources = _page_resources(page)
+        page_lines = lines_by_page.get(page_index, [])
+        char_count = sum(len(text) for _, _, text in page_lines)
+        width = float(page.mediabox.width)
+        height = float(page.mediabox.height)
+        bottom = float(page.mediabox.bottom)
+
+        images = _count_images(resources)
+        if not page_lines:
+            pages_without_text.append(page_index + 1)
+        if images and char_count < IMAGE_PAGE_MAX_CHARS:
+            image_only_pages.append(page_index + 1)
+
+        missing_fonts |= _non_embedded_fonts(resources)
+
+        column_rows, table_rows, total_rows = _layout_signals(draws_by_page.get(page_index, []), width)
+        if column_rows >= MIN_COLUMN_ROWS and column_rows >= total_rows * 0.2:
+            column_pages.append(page_index + 1)
+        if table_rows >= MIN_TABLE_ROWS:
+            table_pages.append(page_index + 1)
+
+        for _, y, text in page_lines:
+            relative = (y - bottom) / height if height else 0.5
+            if (relative >= 1 - HEADER_FOOTER_MARGIN or relative <= HEADER_FOOTER_MARGIN) \
+                    and (EMAIL_RE.search(text) or PHONE_RE.search(text)):
+                contact_in_margins = True
+
+    checks = {
+        'text_layer': (not pages_without_text, f"Pages without text: {pages_without_text}" if pages_without_text else "All pages have a text layer"),
+        'text_in_images': (not image_only_pages, f"Image-heavy pages: {image_only_pages}" if image_only_pages else "No text found in images"),
+        'multi_column': (not column_pages, f"Multi-column pages: {column_pages}" if column_pages else "Single-column layout"),
+        'tables': (not table_pages, f"Pages with tables: {table_pages}" if table_pages else "No tables detected"),
+        'embedded_fonts': (not missing_fonts, f"Fonts not embedded: {sorted(missing_fonts)}" if missing_fonts else "All fonts embedded or standard"),
+        'header_footer_contact': (not contact_in_margins, "Contact details found in header/footer" if contact_in_margins else "Contact details are in the document body")
+    }
+
+    score = 100
+    issues = []
+    for name, (passed, _) in checks.items():
+        if passed:
+            continue
+        penalty = PENALTIES[name]
+        # A partially scanned resume is less severe than one with no text at all
+        if name == 'text_layer' and len(pages_without_text) < len(pdf_reader.pages):
+            penalty = PENALTIES[name] // 3
+        score -= penalty
+        issues.append(ISSUE_MESSAGES[name])
+
+    return {
+        'format_score': max(score, 0),
+        'format_issues': issues,
+        'checks': {name: {'passed': passed, 'detail': detail} for name, (passed, detail) in checks.items()}
+    }
+
+def merge_ats_checks(analysis, ats_checks, overall=False, sections=None):
+    """
+    Merge local ATS checks into a parsed model response
+
+    Args:
+        analysis (dict): The parsed analysis from /analyze or /analyze-overall
+        ats_checks (dict): Output of run_ats_checks
+        overall (bool): True for the /analyze-overall response shape
+        sections (list): Requested response sections; the others are left out, None for all of them
+
+    Returns:
+        dict: The analysis with format issues and scores filled in locally
+    """
+    if requested('ats_analysis', sections):
+        ats_analysis = analysis.setdefault('ats_analysis', {})
+        ats_analysis['format_checks'] = ats_checks['checks']
+        if overall:
+            issues = ats_analysis.get('issues') or []
+            ats_analysis['issues'] = ats_checks['format_issues'] + [issue for issue in issues if issue not in ats_checks['format_issues']]
+        else:
+            ats_analysis['format_issues'] = ats_checks['format_issues']
+
+    if overall and requested('detailed_analysis', sections):
+        details = analysis.setdefault('detailed_analysis', {}).setdefault('ats_compatibility', {}).setdefault('details', {})
+        details['format_compatibility'] = ats_checks['format_score']
+        details['file_structure'] = ats_checks['format_score']
+    elif not overall and requested('comprehensive_analysis', sections):
+        metrics = analysis.setdefault('comprehensive_analysis', {}).setdefault('detailed_metrics', {})
+        details = metrics.setdefault('ats_compatibility', {}).setdefault('details', {})
+        details['format_score'] = ats_checks['format_score']
+
+    return analysis
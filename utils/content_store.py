@@ -0,0 +1,192 @@
+"""
+Content-addressed storage for derived artifacts (job descriptions, analysis results)
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Temporary files older than this belong to an interrupted write
+STALE_TMP_SECONDS = 3600
+
+def content_hash(text):
+    """
+    Compute the SHA-256 hex digest of a string
+
+    Args:
+        text (str): The text to hash
+
+    Returns:
+        str: Hex digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ContentStore:
+    """
+    Thread-safe LRU store keyed by content id, optionally backed by a directory
+    of JSON files so entries survive restarts and are shared between workers.
+
+    The directory is bounded to max_files entries. Every hit refreshes the
+    file's mtime, so the least recently used files are the ones deleted.
+    """
+
+    def __init__(self, max_entries=256, directory=None, max_files=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Prune after this many writes rather than listing the directory on each one
+        self._prune_every = max(1, (max_files or 0) // 20)
+        self._writes_since_prune = self._prune_every
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                logger.warning("Content store directory %s unavailable: %s", self.directory, e)
+                self.directory = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up an entry, falling back to disk on a memory miss
+
+        Args:
+            key (str): The entry id
+
+        Returns:
+            dict: The stored entry or None if it is unknown
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            self._touch(key)
+            return entry
+
+        if not self.directory or not key.isalnum():
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read stored entry %s: %s", key, e)
+            return None
+
+        self._remember(key, entry)
+        return entry
+
+    def _touch(self, key):
+        # Mark the file as recently used so pruning keeps entries served from memory too
+        if not self.directory:
+            return
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def put(self, key, entry):
+        """
+        Store an entry in memory and, when configured, on disk
+
+        Args:
+            key (str): The entry id
+            entry (dict): JSON-serialisable entry
+        """
+        self._remember(key, entry)
+
+        if not self.directory:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not persist entry %s: %s", key, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        if not self.max_files:
+            return
+        with self._lock:
+            self._writes_since_prune += 1
+            if self._writes_since_prune < self._prune_every:
+                return
+            self._writes_since_prune = 0
+        self.prune()
+
+    def prune(self):
+        """
+        Delete the least recently used files beyond max_files
+
+        Returns:
+            int: Number of files deleted
+        """
+        if not self.directory or not self.max_files:
+            return 0
+
+        files = []
+        stale = []
+        stale_before = time.time() - STALE_TMP_SECONDS
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        mtime = entry.stat().st_mtime
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith('.json'):
+                        files.append((mtime, entry.path))
+                    elif entry.name.endswith('.tmp') and mtime < stale_before:
+                        # Left behind by a worker that died mid-write
+                        stale.append(entry.path)
+        except OSError as e:
+            logger.warning("Could not scan content store %s: %s", self.directory, e)
+            return 0
+
+        files.sort()
+        excess = [path for _, path in files[:max(len(files) - self.max_files, 0)]]
+
+        deleted = 0
+        for path in stale + excess:
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                pass
+        return deleted
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
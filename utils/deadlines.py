@@ -0,0 +1,191 @@
+"""
+Per-request deadlines and abandonment of work nobody will read
+
+A Deadline is created for every analysis request, from the client's header or
+the endpoint's default, and is carried to the threads working for the request
+through a context variable. Blocking points poll it, so work stops as soon as
+the deadline passes or the client has closed its connection.
+"""
+import time
+import select
+import socket
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from utils.errors import DeadlineExceededError, ClientDisconnectedError
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often blocking waits wake up to check the deadline and the connection
+POLL_INTERVAL_SECONDS = 0.1
+
+_current = contextvars.ContextVar('deadline', default=None)
+
+def client_disconnected(sock):
+    """
+    Check whether the peer of a request socket has closed the connection
+
+    The request body has been read by the time this is asked, so a readable
+    socket with nothing to read means the client sent FIN (closed the tab or
+    gave up). Pending bytes, e.g. a pipelined request, mean it is still there.
+
+    Args:
+        sock (socket.socket): The client connection
+
+    Returns:
+        bool: True if the client is gone
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except (BlockingIOError, InterruptedError, ValueError):
+        # ValueError: TLS sockets do not support peeking
+        return False
+    except OSError:
+        return True
+
+class Deadline:
+    """
+    Time budget of one request
+
+    Args:
+        seconds (float): Seconds from now until the deadline
+        sock (socket.socket): Client connection to watch for disconnects, if available
+    """
+
+    def __init__(self, seconds, sock=None):
+        self.seconds = seconds
+        self.expires_at = time.time() + seconds
+        self.sock = sock
+        self.reason = None
+        self.cancel_event = threading.Event()
+        self.upstream_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left until the deadline, never negative"""
+        return max(0.0, self.expires_at - time.time())
+
+    def _abandon(self, reason):
+        with self._lock:
+            if self.reason:
+                return
+            self.reason = reason
+            wasted = self.upstream_seconds
+        self.cancel_event.set()
+        metrics.increment(f'requests.abandoned.{reason}')
+        metrics.increment('requests.wasted_upstream_seconds', wasted)
+        logger.info("Abandoning request (%s) after %.2fs", reason, self.seconds - self.remaining())
+
+    def abandoned(self):
+        """
+        Check the deadline and the client connection
+
+        Returns:
+            bool: True once the request's work should stop
+        """
+        if self.reason is None:
+            if self.remaining() <= 0:
+                self._abandon('deadline')
+            elif self.sock is not None and client_disconnected(self.sock):
+                self._abandon('disconnect')
+        return self.reason is not None
+
+    def check(self):
+        """
+        Stop the caller if the request was abandoned
+
+        Raises:
+            DeadlineExceededError: If the deadline has passed
+            ClientDisconnectedError: If the client closed the connection
+        """
+        if not self.abandoned():
+            return
+        if self.reason == 'deadline':
+            raise DeadlineExceededError(f"Request did not complete within its {self.seconds:g}s deadline")
+        raise ClientDisconnectedError("Client closed the connection")
+
+    def record_upstream(self, seconds):
+        """
+        Add the duration of an upstream call made for this request
+
+        Calls that finish after the request was abandoned count as wasted
+        right away; the ones before count when it is abandoned.
+
+        Args:
+            seconds (float): Duration of the call
+        """
+        with self._lock:
+            self.upstream_seconds += seconds
+            wasted = self.reason is not None
+        if wasted:
+            metrics.increment('requests.wasted_upstream_seconds', seconds)
+
+    def wait(self, future):
+        """
+        Wait for a future, stopping early if the request is abandoned
+
+        Args:
+            future (Future): The pending work
+
+        Returns:
+            The future's result
+
+        Raises:
+            DeadlineExceededError, ClientDisconnectedError: If the request is abandoned first
+        """
+        while True:
+            try:
+                return future.result(timeout=min(POLL_INTERVAL_SECONDS, max(self.remaining(), 0.001)))
+            except FutureTimeoutError:
+                self.check()
+
+def current():
+    """The deadline of the request being served, or None (e.g. in the batch CLI)"""
+    return _current.get()
+
+@contextmanager
+def deadline_scope(deadline):
+    """Make deadline the current one for the enclosed code; None runs it without one"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+def check():
+    """Stop the caller if the current request was abandoned"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+def wait(future):
+    """Wait for a future under the current deadline, if any"""
+    deadline = _current.get()
+    return deadline.wait(future) if deadline is not None else future.result()
+
+def activate(deadline):
+    """
+    Make deadline the current one until deactivate() is called with the returned token
+
+    Args:
+        deadline (Deadline): The request's deadline
+
+    Returns:
+        Token: Restores the previous deadline
+    """
+    return _current.set(deadline)
+
+def deactivate(token):
+    """Restore the deadline that was current before activate()"""
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Called from another context than the one that activated it
+        _current.set(None)
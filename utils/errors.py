@@ -2,12 +2,13 @@ class ApiError(Exception):
     """Base API Exception class for custom error handling"""
     status_code = 500
     
-    def __init__(self, message, status_code=None, payload=None):
+    def __init__(self, message, status_code=None, payload=None, headers=None):
         super().__init__(self)
         self.message = message
         if status_code is not None:
             self.status_code = status_code
         self.payload = payload
+        self.headers = headers or {}
     
     def to_dict(self):
         """Convert exception to dict for JSON response"""
@@ -29,6 +30,11 @@ class NotFoundError(ApiError):
     def __init__(self, message, payload=None):
         super().__init__(message, 404, payload)
 
+class ForbiddenError(ApiError):
+    """Exception for 403 Forbidden errors"""
+    def __init__(self, message, payload=None):
+        super().__init__(message, 403, payload)
+
 class ValidationError(ApiError):
     """Exception for validation errors"""
     def __init__(self, message, payload=None):
@@ -38,3 +44,24 @@ class ServerError(ApiError):
     """Exception for 500 Server errors"""
     def __init__(self, message, payload=None):
         super().__init__(message, 500, payload)
+
+class PayloadTooLargeError(ApiError):
+    """Exception for 413 Payload Too Large errors"""
+    def __init__(self, message, payload=None):
+        super().__init__(message, 413, payload)
+
+class TooManyRequestsError(ApiError):
+    """Exception for 429 Too Many Requests errors"""
+    def __init__(self, message, retry_after=1, payload=None):
+        super().__init__(message, 429, payload, headers={'Retry-After': str(int(retry_after))})
+        self.retry_after = int(retry_after)
+
+class DeadlineExceededError(ApiError):
+    """Exception for requests that ran past their deadline (504 Gateway Timeout)"""
+    def __init__(self, message, payload=None):
+        super().__init__(message, 504, payload)
+
+class ClientDisconnectedError(ApiError):
+    """Exception for requests abandoned because the client closed the connection (499, as in nginx)"""
+    def __init__(self, message, payload=None):
+        super().__init__(message, 499, payload)
@@ -4,44 +4,207 @@ Utility functions for file management
 import os
 import time
 import logging
-from datetime import datetime, timedelta
+import threading
+from datetime import timedelta
+
+from utils.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
-def cleanup_old_files(directory, max_age_hours=24):
+JANITOR_LOCK_FILE = '.janitor.lock'
+
+# Files that belong to the directory itself and are never evicted
+PROTECTED_FILES = {'.gitkeep', JANITOR_LOCK_FILE}
+
+def _scan_files(directory, skip_dirs=()):
     """
-    Delete files in the specified directory that are older than the maximum age
-    
+    Recursively list regular files with a single stat per entry
+
+    Args:
+        directory (str): Path to the directory to scan
+        skip_dirs (iterable): Names of subdirectories left out of the scan
+
+    Returns:
+        list: (path, size, last_used) tuples
+    """
+    files = []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in skip_dirs:
+                                pending.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False) or entry.name in PROTECTED_FILES:
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        # Removed by a request or another sweep while scanning
+                        continue
+                    # Disks mounted with noatime never update st_atime, so fall back to mtime
+                    files.append((entry.path, stat.st_size, max(stat.st_atime, stat.st_mtime)))
+        except OSError as e:
+            logger.warning("Could not scan %s: %s", current, e)
+    return files
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.error("Error deleting file %s: %s", path, e)
+        return False
+
+def cleanup_old_files(directory, max_age_hours=24, max_total_bytes=None, skip_dirs=()):
+    """
+    Delete files in the specified directory that are older than the maximum age,
+    then evict least recently used files until the directory fits its byte quota
+
     Args:
         directory (str): Path to the directory to clean
         max_age_hours (int): Maximum age of files in hours before deletion
-    
+        max_total_bytes (int): Optional quota for the total size of all files
+        skip_dirs (iterable): Names of subdirectories that manage their own files
+
     Returns:
         int: Number of files deleted
     """
     if not os.path.exists(directory):
-        logger.warning(f"Directory {directory} does not exist")
+        logger.warning("Directory %s does not exist", directory)
         return 0
-    
+
     count = 0
+    freed = 0
     current_time = time.time()
     max_age = timedelta(hours=max_age_hours).total_seconds()
-    
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        
-        # Skip directories
-        if os.path.isdir(file_path):
-            continue
-        
-        # Check file age
-        file_age = current_time - os.path.getmtime(file_path)
-        if file_age > max_age:
-            try:
-                os.remove(file_path)
-                logger.info(f"Deleted old file: {filename}")
+
+    kept = []
+    for path, size, last_used in _scan_files(directory, skip_dirs):
+        if current_time - last_used > max_age:
+            if _remove(path):
+                logger.info("Deleted old file: %s", os.path.relpath(path, directory))
                 count += 1
-            except Exception as e:
-                logger.error(f"Error deleting file {filename}: {e}")
-    
+                freed += size
+        else:
+            kept.append((path, size, last_used))
+
+    total = sum(size for _, size, _ in kept)
+    if max_total_bytes is not None and total > max_total_bytes:
+        # Least recently used first
+        kept.sort(key=lambda item: item[2])
+        for path, size, _ in kept:
+            if total <= max_total_bytes:
+                break
+            if _remove(path):
+                logger.info("Evicted file over quota: %s", os.path.relpath(path, directory))
+                count += 1
+                freed += size
+                # A file that could not be removed still counts against the quota
+                total -= size
+
+    metrics.set_gauge('uploads.bytes', max(total, 0))
+    metrics.increment('uploads.janitor.files_deleted', count)
+    metrics.increment('uploads.janitor.bytes_deleted', freed)
     return count
+
+class UploadJanitor(threading.Thread):
+    """
+    Background thread that periodically enforces max age and a byte quota on
+    the uploads directory.
+
+    Every gunicorn worker starts a janitor, but only the one holding an
+    exclusive lock on the directory's lock file sweeps; the others retry the
+    lock each interval and take over if the leader exits. Subdirectories in
+    skip_dirs hold stores that bound their own size and are left alone.
+    """
+
+    def __init__(self, directory, max_age_hours=24, max_total_bytes=None, interval_seconds=300, skip_dirs=()):
+        super().__init__(name='upload-janitor', daemon=True)
+        self.directory = directory
+        self.max_age_hours = max_age_hours
+        self.max_total_bytes = max_total_bytes
+        self.interval_seconds = interval_seconds
+        self.skip_dirs = frozenset(skip_dirs)
+        self.is_leader = False
+        self._lock_file = None
+        self._stopped = threading.Event()
+
+    def _try_become_leader(self):
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self.is_leader = True
+            return True
+
+        try:
+            if self._lock_file is None:
+                self._lock_file = open(os.path.join(self.directory, JANITOR_LOCK_FILE), 'a')
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+
+        self.is_leader = True
+        logger.info("Upload janitor leader elected (pid %d)", os.getpid())
+        return True
+
+    def sweep(self):
+        """Run one sweep if this process is the leader"""
+        if not self._try_become_leader():
+            return 0
+
+        start = time.time()
+        deleted = cleanup_old_files(self.directory, self.max_age_hours, self.max_total_bytes, self.skip_dirs)
+        metrics.observe('uploads.janitor.sweep_seconds', time.time() - start)
+        return deleted
+
+    def run(self):
+        # The first sweep happens here rather than at startup so it never delays boot
+        while not self._stopped.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("Upload janitor sweep failed: %s", e)
+            self._stopped.wait(self.interval_seconds)
+
+    def stop(self):
+        """Stop the janitor and release leadership"""
+        self._stopped.set()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
+
+_janitor = None
+
+def start_upload_janitor(directory, max_age_hours=24, max_total_bytes=None, interval_seconds=300, skip_dirs=()):
+    """
+    Start the background janitor for this process (idempotent)
+
+    Args:
+        directory (str): Path to the uploads directory
+        max_age_hours (int): Maximum age of files in hours before deletion
+        max_total_bytes (int): Quota for the total size of the directory
+        interval_seconds (int): Time between sweeps
+        skip_dirs (iterable): Names of subdirectories the janitor never touches
+
+    Returns:
+        UploadJanitor: The running janitor
+    """
+    global _janitor
+    if _janitor is not None and _janitor.is_alive():
+        return _janitor
+
+    _janitor = UploadJanitor(directory, max_age_hours, max_total_bytes, interval_seconds, skip_dirs)
+    _janitor.start()
+    return _janitor
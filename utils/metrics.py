@@ -0,0 +1,133 @@
+"""
+In-process metrics registry for counters, gauges and timing summaries
+"""
+import threading
+from collections import deque
+
+# Number of recent observations kept per summary for percentile estimates
+RESERVOIR_SIZE = 1024
+
+class Summary:
+    """Running count/sum/min/max plus a window of recent values for percentiles"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        index = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'min': self.min,
+            'max': self.max,
+            'avg': round(self.total / self.count, 6) if self.count else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+class Metrics:
+    """Thread-safe registry shared by all modules of a worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+
+    def increment(self, name, value=1):
+        """
+        Increase a counter
+
+        Args:
+            name (str): Metric name, dot separated
+            value (int|float): Amount to add
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """
+        Set a gauge to its current value
+
+        Args:
+            name (str): Metric name, dot separated
+            value (int|float): The current value
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """
+        Record an observation (usually a duration in seconds) in a summary
+
+        Args:
+            name (str): Metric name, dot separated
+            value (int|float): The observed value
+        """
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = Summary()
+            summary.observe(value)
+
+    def percentile(self, name, q):
+        """
+        Get a percentile of the recent observations of a summary
+
+        Args:
+            name (str): Metric name
+            q (int|float): Percentile between 0 and 100
+
+        Returns:
+            float: The percentile, or None when nothing has been observed
+        """
+        with self._lock:
+            summary = self._summaries.get(name)
+            return summary.percentile(q) if summary else None
+
+    def counter(self, name):
+        """Get the current value of a counter (0 if never incremented)"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """
+        Export all metrics
+
+        Returns:
+            dict: Counters, gauges and summaries keyed by metric name
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'summaries': {name: summary.to_dict() for name, summary in self._summaries.items()}
+            }
+
+    def reset(self):
+        """Drop all recorded metrics"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+# Shared registry for the worker process
+metrics = Metrics()
@@ -0,0 +1,245 @@
+"""
+Interchangeable PDF text extraction backends and the fallback chain over them
+
+PyPDF2 is always installed. pypdf and PyMuPDF are optional and used when
+importable. Every backend fills the same TextLayout for the local ATS checks.
+"""
+import io
+import time
+import logging
+import threading
+import importlib.util
+from statistics import median
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+NO_TEXT_MESSAGE = "No text could be extracted from the PDF. The file might be scanned or secured."
+
+# Text that is mostly U+FFFD came from fonts the backend could not decode
+MAX_UNREADABLE_RATIO = 0.3
+
+def unreadable(text):
+    """Check whether a backend failed to map most glyphs to characters"""
+    visible = [char for char in text if not char.isspace()]
+    return bool(visible) and visible.count('\ufffd') / len(visible) > MAX_UNREADABLE_RATIO
+
+def pdf_bytes(pdf_reader):
+    """Read the raw bytes behind an open PdfReader without moving its stream"""
+    stream = pdf_reader.stream
+    position = stream.tell()
+    stream.seek(0)
+    data = stream.read()
+    stream.seek(position)
+    return data
+
+def _visitor_extract(pages, layout):
+    """Extract page texts with the PyPDF2/pypdf visitor API, recording the layout if asked"""
+    texts = []
+    for page_index, page in enumerate(pages):
+        if layout is not None:
+            before, visit_text = layout.visitors(page_index)
+            texts.append(page.extract_text(visitor_operand_before=before, visitor_text=visit_text))
+        else:
+            texts.append(page.extract_text())
+    return texts
+
+class PdfBackend:
+    """
+    A text extraction library
+
+    Subclasses set name (used in config and metrics) and module (the import
+    to check for) and implement extract_pages().
+    """
+    name = None
+    module = None
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec(cls.module) is not None
+
+    def extract_pages(self, pdf_reader, layout=None):
+        """
+        Extract the text of every page
+
+        Args:
+            pdf_reader (PdfReader): The PyPDF2 reader of the document
+            layout (TextLayout): Optional collector of text positions
+
+        Returns:
+            list: One string per page
+        """
+        raise NotImplementedError
+
+class PyPDF2Backend(PdfBackend):
+    """PyPDF2, reusing the already opened reader"""
+    name = 'pypdf2'
+    module = 'PyPDF2'
+
+    def extract_pages(self, pdf_reader, layout=None):
+        return _visitor_extract(pdf_reader.pages, layout)
+
+class PypdfBackend(PdfBackend):
+    """pypdf, the maintained successor of PyPDF2 with a faster content parser"""
+    name = 'pypdf'
+    module = 'pypdf'
+
+    def extract_pages(self, pdf_reader, layout=None):
+        import pypdf
+        reader = pypdf.PdfReader(io.BytesIO(pdf_bytes(pdf_reader)))
+        return _visitor_extract(reader.pages, layout)
+
+class PyMuPDFBackend(PdfBackend):
+    """PyMuPDF (MuPDF bindings): compiled, much faster, keeps block reading order"""
+    name = 'pymupdf'
+    module = 'pymupdf'
+
+    @classmethod
+    def available(cls):
+        # Releases before 1.24.3 only install the legacy 'fitz' module
+        return importlib.util.find_spec('pymupdf') is not None or importlib.util.find_spec('fitz') is not None
+
+    def extract_pages(self, pdf_reader, layout=None):
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf
+        texts = []
+        with pymupdf.open(stream=pdf_bytes(pdf_reader), filetype='pdf') as document:
+            for page_index, page in enumerate(document):
+                if layout is None:
+                    texts.append(page.get_text())
+                    continue
+                texts.append(self._extract_with_layout(page_index, page, pdf_reader.pages[page_index].mediabox, layout))
+        return texts
+
+    def _extract_with_layout(self, page_index, page, mediabox, layout):
+        """Build the page text from its spans, recording them in PDF coordinates"""
+        # MuPDF measures y downwards from the top of the page
+        top = float(mediabox.bottom) + float(mediabox.height)
+        blocks = []
+        for block in page.get_text('dict')['blocks']:
+            lines = []
+            for line in block.get('lines', []):
+                text = ''
+                for span in line['spans']:
+                    x, y = span['origin']
+                    layout.draws.append((page_index, x, top - y, len(span['text'])))
+                    text += span['text']
+                if text.strip():
+                    x, y = line['spans'][0]['origin']
+                    layout.lines.append((page_index, x, top - y, text.strip()))
+                lines.append(text)
+            blocks.append('\n'.join(lines))
+        return '\n'.join(blocks)
+
+BACKENDS = {backend.name: backend for backend in (PyMuPDFBackend, PypdfBackend, PyPDF2Backend)}
+
+class BackendChain:
+    """
+    Tries backends in order until one returns text
+
+    With 'auto', every installed backend is used. While fewer than
+    benchmark_samples documents have been timed on each backend, the first
+    backend rotates; afterwards the chain is ordered by median seconds per
+    page, so the fastest installed library leads and the others are fallbacks.
+
+    Args:
+        names (str): 'auto' or a comma separated preference order, e.g. 'pymupdf,pypdf2'
+        benchmark_samples (int): Documents to time on each backend in auto mode
+    """
+
+    def __init__(self, names='auto', benchmark_samples=5):
+        auto = names.strip() == 'auto'
+        requested = list(BACKENDS) if auto else [name.strip() for name in names.split(',') if name.strip()]
+        self.backends = []
+        for name in requested:
+            if name not in BACKENDS:
+                logger.warning("Unknown PDF backend %r ignored", name)
+            elif not BACKENDS[name].available():
+                if not auto:
+                    logger.warning("PDF backend %r is not installed and is skipped", name)
+            else:
+                self.backends.append(BACKENDS[name]())
+        if not self.backends:
+            self.backends = [PyPDF2Backend()]
+
+        self.auto = auto and len(self.backends) > 1
+        self.benchmark_samples = benchmark_samples
+        self._seconds_per_page = {backend.name: [] for backend in self.backends}
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def order(self):
+        """The backends in the order the next document tries them"""
+        if not self.auto:
+            return list(self.backends)
+        with self._lock:
+            if any(len(samples) < self.benchmark_samples for samples in self._seconds_per_page.values()):
+                first = self._calls % len(self.backends)
+                self._calls += 1
+                return self.backends[first:] + self.backends[:first]
+            return sorted(self.backends, key=lambda backend: median(self._seconds_per_page[backend.name]))
+
+    def _record(self, backend, seconds, pages):
+        metrics.observe(f'pdf.{backend.name}.seconds', seconds)
+        with self._lock:
+            samples = self._seconds_per_page[backend.name]
+            samples.append(seconds / max(pages, 1))
+            # Keep a recent window so the ranking follows the real traffic
+            del samples[:-max(self.benchmark_samples * 4, 1)]
+
+    def extract(self, pdf_reader, layout=None):
+        """
+        Extract the document text with the first backend that succeeds
+
+        Args:
+            pdf_reader (PdfReader): The PyPDF2 reader of the document
+            layout (TextLayout): Optional collector of text positions, reset before each attempt
+
+        Returns:
+            tuple: (text, backend_name)
+
+        Raises:
+            Exception: If no backend could extract any text
+        """
+        errors = []
+        empty = False
+        undecoded = None
+        for attempt, backend in enumerate(self.order()):
+            if layout is not None:
+                layout.draws.clear()
+                layout.lines.clear()
+            start = time.time()
+            try:
+                pages = backend.extract_pages(pdf_reader, layout)
+            except Exception as e:
+                metrics.increment(f'pdf.{backend.name}.failures')
+                logger.warning("PDF backend %s failed: %s", backend.name, e)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._record(backend, time.time() - start, len(pages))
+
+            text = ''.join(page_text + '\n' for page_text in pages if page_text)
+            if not text.strip():
+                metrics.increment(f'pdf.{backend.name}.empty')
+                empty = True
+                continue
+            if unreadable(text):
+                metrics.increment(f'pdf.{backend.name}.unreadable')
+                if undecoded is None:
+                    positions = (list(layout.draws), list(layout.lines)) if layout is not None else None
+                    undecoded = (text, backend.name, positions)
+                continue
+            if attempt:
+                metrics.increment('pdf.fallbacks')
+            return text, backend.name
+
+        # Poorly decoded text still beats failing the request
+        if undecoded is not None:
+            text, name, positions = undecoded
+            if positions is not None:
+                layout.draws[:], layout.lines[:] = positions
+            return text, name
+        raise Exception(NO_TEXT_MESSAGE if empty or not errors else '; '.join(errors))
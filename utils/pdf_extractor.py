@@ -1,27 +1,164 @@
+import re
+import logging
+
 from PyPDF2 import PdfReader
 
-def extract_text_from_pdf(pdf_file):
+from utils.metrics import metrics
+from utils.pdf_backends import BackendChain, NO_TEXT_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# Replaced with the configured chain by configure_backends()
+backend_chain = BackendChain()
+
+def configure_backends(names='auto', benchmark_samples=5):
     """
-    Extract text content from a PDF file
-    
+    Choose the extraction backends
+
+    Args:
+        names (str): 'auto' or a comma separated preference order ('pymupdf', 'pypdf', 'pypdf2')
+        benchmark_samples (int): Documents to time on each backend before 'auto' fixes its order
+    """
+    global backend_chain
+    backend_chain = BackendChain(names, benchmark_samples)
+
+def load_pdf(pdf_file):
+    """
+    Open a PDF so the same reader can be shared by text extraction and layout checks
+
     Args:
         pdf_file: The uploaded PDF file object
-        
+
+    Returns:
+        PdfReader: The parsed PDF
+    """
+    try:
+        return PdfReader(pdf_file)
+    except Exception as e:
+        logger.error("Error reading PDF: %s", e)
+        raise Exception(f"Failed to extract text from PDF: {str(e)}")
+
+# Operators that draw text
+TEXT_SHOWING_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+
+def _operand_length(operands):
+    """Approximate number of glyphs drawn by a text-showing operator"""
+    length = 0
+    for operand in operands:
+        if isinstance(operand, (str, bytes)):
+            length += len(operand)
+        elif isinstance(operand, list):
+            length += sum(len(item) for item in operand if isinstance(item, (str, bytes)))
+    return length
+
+def _device_position(cm, tm):
+    """Map the text space origin through the current transformation matrix"""
+    x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+    y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+    return x, y
+
+class TextLayout:
+    """
+    Collects where text is drawn while a backend extracts it, for the local layout checks
+
+    Attributes:
+        draws (list): (page_index, x, y, glyph_count) for every text-showing operator
+        lines (list): (page_index, x, y, text) for every extracted line of text
+    """
+
+    def __init__(self):
+        self.draws = []
+        self.lines = []
+
+    def visitors(self, page_index):
+        """Build the PyPDF2/pypdf visitor callbacks for one page"""
+        pending = []
+
+        def before(operator, operands, cm, tm):
+            if operator not in TEXT_SHOWING_OPERATORS:
+                return
+            x, y = _device_position(cm, tm)
+            self.draws.append((page_index, x, y, _operand_length(operands)))
+            # PyPDF2 reports the text matrix of the operator that flushes a line,
+            # so remember where the line actually started
+            if not pending:
+                pending.append((x, y))
+
+        def text(content, cm, tm, font_dict, font_size):
+            if content and content.strip():
+                x, y = pending[0] if pending else _device_position(cm, tm)
+                self.lines.append((page_index, x, y, content.strip()))
+            pending.clear()
+
+        return before, text
+
+def _resolve(obj):
+    return obj.get_object() if hasattr(obj, 'get_object') else obj
+
+# A string operand followed by a text-showing operator, found without tokenizing the stream
+TEXT_SHOWING_RE = re.compile(rb'[)>\]]\s*(?:Tj|TJ|\'|")')
+
+def _declares_fonts(resources, depth=0):
+    """Check for font resources, looking one level into form XObjects"""
+    if _resolve(resources.get('/Font')):
+        return True
+    if depth:
+        return False
+    xobjects = _resolve(resources.get('/XObject')) or {}
+    for name in xobjects:
+        xobject = _resolve(xobjects[name])
+        if xobject.get('/Subtype') == '/Form' and _declares_fonts(_resolve(xobject.get('/Resources')) or {}, depth + 1):
+            return True
+    return False
+
+def _page_has_text(page):
+    """Check one page for a font and, on the page itself, for text being drawn"""
+    resources = _resolve(page.get('/Resources')) or {}
+    if not _declares_fonts(resources):
+        return False
+    if not _resolve(resources.get('/Font')):
+        # Fonts only inside form XObjects: the text is drawn there
+        return True
+    contents = page.get_contents()
+    return contents is not None and TEXT_SHOWING_RE.search(contents.get_data()) is not None
+
+def has_text_layer(pdf_reader):
+    """
+    Check whether any page has a text layer, without extracting text
+
+    Text needs a font and a text-showing operator. The first page answers for
+    almost every real resume; only image-only scans are looked at page by
+    page, and pages without fonts are skipped without decoding their content.
+
+    Args:
+        pdf_reader (PdfReader): The parsed PDF
+
+    Returns:
+        bool: False if the document has no text layer at all
+    """
+    return any(_page_has_text(page) for page in pdf_reader.pages)
+
+def extract_text_from_pdf(pdf_file, layout=None):
+    """
+    Extract text content from a PDF file
+
+    Args:
+        pdf_file: The uploaded PDF file object or an already opened PdfReader
+        layout (TextLayout): Optional collector of text positions for the local layout checks
+
     Returns:
         str: Extracted text from the PDF or None if extraction fails
     """
     try:
-        pdf_reader = PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        
-        if not text.strip():
-            raise Exception("No text could be extracted from the PDF. The file might be scanned or secured.")
-        
+        pdf_reader = pdf_file if isinstance(pdf_file, PdfReader) else PdfReader(pdf_file)
+
+        # Reject image-only scans before any backend parses a content stream
+        if not has_text_layer(pdf_reader):
+            metrics.increment('pdf.rejected_no_text_layer')
+            raise Exception(NO_TEXT_MESSAGE)
+
+        text, _ = backend_chain.extract(pdf_reader, layout)
         return text
     except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
+        logger.error("Error extracting text from PDF: %s", e)
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
@@ -0,0 +1,226 @@
+"""
+Per-client sliding-window quotas on request count and estimated tokens
+"""
+import math
+import time
+import hashlib
+import logging
+import threading
+
+from utils.errors import TooManyRequestsError
+from utils.metrics import metrics
+
+try:
+    import redis
+except ImportError:  # Optional dependency for the shared store
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class MemoryRateLimitStore:
+    """In-process counter store; limits apply per worker process"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """
+        Read several counters
+
+        Args:
+            keys (list): Counter keys
+
+        Returns:
+            list: Counter values (0 for missing or expired keys)
+        """
+        now = time.time()
+        with self._lock:
+            values = []
+            for key in keys:
+                value, expires_at = self._values.get(key, (0, 0))
+                values.append(value if expires_at > now else 0)
+            return values
+
+    def incr(self, key, amount, ttl):
+        """
+        Add to a counter, (re)setting its expiry
+
+        Args:
+            key (str): Counter key
+            amount (int|float): Amount to add
+            ttl (int): Seconds until the counter expires
+        """
+        now = time.time()
+        with self._lock:
+            value, expires_at = self._values.get(key, (0, 0))
+            if expires_at <= now:
+                value = 0
+            self._values[key] = (value + amount, now + ttl)
+            # Opportunistically drop expired counters so memory stays bounded
+            if len(self._values) > 10000:
+                self._values = {k: v for k, v in self._values.items() if v[1] > now}
+
+class RedisRateLimitStore:
+    """Shared counter store so limits hold across gunicorn workers and nodes"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        if redis is None:
+            raise RuntimeError("The redis package is required for RATE_LIMIT_STORE=redis")
+        return cls(redis.Redis.from_url(url))
+
+    def get_many(self, keys):
+        return [float(value) if value is not None else 0 for value in self.client.mget(keys)]
+
+    def incr(self, key, amount, ttl):
+        pipeline = self.client.pipeline()
+        pipeline.incrbyfloat(key, amount)
+        pipeline.expire(key, ttl)
+        pipeline.execute()
+
+class LocalRedisStandIn:
+    """
+    Local stand-in for a Redis client implementing the commands used by
+    RedisRateLimitStore, for tests and single-node development
+    """
+
+    def __init__(self):
+        self._store = MemoryRateLimitStore()
+        self._ttls = {}
+
+    def mget(self, keys):
+        return [value or None for value in self._store.get_many(keys)]
+
+    def pipeline(self):
+        return _StandInPipeline(self)
+
+class _StandInPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def incrbyfloat(self, key, amount):
+        self.commands.append((key, amount))
+
+    def expire(self, key, ttl):
+        self.client._ttls[key] = ttl
+
+    def execute(self):
+        for key, amount in self.commands:
+            self.client._store.incr(key, amount, self.client._ttls.get(key, 3600))
+        self.commands = []
+
+class SlidingWindowRateLimiter:
+    """
+    Sliding-window counter limiter.
+
+    Each client has a counter per fixed window; the current usage is the
+    current window's count plus the previous window's count weighted by how
+    much of it still overlaps the sliding window. Check and increment are
+    separate store calls, so concurrent requests may overshoot by a few units.
+    """
+
+    def __init__(self, store, window_seconds=60, max_requests=30, max_tokens=200000):
+        self.store = store
+        self.window_seconds = window_seconds
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+
+    def _keys(self, kind, client_id, window):
+        return f"rl:{kind}:{client_id}:{window}", f"rl:{kind}:{client_id}:{window - 1}"
+
+    def check(self, client_id, estimated_tokens=0):
+        """
+        Count a request against the client's quotas
+
+        Args:
+            client_id (str): The client identity (hashed API key or IP)
+            estimated_tokens (int): Estimated tokens the request will consume
+
+        Raises:
+            TooManyRequestsError: If the request would exceed a quota
+        """
+        now = time.time()
+        window = int(now // self.window_seconds)
+        elapsed = (now % self.window_seconds) / self.window_seconds
+
+        request_keys = self._keys('req', client_id, window)
+        token_keys = self._keys('tok', client_id, window)
+        current_requests, previous_requests, current_tokens, previous_tokens = \
+            self.store.get_many(list(request_keys) + list(token_keys))
+
+        used_requests = current_requests + previous_requests * (1 - elapsed)
+        used_tokens = current_tokens + previous_tokens * (1 - elapsed)
+
+        if used_requests + 1 > self.max_requests or used_tokens + estimated_tokens > self.max_tokens:
+            metrics.increment('rate_limit.rejected')
+            # The previous window's weight reaches zero at the end of the current window
+            retry_after = math.ceil(self.window_seconds * (1 - elapsed)) or 1
+            raise TooManyRequestsError("Rate limit exceeded, please retry later", retry_after=retry_after)
+
+        ttl = self.window_seconds * 2
+        self.store.incr(request_keys[0], 1, ttl)
+        if estimated_tokens:
+            self.store.incr(token_keys[0], estimated_tokens, ttl)
+        metrics.increment('rate_limit.allowed')
+
+def hash_api_key(api_key):
+    """Short digest of an API key, used in counter keys instead of the key itself"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+def client_identity(request, api_keys=frozenset(), proxy_hops=0):
+    """
+    Identify the caller of a request by issued API key, falling back to its IP address
+
+    Headers a client can set freely are not trusted: an X-API-Key only counts
+    when it is one of the issued keys, and X-Forwarded-For is read from the
+    right, taking the address appended by the outermost of proxy_hops trusted
+    proxies. Sending a new value on each request therefore cannot start a
+    fresh quota.
+
+    Args:
+        request: The Flask request
+        api_keys (frozenset): Digests (hash_api_key) of the issued API keys
+        proxy_hops (int): Number of trusted proxies in front of the app
+
+    Returns:
+        str: A stable client id that never contains the raw API key
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        digest = hash_api_key(api_key)
+        if digest in api_keys:
+            return 'key:' + digest
+        metrics.increment('rate_limit.unknown_api_key')
+
+    ip = None
+    if proxy_hops > 0:
+        forwarded = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        # Entries left of the trusted hops were written by the client; with fewer
+        # entries than hops the request did not come through the proxies
+        if len(forwarded) >= proxy_hops:
+            ip = forwarded[-proxy_hops]
+    return 'ip:' + (ip or request.remote_addr or 'unknown')
+
+def create_rate_limit_store(name, redis_url=None):
+    """
+    Build the configured counter store
+
+    Args:
+        name (str): 'memory', 'redis' or 'local-redis' (the stand-in)
+        redis_url (str): Redis connection URL for the shared store
+
+    Returns:
+        The store instance
+    """
+    if name == 'redis':
+        return RedisRateLimitStore.from_url(redis_url)
+    if name == 'local-redis':
+        return RedisRateLimitStore(LocalRedisStandIn())
+    if name != 'memory':
+        logger.warning("Unknown rate limit store '%s', using in-process memory", name)
+    return MemoryRateLimitStore()
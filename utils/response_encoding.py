@@ -0,0 +1,107 @@
+"""
+Negotiated response compression and strong ETags with conditional GET support
+"""
+import gzip
+import logging
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional dependency, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html'}
+
+def _available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def _negotiate_encoding():
+    """Pick the encoding the client accepts with the highest quality (brotli wins ties)"""
+    best, best_quality = None, 0
+    for encoding in _available_encodings():
+        quality = request.accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def _representation_etag(etag, encoding):
+    # Strong ETags must differ between the identity and compressed representations
+    return f"{etag}-{encoding}" if encoding else etag
+
+def _not_modified(response, etag):
+    response.status_code = 304
+    response.set_data(b'')
+    for header in ('Content-Type', 'Content-Length', 'Content-Encoding'):
+        response.headers.pop(header, None)
+    response.set_etag(etag)
+    return response
+
+def encode_response(response):
+    """
+    After-request hook that adds a strong ETag, answers conditional GETs with
+    304 and compresses eligible bodies with the negotiated encoding
+
+    Args:
+        response: The Flask response
+
+    Returns:
+        The (possibly modified) response
+    """
+    if (response.direct_passthrough or response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    encoding = _negotiate_encoding() if len(data) >= MIN_COMPRESS_BYTES else None
+
+    # Routes serving stored results set their content hash as ETag; otherwise hash the body
+    etag, _ = response.get_etag()
+    if etag is None and request.method in ('GET', 'HEAD'):
+        response.add_etag()
+        etag, _ = response.get_etag()
+
+    if etag is not None:
+        response.vary.add('Accept-Encoding')
+        if request.method in ('GET', 'HEAD'):
+            # Any cached representation of unchanged content is still fresh
+            for cached_encoding in [None] + _available_encodings():
+                cached_etag = _representation_etag(etag, cached_encoding)
+                if request.if_none_match.contains(cached_etag):
+                    return _not_modified(response, cached_etag)
+
+    if encoding is not None:
+        compressed = _compress(data, encoding)
+        if len(compressed) < len(data):
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+        else:
+            encoding = None
+
+    if etag is not None:
+        response.set_etag(_representation_etag(etag, encoding))
+    return response
+
+def init_response_encoding(app):
+    """
+    Register response compression and ETag handling for every route of the app
+
+    Args:
+        app (Flask): The Flask application
+    """
+    app.after_request(encode_response)
+    logger.info("Response compression enabled: %s", ', '.join(_available_encodings()))
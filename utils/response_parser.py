@@ -1,60 +1,383 @@
 import json
 import re
 
-def parse_gemini_response(response_text):
+from utils.metrics import metrics
+
+def _scan_json(text):
     """
-    Parse the response from Gemini API into a structured JSON object
+    Scan JSON text and record the points where it could be cut and closed
+    
+    Args:
+        text (str): JSON text starting at its opening brace
+        
+    Returns:
+        tuple: (cut_points, stack, in_string) where cut_points is a list of
+        (index, open_containers) pairs and stack holds the containers left open
+    """
+    cut_points = []
+    stack = []
+    in_string = False
+    escaped = False
+    
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append(char)
+            # An empty container is always a valid cut
+            cut_points.append((index + 1, ''.join(stack)))
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                return cut_points, stack, False
+            cut_points.append((index + 1, ''.join(stack)))
+        elif char == ',' and stack:
+            # Everything before a comma is a complete element or key/value pair
+            cut_points.append((index, ''.join(stack)))
+    
+    return cut_points, stack, in_string
+
+def is_truncated_json(response_text):
+    """
+    Check whether a model response stops in the middle of its JSON object
     
     Args:
         response_text (str): The raw text response from Gemini API
         
     Returns:
-        dict: A structured JSON object with the analysis results
+        bool: True if the JSON object is left open
     """
-    try:
-        # Clean up the text to handle potential formatting issues
-        # Remove markdown code block markers if present
-        cleaned_text = re.sub(r'```json|```|\n```', '', response_text)
+    cleaned_text = re.sub(r'```json|```', '', response_text)
+    json_start = cleaned_text.find('{')
+    if json_start < 0:
+        return False
+    _, stack, in_string = _scan_json(cleaned_text[json_start:])
+    return bool(stack) or in_string
+
+def repair_truncated_json(json_text, max_attempts=5):
+    """
+    Repair JSON cut off mid-generation by dropping the partial last element
+    and closing the structures that are still open
+    
+    Args:
+        json_text (str): JSON text starting at its opening brace
+        max_attempts (int): Number of cut points to try, latest first
         
-        # Try to parse the response as JSON directly
+    Returns:
+        dict: The repaired object, or None if it could not be repaired
+    """
+    cut_points, stack, in_string = _scan_json(json_text)
+    if not stack and not in_string:
+        return None
+    
+    closers = {'{': '}', '[': ']'}
+    for index, open_containers in reversed(cut_points[-max_attempts:]):
+        candidate = json_text[:index].rstrip().rstrip(',')
+        candidate += ''.join(closers[c] for c in reversed(open_containers))
         try:
-            return json.loads(cleaned_text)
+            repaired = json.loads(candidate)
         except json.JSONDecodeError:
-            # If direct parsing fails, try to extract JSON from the text response
-            json_start = cleaned_text.find('{')
-            json_end = cleaned_text.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = cleaned_text[json_start:json_end]
-                
-                # Remove any comments that might be in the JSON
-                json_str = re.sub(r'//.*?(\n|$)', '', json_str)
-                
-                # Parse the cleaned JSON
-                parsed_data = json.loads(json_str)
-                
-                # Validate and ensure required keys are present
-                validate_and_fix_data(parsed_data)
-                
-                return parsed_data
-            else:
-                raise Exception("Could not find valid JSON in the response")
+            continue
+        if isinstance(repaired, dict):
+            return repaired
+    return None
+
+def _load_response(response_text, expand):
+    """
+    Load the JSON object of a model response, recovering it from surrounding
+    text or from truncation when it does not parse as it is
+
+    Args:
+        response_text (str): The raw text response from Gemini API
+        expand (callable): Expands a compact wire format into the full response shape
+
+    Returns:
+        tuple: (data, recovery) where recovery is 'clean', 'extracted' or 'repaired'
+    """
+    # Clean up the text to handle potential formatting issues
+    # Remove markdown code block markers if present
+    cleaned_text = re.sub(r'```json|```|\n```', '', response_text)
+    
+    # Try to parse the response as JSON directly
+    try:
+        return expand(json.loads(cleaned_text)), 'clean'
+    except json.JSONDecodeError:
+        pass
+    
+    # If direct parsing fails, try to extract JSON from the text response
+    json_start = cleaned_text.find('{')
+    json_end = cleaned_text.rfind('}') + 1
+    
+    if json_start < 0:
+        raise Exception("Could not find valid JSON in the response")
+    
+    if is_truncated_json(cleaned_text):
+        # The output was cut off: keep what is complete
+        parsed_data = repair_truncated_json(cleaned_text[json_start:])
+        if parsed_data is None:
+            raise Exception("Response JSON is truncated and could not be repaired")
+        return expand(parsed_data), 'repaired'
+    
+    if json_end <= json_start:
+        raise Exception("Could not find valid JSON in the response")
+    
+    json_str = cleaned_text[json_start:json_end]
+    
+    # Remove any comments that might be in the JSON
+    json_str = re.sub(r'//.*?(\n|$)', '', json_str)
+    
+    return expand(json.loads(json_str)), 'extracted'
+
+def parse_gemini_response(response_text, fixer=None, expand=None, validate=None):
+    """
+    Parse the response from Gemini API into a structured JSON object
+    
+    Recovered output is validated before the fixer fills in missing sections,
+    the same order as clean output, so defaults never stand in for a field
+    the validator requires.
+    
+    Args:
+        response_text (str): The raw text response from Gemini API
+        fixer (callable): Fills in missing sections; defaults to validate_and_fix_data
+        expand (callable): Expands a compact wire format into the full response shape
+        validate (callable): Raises ValueError when the parsed output is unusable
+        
+    Returns:
+        dict: A structured JSON object with the analysis results
+        
+    Raises:
+        ValueError: If validate rejects the parsed output
+    """
+    fixer = fixer or validate_and_fix_data
+    expand = expand or (lambda data: data)
+    try:
+        parsed_data, recovery = _load_response(response_text, expand)
     except Exception as e:
+        metrics.increment('parser.recovery.failed')
         raise Exception(f"Failed to parse model response as JSON: {str(e)}")
+    metrics.increment(f'parser.recovery.{recovery}')
+    
+    if validate is not None:
+        if not isinstance(parsed_data, dict):
+            raise ValueError("Response is not a JSON object")
+        validate(parsed_data)
+    
+    if recovery == 'clean':
+        return parsed_data
+    # Fill in what a recovered response is missing
+    return fixer(parsed_data)
+
+# Compact /analyze wire format: short keys, positional arrays for fixed tuples,
+# and no fields that can be derived locally
+COMPACT_SECTION_FEEDBACK_KEYS = {
+    'ci': 'contact_information',
+    'ps': 'professional_summary',
+    'we': 'work_experience',
+    'ed': 'education',
+    'sk': 'skills',
+    'pr': 'projects',
+    'ce': 'certifications'
+}
+COMPACT_PRIORITIES = {'H': 'High', 'M': 'Medium', 'L': 'Low'}
+
+# Top-level sections a caller can ask for; the score is always included
+ANALYSIS_SECTIONS = ['score', 'summary_insights', 'comprehensive_analysis', 'ats_analysis', 'skills_analysis',
+                     'section_feedback', 'industry_insights', 'gap_analysis']
+OVERALL_SECTIONS = ['overall_score', 'summary_insights', 'detailed_analysis', 'section_analysis', 'strengths',
+                    'improvement_areas', 'ats_analysis', 'industry_insights', 'actionable_recommendations']
+# Compact keys each /analyze section is built from (skills alignment is derived from the skill lists)
+COMPACT_SECTION_KEYS = {
+    'score': ['s'],
+    'summary_insights': ['ats', 'cmp', 'lvl', 'top', 'act'],
+    'comprehensive_analysis': ['m', 'str', 'wk', 'imp', 'sm', 'sx'],
+    'ats_analysis': ['ats', 'km', 'kx', 'atr'],
+    'skills_analysis': ['sm', 'sx', 'sa'],
+    'section_feedback': ['fb'],
+    'industry_insights': ['it', 'ir'],
+    'gap_analysis': ['gap']
+}
+COMPACT_KEYS = frozenset(key for keys in COMPACT_SECTION_KEYS.values() for key in keys)
+# Lower bounds of the letter grades derived from the match score
+GRADE_THRESHOLDS = [(85, 'A'), (70, 'B'), (55, 'C'), (40, 'D')]
+
+def grade_for_score(score):
+    """Map a 0-100 score to a letter grade"""
+    if not isinstance(score, (int, float)):
+        return 'N/A'
+    for threshold, grade in GRADE_THRESHOLDS:
+        if score >= threshold:
+            return grade
+    return 'F'
+
+def _items(value, size):
+    """Read a positional array, padding it with None to the expected size"""
+    items = list(value) if isinstance(value, (list, tuple)) else []
+    return (items + [None] * size)[:size]
+
+def _strings(value):
+    return [item for item in value if isinstance(item, str)] if isinstance(value, list) else []
 
-def validate_and_fix_data(data):
+def _percentage(part, whole):
+    return round(100 * part / whole) if whole else 0
+
+def requested(section, sections):
+    """Whether a response section was asked for; None asks for all of them"""
+    return sections is None or section in sections
+
+def expand_compact_analysis(data, sections=None):
+    """
+    Expand the compact /analyze output into the full response shape
+    
+    Derived fields (grade, duplicated scores, level match, keyword and skill
+    percentages, gap list) are computed locally instead of generated.
+    Objects without any compact key are already in the full shape (possibly
+    only some of its sections) and are returned unchanged.
+    
+    Args:
+        data (dict): The parsed compact response
+        sections (list): Sections to build, None for all of them
+        
+    Returns:
+        dict: The analysis in the full response shape
+    """
+    if not isinstance(data, dict) or not any(key in data for key in COMPACT_KEYS):
+        return data
+    
+    score = data.get('s')
+    resume_level, job_level, mismatch_details = _items(data.get('lvl'), 3)
+    detailed_metrics = data.get('m') if isinstance(data.get('m'), dict) else {}
+    relevance = _items(detailed_metrics.get('rel'), 3)
+    ats_compatibility = _items(detailed_metrics.get('ats'), 2)
+    content_quality = _items(detailed_metrics.get('cq'), 3)
+    
+    matching_skills = _strings(data.get('sm'))
+    missing_skills = _strings(data.get('sx'))
+    keyword_matches = _strings(data.get('km'))
+    keyword_missing = _strings(data.get('kx'))
+    skills_percentage = _percentage(len(matching_skills), len(matching_skills) + len(missing_skills))
+    
+    levels_match = bool(resume_level) and resume_level == job_level
+    experience_level = {
+        'resume_level': resume_level or '',
+        'job_level': job_level or '',
+        'match': levels_match
+    }
+    if not levels_match:
+        experience_level['mismatch_details'] = mismatch_details or ''
+    
+    priority_actions = []
+    for action in data.get('act') or []:
+        priority, area, recommendation = _items(action, 3)
+        priority_actions.append({
+            'priority': COMPACT_PRIORITIES.get(priority, priority or 'Medium'),
+            'area': area or '',
+            'recommendation': recommendation or ''
+        })
+    
+    learning_paths = []
+    for gap in data.get('gap') or []:
+        name, recommendations = _items(gap, 2)
+        if name:
+            learning_paths.append({'gap': name, 'recommendations': _strings(recommendations)})
+    
+    feedback = data.get('fb') if isinstance(data.get('fb'), dict) else {}
+    
+    expanded = {
+        'summary_insights': {
+            'overall_grade': grade_for_score(score),
+            'ats_readiness': data.get('ats', 0),
+            'competitiveness': data.get('cmp', 0),
+            'experience_level': experience_level,
+            'top_strengths': _strings(data.get('top')),
+            'priority_actions': priority_actions
+        },
+        'comprehensive_analysis': {
+            'overall_score': score if score is not None else 0,
+            'detailed_metrics': {
+                'relevance': {
+                    'score': relevance[0] or 0,
+                    'details': {'experience_match': relevance[1] or 0, 'education_match': relevance[2] or 0}
+                },
+                'ats_compatibility': {
+                    'score': ats_compatibility[0] or 0,
+                    'details': {'keyword_density': ats_compatibility[1] or 0}
+                },
+                'content_quality': {
+                    'score': content_quality[0] or 0,
+                    'details': {'clarity': content_quality[1] or 0, 'impact': content_quality[2] or 0}
+                },
+                'skills_alignment': {
+                    'score': skills_percentage,
+                    'details': {
+                        'matching_skills_percentage': skills_percentage,
+                        'missing_critical_skills': len(missing_skills)
+                    }
+                }
+            },
+            'strengths': _strings(data.get('str')),
+            'weaknesses': _strings(data.get('wk')),
+            'improvement_suggestions': _strings(data.get('imp'))
+        },
+        'ats_analysis': {
+            'score': data.get('ats', 0),
+            'keyword_match': {
+                'percentage': _percentage(len(keyword_matches), len(keyword_matches) + len(keyword_missing)),
+                'matches': keyword_matches,
+                'missing': keyword_missing
+            },
+            'recommendations': _strings(data.get('atr'))
+        },
+        'skills_analysis': {
+            'matching_skills': matching_skills,
+            'missing_skills': missing_skills,
+            'additional_skills': _strings(data.get('sa'))
+        },
+        'section_feedback': {name: feedback.get(key, '') for key, name in COMPACT_SECTION_FEEDBACK_KEYS.items()},
+        'industry_insights': {
+            'industry_trends': _strings(data.get('it')),
+            'recommendations': _strings(data.get('ir'))
+        },
+        'gap_analysis': {
+            'identified_gaps': [path['gap'] for path in learning_paths],
+            'learning_paths': learning_paths
+        }
+    }
+    if sections is not None:
+        expanded = {section: value for section, value in expanded.items() if section in sections}
+    # A missing score stays missing so validation can reject the output
+    if score is not None:
+        expanded = dict({'score': score}, **expanded)
+    return expanded
+
+def validate_and_fix_data(data, sections=None):
     """
     Validate and fix the parsed data to ensure all required keys are present
     
     Args:
         data (dict): The parsed data
+        sections (list): Requested sections; others are removed, None keeps all of them
     """
+    if sections is not None:
+        for section in ANALYSIS_SECTIONS:
+            if section not in sections and section != 'score':
+                data.pop(section, None)
+    
     # Ensure score is present
     if 'score' not in data:
         data['score'] = 0
     
     # Ensure summary_insights is present
-    if 'summary_insights' not in data:
+    if 'summary_insights' not in data and requested('summary_insights', sections):
         data['summary_insights'] = {
             'overall_grade': 'N/A',
             'ats_readiness': 0,
@@ -64,7 +387,7 @@ def validate_and_fix_data(data):
         }
     
     # Ensure comprehensive_analysis is present
-    if 'comprehensive_analysis' not in data:
+    if 'comprehensive_analysis' not in data and requested('comprehensive_analysis', sections):
         data['comprehensive_analysis'] = {
             'overall_score': data.get('score', 0),
             'detailed_metrics': {},
@@ -74,7 +397,7 @@ def validate_and_fix_data(data):
         }
     
     # Ensure ats_analysis is present
-    if 'ats_analysis' not in data:
+    if 'ats_analysis' not in data and requested('ats_analysis', sections):
         data['ats_analysis'] = {
             'score': 0,
             'format_issues': [],
@@ -87,7 +410,7 @@ def validate_and_fix_data(data):
         }
     
     # Ensure skills_analysis is present
-    if 'skills_analysis' not in data:
+    if 'skills_analysis' not in data and requested('skills_analysis', sections):
         data['skills_analysis'] = {
             'matching_skills': [],
             'missing_skills': [],
@@ -95,7 +418,7 @@ def validate_and_fix_data(data):
         }
     
     # Ensure section_feedback is present
-    if 'section_feedback' not in data:
+    if 'section_feedback' not in data and requested('section_feedback', sections):
         data['section_feedback'] = {
             'contact_information': '',
             'professional_summary': '',
@@ -107,17 +430,87 @@ def validate_and_fix_data(data):
         }
     
     # Ensure industry_insights is present
-    if 'industry_insights' not in data:
+    if 'industry_insights' not in data and requested('industry_insights', sections):
         data['industry_insights'] = {
             'industry_trends': [],
             'recommendations': []
         }
     
     # Ensure gap_analysis is present
-    if 'gap_analysis' not in data:
+    if 'gap_analysis' not in data and requested('gap_analysis', sections):
         data['gap_analysis'] = {
             'identified_gaps': [],
             'learning_paths': []
         }
     
     return data
+
+def validate_and_fix_overall_data(data, sections=None):
+    """
+    Validate and fix overall analysis data to ensure all required keys are present
+    
+    Args:
+        data (dict): The parsed data
+        sections (list): Requested sections; others are removed, None keeps all of them
+    """
+    defaults = {
+        'overall_score': 0,
+        'summary_insights': {
+            'overall_grade': 'N/A',
+            'ats_readiness': 0,
+            'market_competitiveness': 0,
+            'professional_presentation': 0,
+            'experience_level': '',
+            'top_strengths': [],
+            'priority_improvements': []
+        },
+        'detailed_analysis': {},
+        'section_analysis': {},
+        'strengths': [],
+        'improvement_areas': [],
+        'ats_analysis': {
+            'score': 0,
+            'strengths': [],
+            'issues': [],
+            'recommendations': []
+        },
+        'industry_insights': {
+            'current_trends': [],
+            'skill_recommendations': [],
+            'market_positioning': ''
+        },
+        'actionable_recommendations': []
+    }
+    for section, default in defaults.items():
+        if section == 'overall_score' or requested(section, sections):
+            data.setdefault(section, default)
+        else:
+            data.pop(section, None)
+    
+    return data
+
+def validate_and_fix_section_data(data):
+    """
+    Validate and fix section improvement data to ensure all required keys are present
+    
+    Args:
+        data (dict): The parsed data
+    """
+    data.setdefault('improved_text', '')
+    data.setdefault('improvement_score', 0)
+    data.setdefault('key_improvements', [])
+    data.setdefault('analysis', {
+        'original_strengths': [],
+        'original_weaknesses': [],
+        'improvements_made': []
+    })
+    data.setdefault('formatting_suggestions', [])
+    data.setdefault('ats_optimization', {
+        'keyword_density': 0,
+        'suggested_keywords': [],
+        'formatting_score': 0
+    })
+    data.setdefault('alternatives', [])
+    data.setdefault('tips', [])
+    
+    return data
@@ -0,0 +1,42 @@
+"""
+Minimal text PDFs built in memory, for warm-up and load tests
+"""
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def text_pdf(lines, font_size=10):
+    """
+    Build a single-page Helvetica PDF with one line of text per entry
+
+    Args:
+        lines (list): The lines of text, Latin-1 only
+        font_size (int): Font size in points
+
+    Returns:
+        bytes: The PDF document
+    """
+    operators = [f'BT /F1 {font_size} Tf 50 770 Td {font_size * 1.5:g} TL']
+    operators.extend(f'({_escape(line)}) Tj T*' for line in lines)
+    operators.append('ET')
+    content = '\n'.join(operators).encode('latin-1')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+        b'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'
+    ]
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b'%010d 00000 n \n' % offset
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(pdf)
@@ -0,0 +1,167 @@
+"""
+Non-blocking structured logging
+
+Request threads only put records on an in-memory queue; a background
+listener thread formats them (as JSON by default) and writes them to stdout.
+Loggers with hot info-level lines can be sampled, and messages logged with
+%-style arguments are only formatted on the listener thread, or not at all
+when the record is sampled out.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from utils.metrics import metrics
+
+# LogRecord attributes that are not extra fields passed by the caller
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate records at INFO level or below for the
+    configured loggers (and their children); warnings and errors always pass
+
+    Args:
+        rates (dict): Logger name -> fraction of records to keep (0 to 1)
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.intervals = {name: max(1, round(1 / rate)) if rate > 0 else None for name, rate in rates.items()}
+        self._counters = {}
+        self._cache = {}
+
+    def _interval(self, name):
+        """Sampling interval of the closest configured ancestor; 1 keeps everything"""
+        if name not in self._cache:
+            interval = 1
+            candidate = name
+            while candidate:
+                if candidate in self.intervals:
+                    interval = self.intervals[candidate]
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._cache[name] = interval
+        return self._cache[name]
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        interval = self._interval(record.name)
+        if interval == 1:
+            return True
+        # next() on itertools.count is atomic under the GIL
+        counter = self._counters.setdefault(record.name, itertools.count())
+        if interval is not None and next(counter) % interval == 0:
+            return True
+        metrics.increment('logging.sampled_out')
+        return False
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener without formatting them, and drops them
+    rather than blocking when the queue is full
+
+    The record's arguments are formatted later on the listener thread, so
+    they must not be mutated after the logging call.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment('logging.dropped')
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+def _start_listener(queue_size, output_handler):
+    global _listener
+    records = queue.Queue(maxsize=queue_size)
+    _handler.queue = records
+    _listener = QueueListener(records, output_handler, respect_handler_level=True)
+    _listener.start()
+
+def _restart_after_fork():
+    # Only the forking thread survives in the child, so the listener and the queue's locks are replaced
+    if _listener is not None:
+        _start_listener(_listener.queue.maxsize, _listener.handlers[0])
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def configure_logging(level='INFO', log_format='json', sampling=None, queue_size=10000, stream=None):
+    """
+    Route all logging through a queue to a background writer thread
+
+    Replaces the root logger's handlers, so calling it again reconfigures
+    logging rather than adding a second writer.
+
+    Args:
+        level (str): Root log level
+        log_format (str): 'json' for one JSON object per line, 'text' for plain lines
+        sampling (dict): Logger name -> fraction of INFO and lower records to keep
+        queue_size (int): Records that may wait for the writer before new ones are dropped
+        stream: Where records are written (default: stdout)
+    """
+    global _handler
+    output_handler = logging.StreamHandler(stream or sys.stdout)
+    output_handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        first_call = _handler is None
+        _handler = NonBlockingQueueHandler(None)
+        if sampling:
+            _handler.addFilter(SamplingFilter(sampling))
+        root.addHandler(_handler)
+        root.setLevel(level.upper())
+        _start_listener(queue_size, output_handler)
+
+    if first_call:
+        atexit.register(stop_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,81 @@
+"""
+Fast local token estimates for prompts, calibrated against the usage the API reports
+"""
+import re
+import threading
+
+from utils.metrics import metrics
+
+# ASCII words, single digits, and everything else (punctuation, non-ASCII) one piece per character
+_WORD_RE = re.compile(r'[A-Za-z]+')
+_OTHER_RE = re.compile(r'[^\sA-Za-z]')
+# Long words are split into sub-word pieces of roughly this many letters
+_LETTERS_PER_PIECE = 6
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a text without calling the API
+
+    Common words count as one token and longer words as several; digits,
+    punctuation and non-ASCII characters count as one token each, which is
+    how SentencePiece-style tokenizers mostly split resume text.
+
+    Args:
+        text (str): The text to estimate
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    words = sum(1 + (len(word) - 1) // _LETTERS_PER_PIECE for word in _WORD_RE.findall(text))
+    return words + len(_OTHER_RE.findall(text)) + text.count('\n') // 2
+
+class TokenEstimator:
+    """
+    Per-endpoint estimator that learns a correction factor from actual usage.
+
+    Every actual prompt token count recorded updates an EWMA of
+    actual / raw estimate, and the signed relative error of the corrected
+    estimate is reported as token_estimator.<endpoint>.error_ratio.
+    """
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self._corrections = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, endpoint, text):
+        """
+        Estimate the tokens of a prompt for an endpoint
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            text (str): The full prompt
+
+        Returns:
+            int: Corrected token estimate
+        """
+        with self._lock:
+            correction = self._corrections.get(endpoint, 1.0)
+        return int(round(estimate_tokens(text) * correction))
+
+    def record(self, endpoint, estimated, actual):
+        """
+        Compare an estimate with the token count the API reported
+
+        Args:
+            endpoint (str): Name of the calling endpoint
+            estimated (int): The corrected estimate made before the call
+            actual (int): Prompt tokens reported by the API
+        """
+        if not estimated or not actual:
+            return
+        metrics.observe(f'token_estimator.{endpoint}.error_ratio', (estimated - actual) / actual)
+        with self._lock:
+            correction = self._corrections.get(endpoint, 1.0)
+            # estimated already includes the current correction; recover the raw ratio
+            ratio = actual / (estimated / correction)
+            correction += self.alpha * (ratio - correction)
+            self._corrections[endpoint] = correction
+        metrics.set_gauge(f'token_estimator.{endpoint}.correction', round(correction, 3))
@@ -0,0 +1,90 @@
+"""
+Per-worker memory tracking and RSS-triggered recycling
+"""
+import os
+import sys
+import logging
+import threading
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def current_rss_bytes():
+    """
+    Resident set size of this process
+
+    Reads /proc on Linux; elsewhere falls back to the peak RSS, which only
+    ever grows but still shows when a worker crossed a threshold.
+
+    Returns:
+        int: RSS in bytes
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class MemoryWatchdog:
+    """
+    Measures worker RSS after every request and flags the worker for recycling
+    once it crosses a threshold.
+
+    The flag is acted on by the gunicorn post_request hook (gunicorn.conf.py),
+    which stops the worker from taking new requests; gunicorn lets in-flight
+    requests finish before the worker exits and the master forks a fresh one.
+    """
+
+    def __init__(self, max_rss_bytes=0):
+        self.max_rss_bytes = max_rss_bytes
+        self.recycle_requested = False
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._last_rss = None
+
+    def check(self):
+        """
+        Record the current RSS and request a recycle if it is over the threshold
+
+        Returns:
+            int: The measured RSS in bytes
+        """
+        rss = current_rss_bytes()
+        with self._lock:
+            self.requests += 1
+            growth = rss - self._last_rss if self._last_rss is not None else 0
+            self._last_rss = rss
+            newly_over = bool(self.max_rss_bytes) and rss > self.max_rss_bytes and not self.recycle_requested
+            if newly_over:
+                self.recycle_requested = True
+
+        metrics.set_gauge('worker.rss_bytes', rss)
+        metrics.observe('worker.request_rss_growth_bytes', growth)
+        if newly_over:
+            metrics.increment('worker.recycles_requested')
+            logger.warning("Worker %d RSS %.0f MB is over %.0f MB after %d requests, recycling",
+                           os.getpid(), rss / 2**20, self.max_rss_bytes / 2**20, self.requests)
+        return rss
+
+# One per worker process; shared by the Flask app and the gunicorn hooks
+watchdog = MemoryWatchdog()
+
+def init_memory_watchdog(app, max_rss_mb):
+    """
+    Measure RSS once each response has been sent
+
+    Args:
+        app (Flask): The application
+        max_rss_mb (int): Recycle the worker above this RSS; 0 only tracks memory
+    """
+    watchdog.max_rss_bytes = max_rss_mb * 2**20
+
+    @app.after_request
+    def measure_after_response(response):
+        # call_on_close runs after the body is written, so the request's garbage is included
+        response.call_on_close(watchdog.check)
+        return response